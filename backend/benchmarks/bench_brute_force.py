@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Load test BruteForceProtection under a credential spray from many distinct IPs.
+Usage: python benchmarks/bench_brute_force.py [--ips 1000000] [--backend memory|sqlite] [--max-keys 100000]
+"""
+import argparse
+import ipaddress
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.security import BruteForceProtection, MemoryAttemptStore, SQLiteAttemptStore
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ips", type=int, default=1000000)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--max-keys", type=int, default=100000)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_brute_force_"), "attempts.db")
+        store = SQLiteAttemptStore(path, max_keys=args.max_keys)
+    else:
+        store = MemoryAttemptStore(max_keys=args.max_keys)
+    protection = BruteForceProtection(store)
+
+    tracemalloc.start()
+    base = int(ipaddress.IPv4Address("10.0.0.0"))
+    step = max(1, args.ips // args.checkpoints)
+    print(f"{'ips':>10} {'traced MB':>10} {'peak MB':>10} {'checks/s':>10}")
+    start = time.perf_counter()
+    for i in range(args.ips):
+        ip = str(ipaddress.IPv4Address(base + i))
+        protection.record_failed_attempt(ip)
+        protection.is_locked(ip)
+        if (i + 1) % step == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            rate = (i + 1) / (time.perf_counter() - start)
+            print(f"{i + 1:>10} {current / 1e6:>10.1f} {peak / 1e6:>10.1f} {rate:>10.0f}")
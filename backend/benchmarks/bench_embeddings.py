@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Measure embedding throughput for each provider.
+Usage: python benchmarks/bench_embeddings.py [--providers hashing,openai] [--chunks 500] [--words 350]
+The openai provider makes real API calls and needs OPENAI_API_KEY.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np
+from services.embeddings import get_embedding_provider
+
+def synthetic_chunks(count: int, words: int, seed: int = 0):
+    """Chunks of pseudo-random vocabulary words, roughly 500 tokens at the default size."""
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(5000)] + ["the", "of", "and", "shall", "agreement", "party"]
+    return [" ".join(rng.choice(vocabulary, size=words)) for _ in range(count)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--providers", default="hashing")
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--words", type=int, default=350)
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks, args.words)
+    for name in args.providers.split(","):
+        provider = get_embedding_provider(name)
+        provider.embed(chunks[:2])  # warm up (client setup, tokenizer load)
+        start = time.perf_counter()
+        vectors = provider.embed(chunks)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{provider.name:8s} {provider.model:24s} dim={vectors.shape[1]:5d} "
+            f"{len(chunks) / elapsed:10.1f} chunks/s  ({elapsed * 1000:.1f} ms for {len(chunks)})"
+        )
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Measure resident memory per worker process with copied vs memory-mapped FAISS indexes.
+Each worker loads every document and searches it, as a uvicorn worker serving them would.
+Linux only (reads /proc/self/smaps_rollup).
+Usage: python benchmarks/bench_faiss_mmap.py [--docs 2] [--chunks 20000] [--dim 1536] [--max-workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("VECTOR_DIR", tempfile.mkdtemp(prefix="bench_faiss_mmap_"))
+
+import numpy as np
+
+def memory_mb() -> dict:
+    """Rss, Pss (Rss with shared pages split between the processes sharing them) and private anonymous memory."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Anonymous:"):
+                values[parts[0].rstrip(":").lower()] = int(parts[1]) / 1024
+    return values
+
+def worker(doc_ids, mmap: bool, loaded, measured, results):
+    os.environ["FAISS_MMAP"] = "true" if mmap else "false"
+    from db.vector_store import LocalFaissStore
+    baseline = memory_mb()
+
+    stores = [LocalFaissStore(doc_id) for doc_id in doc_ids]
+    queries = np.random.default_rng(os.getpid()).random((8, stores[0].index.d), dtype=np.float32)
+    for store in stores:
+        store.search_batch(queries, 3)  # a flat index search touches every vector
+
+    loaded.wait()  # measure while every worker is alive, so shared pages are split between them
+    usage = memory_mb()
+    results.put({key: usage[key] - baseline.get(key, 0) for key in usage})
+    measured.wait()
+
+def run(doc_ids, mmap: bool, workers: int) -> list:
+    ctx = multiprocessing.get_context("spawn")
+    loaded, measured, results = ctx.Barrier(workers), ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(doc_ids, mmap, loaded, measured, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    usage = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return usage
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    from db.vector_store import LocalFaissStore
+    doc_ids = [f"bench-{i}" for i in range(args.docs)]
+    rng = np.random.default_rng(0)
+    for doc_id in doc_ids:
+        LocalFaissStore(doc_id).add(
+            [f"chunk {i}" for i in range(args.chunks)],
+            rng.random((args.chunks, args.dim), dtype=np.float32),
+            embedding_provider="benchmark",
+            embedding_model="random"
+        )
+    index_mb = args.docs * args.chunks * args.dim * 4 / 2 ** 20
+    print(f"{args.docs} documents, {index_mb:.0f} MiB of vectors in total")
+    print(f"{'mode':>6} {'workers':>8} {'RSS/worker':>11} {'anon/worker':>12} {'PSS total':>10}  (MiB, above interpreter baseline)")
+
+    for mmap in (False, True):
+        for workers in range(1, args.max_workers + 1):
+            usage = run(doc_ids, mmap, workers)
+            print(
+                f"{'mmap' if mmap else 'copy':>6} {workers:>8} "
+                f"{sum(u['rss'] for u in usage) / workers:>11.0f} "
+                f"{sum(u['anonymous'] for u in usage) / workers:>12.0f} "
+                f"{sum(u['pss'] for u in usage):>10.0f}"
+            )
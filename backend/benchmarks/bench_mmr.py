@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Benchmark plain vs. MMR-diversified LocalFaissStore.search.
+Usage: python benchmarks/bench_mmr.py [--chunks 5000] [--dim 1536] [--top-k 3] [--queries 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["VECTOR_DIR"] = tempfile.mkdtemp(prefix="bench_mmr_")
+
+import numpy as np
+from db.vector_store import LocalFaissStore
+
+def time_searches(store: LocalFaissStore, queries: np.ndarray, top_k: int, diversify: bool) -> float:
+    """Return mean milliseconds per search."""
+    start = time.perf_counter()
+    for q in queries:
+        store.search(q, top_k, diversify=diversify)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = rng.normal(size=(args.chunks, args.dim)).astype("float32")
+    store = LocalFaissStore("bench")
+    store.add([f"chunk {i}" for i in range(args.chunks)], vectors)
+    queries = rng.normal(size=(args.queries, args.dim)).astype("float32")
+
+    # Warm up both paths once
+    time_searches(store, queries[:5], args.top_k, False)
+    time_searches(store, queries[:5], args.top_k, True)
+
+    plain = time_searches(store, queries, args.top_k, False)
+    mmr = time_searches(store, queries, args.top_k, True)
+    print(f"chunks={args.chunks} dim={args.dim} top_k={args.top_k} queries={args.queries}")
+    print(f"plain search:   {plain:.3f} ms/query")
+    print(f"MMR search:     {mmr:.3f} ms/query")
+    print(f"re-rank added:  {mmr - plain:.3f} ms/query ({(mmr / plain - 1) * 100:.1f}%)")
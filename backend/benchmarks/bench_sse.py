@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Per-stream overhead of streamed answers: one SSE frame per delta, each read on the IO pool
+(the previous framing) vs. deltas read by one thread and coalesced into frames (utils.sse).
+Usage: python benchmarks/bench_sse.py [--deltas 500] [--interval-ms 5] [--streams 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from utils.executors import BoundedExecutor
+from utils.sse import stream_chunks
+
+def fake_deltas(n: int, interval: float):
+    """Token-sized deltas arriving at a steady rate, like a model streaming its answer."""
+    for i in range(n):
+        if interval:
+            time.sleep(interval)
+        yield f" token{i % 10}"
+
+async def iterate_in(executor: BoundedExecutor, iterator):
+    """Advance a blocking iterator on the executor one item at a time, as answers used to be streamed."""
+    sentinel = object()
+    while True:
+        item = await executor.run(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
+
+async def per_delta(executor: BoundedExecutor, deltas):
+    async for chunk in iterate_in(executor, deltas):
+        yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n".encode("utf-8")
+
+async def coalesced(executor: BoundedExecutor, deltas):
+    async for frame in stream_chunks(executor, deltas):
+        yield frame
+
+async def run_streams(framing, executor: BoundedExecutor, streams: int, deltas: int, interval: float):
+    totals = {"frames": 0, "bytes": 0}
+
+    async def consume():
+        async for frame in framing(executor, fake_deltas(deltas, interval)):
+            totals["frames"] += 1
+            totals["bytes"] += len(frame)
+
+    await asyncio.gather(*(consume() for _ in range(streams)))
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--deltas", type=int, default=500, help="Deltas per stream")
+    parser.add_argument("--interval-ms", type=float, default=5, help="Time between deltas")
+    parser.add_argument("--streams", type=int, default=8, help="Concurrent streams")
+    args = parser.parse_args()
+
+    executor = BoundedExecutor("bench", "thread", max_workers=args.streams * 2, max_queue=args.streams * 2)
+    total_deltas = args.deltas * args.streams
+    print(f"streams={args.streams} deltas/stream={args.deltas} interval={args.interval_ms} ms")
+    print(f"{'framing':>10} {'frames':>8} {'KB':>8} {'wall s':>8} {'CPU us/delta':>13}")
+    try:
+        for name, framing in (("per-delta", per_delta), ("coalesced", coalesced)):
+            wall, cpu = time.perf_counter(), time.process_time()
+            totals = asyncio.run(run_streams(framing, executor, args.streams, args.deltas, args.interval_ms / 1000))
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            print(f"{name:>10} {totals['frames']:>8} {totals['bytes'] / 1024:>8.1f} {wall:>8.2f} "
+                  f"{cpu * 1e6 / total_deltas:>13.1f}")
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the ingestion and retrieval hot paths, with JSON baselines.
+Usage: python benchmarks/bench_suite.py [--filter store] [--repeat 5] [--save baseline.json]
+       python benchmarks/bench_suite.py --check baseline.json [--threshold 0.25]
+--check exits with status 1 when a case's median is more than `threshold` slower than the
+baseline. Baselines are machine-specific: record them on the machine that checks them.
+Runs offline: synthetic PDFs and a fake embeddings API stand in for real inputs.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("VECTOR_DIR", tempfile.mkdtemp(prefix="bench_suite_"))
+
+import numpy as np
+from synthetic import FakeOpenAIClient, make_pdf, synthetic_pages
+
+# Differences below this are timer noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.0005
+
+class Case:
+    """One benchmark: `run` is timed `repeat` times, each after an untimed `setup`."""
+
+    def __init__(self, name: str, run: Callable, setup: Optional[Callable] = None, repeat: Optional[int] = None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.repeat = repeat
+
+def measure(case: Case, repeat: int) -> Dict:
+    times = []
+    for _ in range(case.repeat or repeat):
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        case.run()
+        times.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(times), "min_s": min(times), "repeat": len(times)}
+
+def _temp_vector_dir() -> str:
+    """Point the store (and the documents router) at a fresh directory."""
+    from db import vector_store
+    from routers import documents
+    path = tempfile.mkdtemp(prefix="bench_suite_", dir=os.environ["VECTOR_DIR"])
+    vector_store.VECTOR_DIR = path
+    documents.VECTOR_DIR = path
+    return path
+
+def parsing_cases() -> List[Case]:
+    from services.pdf_parser import extract_pdf_text, extract_pages
+    cases = []
+    for pages in (10, 50):
+        pdf = make_pdf(synthetic_pages(pages, seed=pages))
+        cases.append(Case(f"extract_pdf_text[{pages}_pages]", lambda pdf=pdf: extract_pdf_text(pdf), repeat=3))
+    pdf = make_pdf(synthetic_pages(50, seed=50))
+    known = set()
+
+    def hash_pages():
+        if not known:
+            known.update(extract_pages(pdf)[0])
+
+    # A new version with every page unchanged: only content hashes are computed
+    cases.append(Case("extract_pages_unchanged[50_pages]", lambda: extract_pages(pdf, frozenset(known)), setup=hash_pages))
+    return cases
+
+def chunking_cases() -> List[Case]:
+    from utils.chunker import chunk_text, chunk_pages
+    cases = []
+    for pages in (10, 100, 500):
+        texts = synthetic_pages(pages, seed=pages)
+        text = "\n".join(texts)
+        cases.append(Case(f"chunk_text[{pages}_pages]", lambda text=text: chunk_text(text, max_tokens=500)))
+    texts = synthetic_pages(100, seed=100)
+    numbered = list(enumerate(texts, start=1))
+    cases.append(Case("chunk_pages[100_pages]", lambda: chunk_pages(numbered, max_tokens=500)))
+    return cases
+
+def embedding_cases() -> List[Case]:
+    from services.embeddings import OpenAIEmbeddingProvider, HashingEmbeddingProvider
+    from utils.chunker import chunk_text
+    cases = []
+    for pages in (20, 200):
+        chunks, metadata = chunk_text("\n".join(synthetic_pages(pages, seed=pages)), max_tokens=500)
+        token_counts = [meta["token_count"] for meta in metadata]
+        provider = OpenAIEmbeddingProvider()
+        provider._client = FakeOpenAIClient()
+        cases.append(Case(
+            f"embed_batched_fake_api[{len(chunks)}_chunks]",
+            lambda provider=provider, chunks=chunks, token_counts=token_counts: provider.embed(chunks, token_counts)
+        ))
+    chunks, _ = chunk_text("\n".join(synthetic_pages(200, seed=200)), max_tokens=500)
+    hashing = HashingEmbeddingProvider()
+    cases.append(Case(f"embed_hashing[{len(chunks)}_chunks]", lambda: hashing.embed(chunks)))
+    return cases
+
+def store_cases(dim: int) -> List[Case]:
+    from db.vector_store import LocalFaissStore
+    cases = []
+    rng = np.random.default_rng(0)
+    for count in (1000, 10000):
+        words = ["warranty", "payment", "notice", "term", "party", "section"]
+        texts = [f"chunk {i} " + " ".join(rng.choice(words, size=20)) for i in range(count)]
+        vectors = rng.random((count, dim), dtype=np.float32)
+        metadata = [{"page_numbers": [i // 2 + 1], "token_count": 500} for i in range(count)]
+        queries = rng.random((100, dim), dtype=np.float32)
+        state = {}
+
+        def empty_store(state=state):
+            state["dir"] = _temp_vector_dir()
+            state["store"] = LocalFaissStore("bench")
+
+        def add(state=state, texts=texts, vectors=vectors, metadata=metadata):
+            state["store"].add(texts, vectors.copy(), metadata, {"filename": "bench.pdf"}, "benchmark", "random")
+
+        def saved_store(state=state):
+            """Point at a saved document of this size, creating it the first time."""
+            if "saved" not in state:
+                empty_store()
+                add()
+                state["saved"] = state["dir"]
+            from db import vector_store
+            vector_store.VECTOR_DIR = state["saved"]
+            state["store"] = LocalFaissStore("bench")
+
+        def search(state=state, queries=queries):
+            for query in queries:
+                state["store"].search(query, 3)
+
+        cases += [
+            Case(f"store_add[{count}_chunks]", add, setup=empty_store),
+            Case(f"store_save[{count}_chunks]", lambda state=state: state["store"]._save(), setup=saved_store),
+            Case(f"store_load[{count}_chunks]", lambda: LocalFaissStore("bench"), setup=saved_store),
+            Case(f"store_search_x100[{count}_chunks]", search, setup=saved_store),
+        ]
+    return cases
+
+def listing_cases() -> List[Case]:
+    from db.vector_store import LocalFaissStore
+    from routers.documents import _scan_documents
+    cases = []
+    rng = np.random.default_rng(0)
+    for docs in (100, 1000):
+        directory = {}
+
+        def build(docs=docs, directory=directory):
+            if "path" in directory:
+                from db import vector_store
+                from routers import documents
+                vector_store.VECTOR_DIR = documents.VECTOR_DIR = directory["path"]
+                return
+            directory["path"] = _temp_vector_dir()
+            for i in range(docs):
+                LocalFaissStore(f"doc-{i}").add(
+                    [f"chunk {j}" for j in range(20)], rng.random((20, 64), dtype=np.float32),
+                    [{"page_numbers": [j + 1]} for j in range(20)],
+                    {"filename": f"doc-{i}.pdf", "upload_date": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(), "pages": 20}
+                )
+
+        cases.append(Case(f"list_documents[{docs}_docs]", _scan_documents, setup=build, repeat=5))
+    return cases
+
+def all_cases(dim: int) -> List[Callable[[], List[Case]]]:
+    return [parsing_cases, chunking_cases, embedding_cases, lambda: store_cases(dim), listing_cases]
+
+def check(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Names of cases whose median is more than `threshold` slower than in the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        slower = result["median_s"] - base["median_s"]
+        if slower > MIN_REGRESSION_SECONDS and result["median_s"] > base["median_s"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--check", help="compare with this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'case':44s} {'median':>10s} {'min':>10s} {'baseline':>10s} {'change':>8s}")
+    for group in all_cases(args.dim):
+        for case in group():
+            if args.filter not in case.name:
+                continue
+            result = measure(case, args.repeat)
+            results[case.name] = result
+            line = f"{case.name:44s} {result['median_s'] * 1000:8.2f}ms {result['min_s'] * 1000:8.2f}ms"
+            base = (baseline or {}).get("results", {}).get(case.name)
+            if base:
+                change = result["median_s"] / base["median_s"] - 1
+                line += f" {base['median_s'] * 1000:8.2f}ms {change:+7.0%}"
+            print(line, flush=True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "cpus": os.cpu_count(),
+                "results": results
+            }, f, indent=2)
+        print(f"Saved {len(results)} results to {args.save}")
+
+    if baseline is not None:
+        regressions = check(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI (embeddings, chat completions) and Tavily APIs, for load tests.
+Usage: python benchmarks/fake_upstream.py [--port 8100] [--chat-ttft lognormal:0.4,0.5] [--token-delay const:0.02]
+       python benchmarks/fake_upstream.py --mode record --cassette upstream.jsonl
+       python benchmarks/fake_upstream.py --mode replay --cassette upstream.jsonl [--strict]
+Point the backend at it with OPENAI_BASE_URL=http://localhost:8100/v1 and
+TAVILY_BASE_URL=http://localhost:8100 (and RATE_LIMIT_ENABLED=false for load tests).
+
+Latencies are "const:SECONDS", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA".
+In record mode requests are proxied to the real APIs and each response (for streams, every
+event with its delay) is appended to the cassette, keyed by path and request body; API keys
+are never written. Replay serves recorded responses with their recorded timing and falls back
+to synthetic ones for requests that were not recorded, unless --strict.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+import zlib
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from synthetic import VOCABULARY
+
+SECRET_FIELDS = ("api_key",)
+
+class Latency:
+    """A latency distribution parsed from "const:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA"."""
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        try:
+            values = [float(v) for v in params.split(",")] if params else []
+        except ValueError:
+            raise ValueError(f"Invalid latency: {spec}")
+        expected = {"const": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Invalid latency: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random = random) -> float:
+        if self.kind == "const":
+            return self.values[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.values)
+        median, sigma = self.values
+        return median * rng.lognormvariate(0, sigma) if median > 0 else 0.0
+
+def request_key(path: str, body: Dict) -> str:
+    """Cassette key: the path plus a hash of the canonical request body, without secrets."""
+    clean = {k: v for k, v in body.items() if k not in SECRET_FIELDS}
+    canonical = json.dumps(clean, sort_keys=True, separators=(",", ":"))
+    return f"{path}:{hashlib.sha256(canonical.encode()).hexdigest()[:24]}"
+
+def _vector(text: str, dim: int) -> np.ndarray:
+    vector = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def _answer_words(body: Dict, count: int) -> List[str]:
+    messages = body.get("messages") or [{}]
+    seed = zlib.crc32(json.dumps(messages[-1], sort_keys=True).encode())
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(count)]
+
+def _prompt_tokens(body: Dict) -> int:
+    return sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4 + 1
+
+class Cassette:
+    """Recorded responses, appended to and read from a JSONL file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, List[Dict]] = {}
+        self._cycles: Dict[str, itertools.cycle] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], []).append(entry)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The next recording for `key`, cycling through them if it was recorded more than once."""
+        if key not in self.entries:
+            return None
+        if key not in self._cycles:
+            self._cycles[key] = itertools.cycle(self.entries[key])
+        return next(self._cycles[key])
+
+    def append(self, entry: Dict):
+        self.entries.setdefault(entry["key"], []).append(entry)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+def create_app(
+    embed_latency: Latency = Latency("const:0.05"),
+    chat_latency: Latency = Latency("const:1.0"),
+    chat_ttft: Latency = Latency("const:0.3"),
+    token_delay: Latency = Latency("const:0.02"),
+    search_latency: Latency = Latency("const:0.5"),
+    completion_tokens: int = 150,
+    mode: str = "synthetic",
+    cassette: Optional[str] = None,
+    strict: bool = False,
+    replay_speed: float = 1.0,
+    openai_target: str = "https://api.openai.com",
+    tavily_target: str = "https://api.tavily.com",
+    seed: Optional[int] = None,
+) -> FastAPI:
+    if mode != "synthetic" and not cassette:
+        raise ValueError(f"--cassette is required in {mode} mode")
+    tape = Cassette(cassette) if cassette else None
+    rng = random.Random(seed)
+    app = FastAPI(title="Fake upstream")
+    app.state.requests = {}
+
+    def count(path: str):
+        app.state.requests[path] = app.state.requests.get(path, 0) + 1
+
+    # Synthetic responses
+
+    async def synthetic_embeddings(body: Dict) -> Dict:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(embed_latency.sample(rng))
+        dim = int(body.get("dimensions") or 1536)
+        as_base64 = body.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(inputs):
+            vector = _vector(str(text), dim)
+            embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode() if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(str(text)) for text in inputs) // 4
+        return {
+            "object": "list", "data": data, "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    def chat_completion_tokens(body: Dict) -> int:
+        limit = body.get("max_tokens") or body.get("max_completion_tokens")
+        return min(completion_tokens, limit) if limit else completion_tokens
+
+    async def synthetic_chat(body: Dict) -> Dict:
+        await asyncio.sleep(chat_latency.sample(rng))
+        words = _answer_words(body, chat_completion_tokens(body))
+        prompt_tokens = _prompt_tokens(body)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words)
+            }
+        }
+
+    async def synthetic_chat_stream(body: Dict):
+        words = _answer_words(body, chat_completion_tokens(body))
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": body.get("model", "fake")
+        }
+
+        def event(choices: List[Dict], **extra) -> str:
+            return f"data: {json.dumps({**base, 'choices': choices, **extra})}\n\n"
+
+        await asyncio.sleep(chat_ttft.sample(rng))
+        yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(token_delay.sample(rng))
+            yield event([{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}])
+        yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens = _prompt_tokens(body)
+            yield event([], usage={
+                "prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words)
+            })
+        yield "data: [DONE]\n\n"
+
+    async def synthetic_search(body: Dict) -> Dict:
+        await asyncio.sleep(search_latency.sample(rng))
+        query = str(body.get("query", ""))
+        words = _answer_words({"messages": [{"content": query}]}, 40)
+        results = [
+            {
+                "title": f"Result {i + 1} for {query[:40]}", "url": f"https://example.com/{i + 1}",
+                "content": " ".join(words[i * 8:(i + 1) * 8]), "score": round(0.9 - 0.1 * i, 2)
+            }
+            for i in range(int(body.get("max_results") or 5))
+        ]
+        return {"query": query, "answer": " ".join(words[:20]), "results": results, "response_time": 0.0}
+
+    # Record and replay
+
+    async def proxy(request: Request, target: str, body: Dict, key: str, stream: bool):
+        import httpx
+        headers = {"Content-Type": "application/json"}
+        if "authorization" in request.headers:
+            headers["Authorization"] = request.headers["authorization"]
+        client = httpx.AsyncClient(timeout=120)
+        upstream = await client.send(
+            client.build_request("POST", target + request.url.path, json=body, headers=headers), stream=True
+        )
+        entry = {"key": key, "path": request.url.path, "status": upstream.status_code}
+        if not stream or upstream.status_code != 200:
+            content = await upstream.aread()
+            await upstream.aclose()
+            await client.aclose()
+            payload = json.loads(content) if content else {}
+            if upstream.status_code == 200:
+                tape.append({**entry, "body": payload})
+            return JSONResponse(payload, status_code=upstream.status_code)
+
+        async def relay():
+            events = []
+            last = time.perf_counter()
+            try:
+                async for line in upstream.aiter_lines():
+                    if not line:
+                        continue
+                    now = time.perf_counter()
+                    events.append([round(now - last, 4), line])
+                    last = now
+                    yield line + "\n\n"
+                tape.append({**entry, "events": events})
+            finally:
+                await upstream.aclose()
+                await client.aclose()
+
+        return StreamingResponse(relay(), media_type="text/event-stream")
+
+    async def replay_events(events: List):
+        for delay, line in events:
+            if delay and replay_speed:
+                await asyncio.sleep(delay / replay_speed)
+            yield line + "\n\n"
+
+    async def respond(request: Request, target: str, synthetic, synthetic_stream=None):
+        count(request.url.path)
+        body = await request.json()
+        stream = bool(body.get("stream")) and synthetic_stream is not None
+        if mode == "record":
+            return await proxy(request, target, body, request_key(request.url.path, body), stream)
+        if mode == "replay":
+            entry = tape.get(request_key(request.url.path, body))
+            if entry is not None:
+                if "events" in entry:
+                    return StreamingResponse(replay_events(entry["events"]), media_type="text/event-stream")
+                return JSONResponse(entry["body"], status_code=entry["status"])
+            if strict:
+                raise HTTPException(status_code=404, detail="No recording for this request.")
+        if stream:
+            return StreamingResponse(synthetic_stream(body), media_type="text/event-stream")
+        return JSONResponse(await synthetic(body))
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        return await respond(request, openai_target, synthetic_embeddings)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await respond(request, openai_target, synthetic_chat, synthetic_chat_stream)
+
+    @app.post("/search")
+    async def search(request: Request):
+        return await respond(request, tavily_target, synthetic_search)
+
+    @app.get("/stats")
+    def stats():
+        """Requests served per endpoint since start."""
+        return app.state.requests
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--mode", choices=["synthetic", "record", "replay"], default="synthetic")
+    parser.add_argument("--cassette", help="JSONL file of recorded responses (record and replay modes)")
+    parser.add_argument("--strict", action="store_true", help="in replay mode, fail requests that were not recorded")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="divide recorded delays by this; 0 disables them")
+    parser.add_argument("--embed-latency", type=Latency, default=Latency("const:0.05"))
+    parser.add_argument("--chat-latency", type=Latency, default=Latency("const:1.0"), help="non-streamed completions")
+    parser.add_argument("--chat-ttft", type=Latency, default=Latency("const:0.3"), help="streamed: time to the first token")
+    parser.add_argument("--token-delay", type=Latency, default=Latency("const:0.02"), help="streamed: between tokens")
+    parser.add_argument("--search-latency", type=Latency, default=Latency("const:0.5"))
+    parser.add_argument("--completion-tokens", type=int, default=150)
+    parser.add_argument("--openai-target", default="https://api.openai.com")
+    parser.add_argument("--tavily-target", default="https://api.tavily.com")
+    parser.add_argument("--seed", type=int, help="seed for latency sampling")
+    args = parser.parse_args()
+
+    app = create_app(
+        embed_latency=args.embed_latency, chat_latency=args.chat_latency, chat_ttft=args.chat_ttft,
+        token_delay=args.token_delay, search_latency=args.search_latency,
+        completion_tokens=args.completion_tokens, mode=args.mode, cassette=args.cassette,
+        strict=args.strict, replay_speed=args.replay_speed, openai_target=args.openai_target.rstrip("/"),
+        tavily_target=args.tavily_target.rstrip("/"), seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: a mixed upload/ask/stream/summarize workload against a running backend.
+Usage: python benchmarks/load_driver.py [--base-url http://localhost:8000] [--concurrency 1,4,16]
+       [--duration 30] [--mix ask=5,stream=3,summarize=1,upload=1] [--json results.json]
+Run the backend against benchmarks/fake_upstream.py (see its docstring) with
+RATE_LIMIT_ENABLED=false, or the rate limits will reject most requests.
+Reports, per concurrency level, throughput, p50/p99 latency per operation and the
+time to the first streamed token.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx
+from synthetic import make_pdf, synthetic_pages, synthetic_words
+
+import numpy as np
+
+OPERATIONS = ("ask", "stream", "summarize", "upload")
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, doc_ids: List[str], pages: int, web_search: float, seed: int):
+        self.client = client
+        self.doc_ids = doc_ids
+        self.pages = pages
+        self.web_search = web_search
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.uploads = 0
+        self.uploaded: List[str] = []
+
+    def _question(self) -> Dict:
+        return {
+            "question": f"What does the agreement say about {synthetic_words(4, self.np_rng)}?",
+            "use_web_search": self.rng.random() < self.web_search
+        }
+
+    async def ask(self) -> Optional[float]:
+        response = await self.client.post(f"/api/{self.rng.choice(self.doc_ids)}", json=self._question())
+        response.raise_for_status()
+        return None
+
+    async def stream(self) -> Optional[float]:
+        """Returns the time to the first answer chunk."""
+        start = time.perf_counter()
+        ttft = None
+        body = {**self._question(), "stream": True}
+        async with self.client.stream("POST", f"/api/{self.rng.choice(self.doc_ids)}", json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                if event["type"] == "chunk" and ttft is None:
+                    ttft = time.perf_counter() - start
+                elif event["type"] == "error":
+                    raise RuntimeError(event["content"])
+                elif event["type"] == "done":
+                    break
+        return ttft
+
+    async def summarize(self) -> Optional[float]:
+        response = await self.client.post("/api/summarize", params={"doc_id": self.rng.choice(self.doc_ids)})
+        response.raise_for_status()
+        return None
+
+    async def upload(self) -> Optional[float]:
+        self.uploads += 1
+        pdf = make_pdf(synthetic_pages(self.pages, seed=10_000 + self.uploads))
+        files = {"file": (f"load-{self.uploads}.pdf", pdf, "application/pdf")}
+        response = await self.client.post("/api/upload", files=files)
+        response.raise_for_status()
+        self.uploaded.append(response.json()["doc_id"])
+        return None
+
+async def run_level(workload: Workload, mix: Dict[str, float], concurrency: int, duration: float) -> Dict:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = defaultdict(list)
+    ttfts = []
+    errors = defaultdict(int)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            name = workload.rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ttft = await getattr(workload, name)()
+            except httpx.HTTPStatusError as e:
+                errors[f"{name}:{e.response.status_code}"] += 1
+                continue
+            except Exception as e:
+                errors[f"{name}:{type(e).__name__}"] += 1
+                continue
+            latencies[name].append(time.perf_counter() - start)
+            if ttft is not None:
+                ttfts.append(ttft)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "completed": completed,
+        "throughput_rps": completed / elapsed,
+        "errors": dict(errors),
+        "operations": {
+            name: {"count": len(values), "p50_s": percentile(values, 50), "p99_s": percentile(values, 99)}
+            for name, values in latencies.items()
+        },
+        "ttft": {"count": len(ttfts), "p50_s": percentile(ttfts, 50), "p99_s": percentile(ttfts, 99)},
+    }
+
+def _ms(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:8.0f}ms" if seconds is not None else f"{'-':>10s}"
+
+def print_level(result: Dict):
+    print(f"\nconcurrency {result['concurrency']}: {result['completed']} requests in {result['elapsed_s']:.1f}s, "
+          f"{result['throughput_rps']:.2f} req/s, {sum(result['errors'].values())} errors")
+    print(f"  {'operation':12s} {'count':>6s} {'p50':>10s} {'p99':>10s}")
+    for name, stats in sorted(result["operations"].items()):
+        print(f"  {name:12s} {stats['count']:6d} {_ms(stats['p50_s'])} {_ms(stats['p99_s'])}")
+    ttft = result["ttft"]
+    if ttft["count"]:
+        print(f"  {'ttft':12s} {ttft['count']:6d} {_ms(ttft['p50_s'])} {_ms(ttft['p99_s'])}")
+    for error, count in sorted(result["errors"].items()):
+        print(f"  error {error}: {count}")
+
+async def main(args) -> List[Dict]:
+    mix = parse_mix(args.mix)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        doc_ids = []
+        for i in range(args.docs):
+            pdf = make_pdf(synthetic_pages(args.pages, seed=i))
+            response = await client.post("/api/upload", files={"file": (f"load-doc-{i}.pdf", pdf, "application/pdf")})
+            if response.status_code == 429:
+                sys.exit("Upload was rate limited: start the backend with RATE_LIMIT_ENABLED=false")
+            response.raise_for_status()
+            doc_ids.append(response.json()["doc_id"])
+        print(f"Uploaded {len(doc_ids)} documents of {args.pages} pages")
+
+        workload = Workload(client, doc_ids, args.pages, args.web_search, args.seed)
+        results = []
+        for concurrency in args.concurrency:
+            result = await run_level(workload, mix, concurrency, args.duration)
+            print_level(result)
+            results.append(result)
+
+        if not args.keep:
+            for doc_id in doc_ids + workload.uploaded:
+                await client.delete(f"/api/documents/{doc_id}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16],
+                        help="comma-separated concurrency levels, run in order")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--mix", default="ask=5,stream=3,summarize=1,upload=1", help="operation weights")
+    parser.add_argument("--docs", type=int, default=3, help="documents uploaded before the run")
+    parser.add_argument("--pages", type=int, default=20, help="pages per uploaded document")
+    parser.add_argument("--web-search", type=float, default=0.0, help="fraction of questions using web search")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the uploaded documents afterwards")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "levels": results}, f, indent=2)
+        print(f"Saved results to {args.json}")
@@ -0,0 +1,93 @@
+"""
+Synthetic inputs for benchmarks: text, PDFs and an offline stand-in for the OpenAI
+embeddings API. Everything is deterministic for a given seed.
+"""
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+
+VOCABULARY = [f"term{i}" for i in range(5000)] + [
+    "the", "of", "and", "shall", "agreement", "party", "warranty", "section", "notice", "payment"
+]
+
+def synthetic_words(count: int, rng: np.random.Generator) -> str:
+    return " ".join(rng.choice(VOCABULARY, size=count))
+
+def synthetic_pages(pages: int, words_per_page: int = 350, seed: int = 0) -> List[str]:
+    """Page texts of pseudo-random vocabulary, broken into lines of about 12 words."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(pages):
+        words = synthetic_words(words_per_page, rng).split()
+        out.append("\n".join(" ".join(words[i:i + 12]) for i in range(0, len(words), 12)))
+    return out
+
+def make_pdf(pages: List[str]) -> bytes:
+    """A minimal valid PDF with one text page per entry (Helvetica, one text line per input line)."""
+    font_id = 3 + 2 * len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>",
+    ]
+    for i, text in enumerate(pages):
+        lines = []
+        y = 770
+        for line in text.split("\n"):
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            lines.append(f"BT /F1 9 Tf 40 {y} Td ({escaped}) Tj ET")
+            y -= 11
+        stream = "\n".join(lines)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream.encode())} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+class FakeEmbeddingsAPI:
+    """
+    Stands in for `OpenAI().embeddings`: deterministic vectors per input text, after a
+    fixed latency per request plus a little per input, so batching and concurrency in
+    OpenAIEmbeddingProvider are exercised without network calls.
+    """
+
+    def __init__(self, dim: int = 1536, latency: float = 0.02, per_input_latency: float = 0.00002):
+        self.dim = dim
+        self.latency = latency
+        self.per_input_latency = per_input_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def create(self, model: str, input: List[str], **kwargs):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency + self.per_input_latency * len(input))
+        data = [
+            SimpleNamespace(index=i, embedding=self.vector(text).tolist())
+            for i, text in enumerate(input)
+        ]
+        # Like the real API, don't promise response order
+        return SimpleNamespace(data=data[::-1], model=model)
+
+    def vector(self, text: str) -> np.ndarray:
+        return np.random.default_rng(zlib.crc32(text.encode())).random(self.dim, dtype=np.float32)
+
+class FakeOpenAIClient:
+    def __init__(self, **kwargs):
+        self.embeddings = FakeEmbeddingsAPI(**kwargs)
@@ -0,0 +1,117 @@
+"""
+Document catalog: one file holding the listing summary of every document, so listing
+thousands of documents doesn't read each meta file (which holds all of its chunks).
+Entries are a cache validated against the document's files: an entry is used only while
+the meta file and log directory are unchanged since it was written, and stale entries are
+refreshed by the listing itself. Writers therefore never have to update the catalog,
+and workers can share it; bulk ingestion writes the entries of all its documents at once.
+"""
+import json
+import os
+from typing import Dict, Iterable, List
+from db import vector_store
+from db.vector_store import LocalFaissStore, _replace_file, _write_json, read_document_meta, document_signature, stat_signature
+from utils.config import OPENAI_EMBEDDING_MODEL
+from utils.metrics import record_cache
+
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 2
+
+def document_summary(doc_id: str, meta: Dict) -> Dict:
+    """The listing fields of a document, from its meta (as read_document_meta returns it)."""
+    return {
+        "doc_id": doc_id,
+        "filename": meta.get("filename", "Unknown"),
+        "upload_date": meta.get("upload_date", ""),
+        "pages": meta.get("pages", 0),
+        "chunks": len(meta.get("chunks", [])),
+        "version": meta.get("version", 1),
+        "dim": meta.get("dim", 1536),
+        "embedding_model": meta.get("embedding_model", OPENAI_EMBEDDING_MODEL),
+        "expires_at": meta.get("expires_at")
+    }
+
+def _record(doc_id: str, meta: Dict) -> Dict:
+    # The base generation lets maintenance tell current files from leftovers without reading meta
+    return {"summary": document_summary(doc_id, meta), "generation": meta.get("generation", 0)}
+
+def store_record(store: LocalFaissStore) -> Dict:
+    """The catalog record of a document that was just written through `store`."""
+    return _record(store.doc_id, {
+        **store.metadata,
+        "chunks": store.chunks,
+        "dim": store.index.d,
+        "embedding_model": store.embedding_model,
+        "generation": store.generation
+    })
+
+def _catalog_path() -> str:
+    return os.path.join(vector_store.VECTOR_DIR, CATALOG_FILE)
+
+def _read_catalog() -> Dict[str, Dict]:
+    try:
+        with open(_catalog_path(), "r") as f:
+            catalog = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if catalog.get("version") != CATALOG_VERSION:
+        return {}
+    return catalog.get("documents", {})
+
+def _write_catalog(entries: Dict[str, Dict]):
+    _replace_file(_catalog_path(), _write_json({"version": CATALOG_VERSION, "documents": entries}))
+
+def catalog_entries() -> Dict[str, Dict]:
+    """
+    Up-to-date catalog entry ({"summary", "generation", "signature"}) of every document,
+    keyed by doc_id. Entries of documents that changed are refreshed and written back.
+    """
+    directory = vector_store.VECTOR_DIR
+    if not os.path.exists(directory):
+        return {}
+
+    meta_stats = {}
+    log_stats = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.endswith(".meta.json"):
+                meta_stats[entry.name[:-len(".meta.json")]] = entry.stat()
+            elif entry.name.endswith(".log") and entry.is_dir():
+                log_stats[entry.name[:-len(".log")]] = entry.stat()
+
+    cached = _read_catalog()
+    entries = {}
+    refreshed = 0
+    for doc_id, meta_stat in meta_stats.items():
+        signature = stat_signature(meta_stat, log_stats.get(doc_id))
+        entry = cached.get(doc_id)
+        if entry is None or entry["signature"] != signature:
+            meta = read_document_meta(doc_id)
+            if meta is None:
+                continue  # Deleted meanwhile
+            entry = {**_record(doc_id, meta), "signature": signature}
+            refreshed += 1
+        entries[doc_id] = entry
+    record_cache("catalog", True, len(entries) - refreshed)
+    record_cache("catalog", False, refreshed)
+
+    # Rewrite only when something changed; concurrent writers can only lose refreshes
+    if refreshed or len(entries) != len(cached):
+        _write_catalog(entries)
+    return entries
+
+def list_documents() -> List[Dict]:
+    """Summaries of every document, newest first."""
+    docs = [entry["summary"] for entry in catalog_entries().values()]
+    docs.sort(key=lambda x: x.get("upload_date", ""), reverse=True)
+    return docs
+
+def add_to_catalog(records: Iterable[Dict]):
+    """Add the records (see store_record) of documents that were just written, in one catalog write."""
+    entries = _read_catalog()
+    for record in records:
+        doc_id = record["summary"]["doc_id"]
+        signature = document_signature(doc_id)
+        if signature is not None:
+            entries[doc_id] = {**record, "signature": signature}
+    _write_catalog(entries)
@@ -0,0 +1,88 @@
+import re
+import math
+from typing import List, Dict, Tuple
+import numpy as np
+
+# Compound tokens such as part numbers ("A-1234"), clause IDs ("4.2.1") and emails are
+# indexed whole as well as split into their parts, so exact lookups match either way.
+_COMPOUND = re.compile(r"[a-z0-9]+(?:[-_./@][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for compound in _COMPOUND.findall(text.lower()):
+        parts = _PART.findall(compound)
+        if len(parts) > 1:
+            tokens.append(compound)
+        tokens.extend(parts)
+    return tokens
+
+class BM25Index:
+    """In-memory inverted index over a document's chunks with Okapi BM25 scoring."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> (chunk indices, term frequencies)
+        self.postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self.doc_lens: List[int] = []
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    def add(self, texts: List[str]):
+        """Index texts as the next chunks (chunk indices continue from the current size)."""
+        for text in texts:
+            chunk_idx = len(self.doc_lens)
+            tokens = tokenize(text)
+            self.doc_lens.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                ids, tfs = self.postings.setdefault(term, ([], []))
+                ids.append(chunk_idx)
+                tfs.append(tf)
+        self._arrays.clear()
+
+    def _posting_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            ids, tfs = self.postings[term]
+            arrays = (np.asarray(ids, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Return up to top_k (chunk_idx, score) pairs with a positive score, best first."""
+        n_docs = len(self.doc_lens)
+        if n_docs == 0:
+            return []
+
+        doc_lens = np.asarray(self.doc_lens, dtype=np.float32)
+        avg_len = float(doc_lens.mean()) or 1.0
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, tfs = self._posting_arrays(term)
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lens[ids] / avg_len)
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(i), float(scores[i])) for i in ranked]
+
+    def to_dict(self) -> Dict:
+        return {"k1": self.k1, "b": self.b, "doc_lens": self.doc_lens, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        index.doc_lens = data.get("doc_lens", [])
+        index.postings = {term: (ids, tfs) for term, (ids, tfs) in data.get("postings", {}).items()}
+        return index
@@ -0,0 +1,261 @@
+"""
+Storage maintenance for VECTOR_DIR, run periodically in the background and on demand
+(POST /api/admin/maintenance). A run, in order:
+  1. deletes documents whose expires_at has passed,
+  2. removes leftovers: interrupted writes (*.tmp), files of documents that have no meta
+     file, base generations other than the current one and log segments already folded,
+     and trims the access log,
+  3. evicts the least recently accessed documents while VECTOR_DIR is over STORE_QUOTA_BYTES,
+  4. compacts documents with MAINTENANCE_COMPACT_SEGMENTS or more log segments, under the
+     document's write lock (see document_lock); documents being written are skipped.
+Leftovers younger than MAINTENANCE_GRACE_SECONDS are kept, since they may belong to a
+write in progress. A dry run reports what would be done without changing anything.
+"""
+import fcntl
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from db import vector_store
+from db.catalog import CATALOG_FILE, catalog_entries
+from db.vector_store import (
+    ACCESS_LOG, ACCESS_LOG_TAIL_BYTES, LocalFaissStore, _base_name, _compacted_through, _replace_file,
+    _write_text, delete_document_files
+)
+from utils.config import (
+    STORE_QUOTA_BYTES, MAINTENANCE_GRACE_SECONDS, MAINTENANCE_COMPACT_SEGMENTS
+)
+
+LOCK_FILE = ".maintenance.lock"
+
+class _Document:
+    """Everything on disk under one doc_id, from a single directory scan."""
+
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.files: Dict[str, os.stat_result] = {}  # top-level files and the log directory's contents
+        self.has_meta = False
+        self.segments: List[int] = []
+        self.compacted_through = 0
+        self.last_access = 0.0
+
+    @property
+    def size(self) -> int:
+        return sum(stat.st_size for stat in self.files.values())
+
+    @property
+    def newest(self) -> float:
+        return max((stat.st_mtime for stat in self.files.values()), default=0.0)
+
+def _scan(directory: str):
+    """Returns (documents by doc_id, temporary files {path: stat}, bytes used)."""
+    docs: Dict[str, _Document] = {}
+    tmp_files: Dict[str, os.stat_result] = {}
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            name = entry.name
+            if name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if not name.endswith(".log"):
+                    continue
+                doc = docs.setdefault(name[:-len(".log")], _Document(name[:-len(".log")]))
+                doc.compacted_through = _compacted_through(entry.path)
+                with os.scandir(entry.path) as log_it:
+                    for log_entry in log_it:
+                        stat = log_entry.stat()
+                        total += stat.st_size
+                        if log_entry.name.endswith(".tmp"):
+                            tmp_files[log_entry.path] = stat
+                            continue
+                        doc.files[log_entry.path] = stat
+                        seq = log_entry.name[:-len(".npz")]
+                        if log_entry.name.endswith(".npz") and seq.isdigit():
+                            doc.segments.append(int(seq))
+                continue
+            stat = entry.stat()
+            total += stat.st_size
+            if name.endswith(".tmp"):
+                tmp_files[entry.path] = stat
+                continue
+            if name in (CATALOG_FILE, ACCESS_LOG):
+                continue
+            doc_id = name.split(".", 1)[0]
+            doc = docs.setdefault(doc_id, _Document(doc_id))
+            doc.files[entry.path] = stat
+            if name == f"{doc_id}.meta.json":
+                doc.has_meta = True
+            if name in (f"{doc_id}.meta.json", f"{doc_id}.access"):
+                doc.last_access = max(doc.last_access, stat.st_mtime)
+    return docs, tmp_files, total
+
+def _stale_files(doc: _Document, generation: int) -> List[str]:
+    """Files of a stored document that its current base generation doesn't use."""
+    directory = vector_store.VECTOR_DIR
+    base = _base_name(doc.doc_id, generation)
+    current = {
+        os.path.join(directory, name)
+        for name in (
+            f"{doc.doc_id}.meta.json", f"{doc.doc_id}.access", f"{doc.doc_id}.pages.json.gz",
+            f"{base}.faiss", f"{base}.bm25.json"
+        )
+    }
+    log_dir = os.path.join(directory, f"{doc.doc_id}.log")
+    stale = []
+    for path in doc.files:
+        if os.path.dirname(path) == log_dir:
+            seq = os.path.basename(path)[:-len(".npz")]
+            if path.endswith(".npz") and seq.isdigit() and int(seq) <= doc.compacted_through:
+                stale.append(path)
+        elif path not in current:
+            stale.append(path)
+    return stale
+
+def _remove(path: str):
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _trim_access_log(dry_run: bool) -> int:
+    """Keep only the part of the access log that is read; returns the bytes dropped."""
+    path = os.path.join(vector_store.VECTOR_DIR, ACCESS_LOG)
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+    if size <= 2 * ACCESS_LOG_TAIL_BYTES:
+        return 0
+    if dry_run:
+        return size - ACCESS_LOG_TAIL_BYTES
+    with open(path, "rb") as f:
+        f.seek(size - ACCESS_LOG_TAIL_BYTES)
+        f.readline()  # Starts mid-line
+        tail = f.read()
+    # Reads recorded while this runs are lost; the log is only a warm-up hint
+    _replace_file(path, _write_text(tail.decode("utf-8", errors="replace")))
+    return size - len(tail)
+
+def _iso(timestamp: float) -> str:
+    # Naive UTC, the format documents' expires_at and upload_date are stored in
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat()
+
+def _run(dry_run: bool, quota_bytes: int, grace_seconds: float, compact_segments: int) -> Dict:
+    directory = vector_store.VECTOR_DIR
+    now = time.time()
+    docs, tmp_files, total = _scan(directory)
+    entries = catalog_entries()
+    report = {
+        "dry_run": dry_run,
+        "bytes_before": total,
+        "quota_bytes": quota_bytes,
+        "expired": [],
+        "removed_files": [],
+        "evicted": [],
+        "compacted": [],
+    }
+    freed = 0
+
+    def delete_document(doc: _Document, kind: str, **fields):
+        nonlocal freed
+        entry = entries.get(doc.doc_id, {})
+        report[kind].append({
+            "doc_id": doc.doc_id,
+            "filename": entry.get("summary", {}).get("filename"),
+            "bytes": doc.size,
+            **fields
+        })
+        freed += doc.size
+        if not dry_run:
+            delete_document_files(doc.doc_id)
+        del docs[doc.doc_id]
+
+    def remove_file(path: str, stat: os.stat_result, reason: str):
+        nonlocal freed
+        report["removed_files"].append({"path": os.path.relpath(path, directory), "bytes": stat.st_size, "reason": reason})
+        freed += stat.st_size
+        if not dry_run:
+            _remove(path)
+
+    # 1. Expired documents
+    now_iso = _iso(now)
+    for doc in list(docs.values()):
+        expires_at = entries.get(doc.doc_id, {}).get("summary", {}).get("expires_at")
+        if doc.has_meta and expires_at and expires_at <= now_iso:
+            delete_document(doc, "expired", expires_at=expires_at)
+
+    # 2. Leftovers, once they are too old to belong to a write in progress
+    old = now - grace_seconds
+    for path, stat in tmp_files.items():
+        if stat.st_mtime < old:
+            remove_file(path, stat, "interrupted write")
+    for doc in list(docs.values()):
+        if not doc.has_meta:
+            if doc.newest < old:
+                for path, stat in doc.files.items():
+                    remove_file(path, stat, "orphan")
+                log_dir = os.path.join(directory, f"{doc.doc_id}.log")
+                if not dry_run and os.path.isdir(log_dir):
+                    _remove(log_dir)
+                del docs[doc.doc_id]
+            continue
+        entry = entries.get(doc.doc_id)
+        if entry is None:
+            continue  # Written after the catalog was read
+        for path in _stale_files(doc, entry.get("generation", 0)):
+            stat = doc.files.pop(path)
+            if stat.st_mtime < old:
+                remove_file(path, stat, "stale generation" if path.endswith((".faiss", ".bm25.json")) else "folded segment")
+
+    freed += _trim_access_log(dry_run)
+
+    # 3. Least recently accessed documents, while over the quota
+    if quota_bytes:
+        for doc in sorted(docs.values(), key=lambda d: d.last_access):
+            if total - freed <= quota_bytes:
+                break
+            delete_document(doc, "evicted", last_access=_iso(doc.last_access))
+
+    # 4. Fragmented documents
+    for doc in docs.values():
+        pending = [seq for seq in doc.segments if seq > doc.compacted_through]
+        if len(pending) >= compact_segments:
+            # A document another writer holds (appending, compacting or replacing it) is left for the next run
+            if dry_run or LocalFaissStore(doc.doc_id).compact(wait=False):
+                report["compacted"].append({"doc_id": doc.doc_id, "segments": len(pending)})
+
+    report["freed_bytes"] = freed
+    report["bytes_after"] = total - freed
+    return report
+
+def run_maintenance(
+    dry_run: bool = False,
+    quota_bytes: int = STORE_QUOTA_BYTES,
+    grace_seconds: float = MAINTENANCE_GRACE_SECONDS,
+    compact_segments: int = MAINTENANCE_COMPACT_SEGMENTS
+) -> Optional[Dict]:
+    """
+    Run one maintenance pass and return its report, or None if another worker is already
+    running one. In a dry run, bytes_after is the estimate for a real run.
+    """
+    directory = vector_store.VECTOR_DIR
+    if not os.path.isdir(directory):
+        return None
+    started = time.perf_counter()
+    started_at = _iso(time.time())
+    # One run at a time across all workers sharing VECTOR_DIR
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        try:
+            report = _run(dry_run, quota_bytes, grace_seconds, compact_segments)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return {"started_at": started_at, "duration_s": round(time.perf_counter() - started, 3), **report}
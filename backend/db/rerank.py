@@ -0,0 +1,51 @@
+from typing import List, Dict, Tuple
+import numpy as np
+
+def maximal_marginal_relevance(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Pick k diverse candidates with maximal marginal relevance.
+    Each step chooses the candidate that best trades relevance to the query against
+    similarity to what has already been chosen (lambda_mult=1.0 is pure relevance).
+    Embeddings are expected to be L2-normalized so dot products are cosine similarities.
+    Returns positions into candidate_embeddings, in selection order.
+    """
+    n = len(candidate_embeddings)
+    if n == 0 or k <= 0:
+        return []
+
+    query_sim = candidate_embeddings @ query_embedding
+    pairwise_sim = candidate_embeddings @ candidate_embeddings.T
+
+    first = int(np.argmax(query_sim))
+    selected = [first]
+    # Highest similarity of every candidate to anything selected so far
+    redundancy = pairwise_sim[first].copy()
+    available = np.ones(n, dtype=bool)
+    available[first] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * query_sim - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise_sim[best], out=redundancy)
+
+    return selected
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several best-first rankings of chunk indices into one.
+    Each item scores sum(1 / (k + rank)) over the rankings it appears in.
+    Returns (chunk_idx, fused_score) pairs, best first.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_idx in enumerate(ranking, start=1):
+            scores[chunk_idx] = scores.get(chunk_idx, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
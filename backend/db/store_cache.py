@@ -0,0 +1,105 @@
+"""
+Loaded stores kept in memory, so asks against a document don't reload its index and meta
+file on every request. An entry is used only while the document's files are unchanged since
+it was loaded (the same check as the catalog's), so writes by any worker are seen by the
+next request. Cached stores are shared by concurrent requests and must only be read.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import numpy as np
+from db.vector_store import LocalFaissStore, document_signature, most_accessed
+from utils.config import RETRIEVAL_MODE, STORE_CACHE_SIZE, WARMUP_DOCUMENTS
+from utils.metrics import record_cache
+
+class StoreCache:
+    """Least recently used stores, up to `capacity`, keyed by doc_id."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, Tuple[List[int], LocalFaissStore]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_id: str) -> LocalFaissStore:
+        """The document's store; empty (no chunks) if the document doesn't exist."""
+        signature = document_signature(doc_id)
+        with self._lock:
+            entry = self.entries.get(doc_id)
+            if entry is not None and signature is not None and entry[0] == signature:
+                self.entries.move_to_end(doc_id)
+                record_cache("store", True)
+                return entry[1]
+        record_cache("store", False)
+
+        # Loaded outside the lock; if the files change meanwhile, the signature taken
+        # before loading no longer matches and the next request loads again
+        store = LocalFaissStore(doc_id)
+        with self._lock:
+            if signature is None or not store.chunks or not self.capacity:
+                self.entries.pop(doc_id, None)
+                return store
+            self.entries[doc_id] = (signature, store)
+            self.entries.move_to_end(doc_id)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return store
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+store_cache = StoreCache(STORE_CACHE_SIZE)
+
+def open_store(doc_id: str) -> LocalFaissStore:
+    """A document's store, for reading; see StoreCache.get."""
+    return store_cache.get(doc_id)
+
+# Set once warm-up has finished (or failed); GET /ready reports it
+warmup_status: Dict = {"ready": False}
+
+def _warm_store(doc_id: str) -> bool:
+    store = store_cache.get(doc_id)
+    if not store.chunks or store.index is None:
+        return False
+    # A search reads every vector, paging memory-mapped indexes in
+    store.search(np.ones(store.index.d, dtype="float32"), top_k=1)
+    if RETRIEVAL_MODE != "vector":
+        store.lexical_index  # Loaded (or built) on first use
+    return True
+
+def warm_up(limit: int = WARMUP_DOCUMENTS) -> Dict:
+    """
+    Load the `limit` most read documents (from the access log) into the store cache, and the
+    shared clients the first ask would otherwise initialize. Failures are reported, not raised:
+    a worker that couldn't warm up still serves requests, only slower at first.
+    """
+    from services.openai_client import get_openai_client
+    from utils.tokenizer import get_encoding
+
+    start = time.perf_counter()
+    warmed, errors = [], []
+    for name, init in (("openai_client", get_openai_client), ("tokenizer", get_encoding)):
+        try:
+            init()
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    limit = min(limit, store_cache.capacity)
+    # Some of the most read documents may have been deleted since
+    for doc_id in most_accessed(2 * limit):
+        if len(warmed) >= limit:
+            break
+        try:
+            if _warm_store(doc_id):
+                warmed.append(doc_id)
+        except Exception as e:
+            errors.append(f"{doc_id}: {e}")
+    warmup_status.update({
+        "ready": True,
+        "documents": len(warmed),
+        "duration_s": round(time.perf_counter() - start, 3),
+        "errors": errors
+    })
+    return warmup_status
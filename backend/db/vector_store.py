@@ -1,78 +1,625 @@
 import os
+import fcntl
+import gzip
 import json
-import faiss
+import shutil
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Tuple
-from utils.config import VECTOR_DIR
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Optional
+from utils.config import (
+    VECTOR_DIR, FAISS_MMAP, STORE_MAX_SEGMENTS, MMR_FETCH_MULTIPLIER, MMR_LAMBDA, OPENAI_EMBEDDING_MODEL
+)
+from db.rerank import maximal_marginal_relevance
+from db.lexical_index import BM25Index
+from utils.lazy import lazy_import
+from utils.metrics import record_cache
 
-os.makedirs(VECTOR_DIR, exist_ok=True)
+# Loaded by the first store operation, not when the app is imported
+faiss = lazy_import("faiss")
+
+# On-disk layout of a document:
+#   {doc_id}.meta.json           - chunks, metadata and the current base generation (the commit point)
+#   {doc_id}[.g{n}].faiss        - base vectors of generation n (no suffix for generation 0)
+#   {doc_id}[.g{n}].bm25.json    - base BM25 index of generation n
+#   {doc_id}.log/{seq}.npz       - append-only log segments: new vectors plus their chunks
+#   {doc_id}.log/compacted       - highest segment number folded into a base
+#   {doc_id}.access              - mtime is when the document was last read (see record_access)
+#   {doc_id}.pages.json.gz       - extracted text of every page, to re-chunk or re-embed without the PDF
+# and, shared by all documents, access.log: one "{timestamp} {doc_id}" line per recorded read,
+# and .locks/{doc_id}.lock: held by every writer of the document (see document_lock)
+_CORE_META_KEYS = {
+    "doc_id", "dim", "chunks", "chunk_metadata", "embedding_provider", "embedding_model",
+    "generation", "last_segment"
+}
+
+def read_index(path: str, mmap: bool = FAISS_MMAP) -> Tuple["faiss.Index", bool]:
+    """
+    Load a FAISS index from disk.
+    With mmap, the vectors stay in the file and are paged in on demand, so every worker
+    serving the document shares one copy through the page cache. A mapped index is a
+    read-only view: modifying it aborts the process, so callers must reload it without mmap first.
+    Returns: (index, is_mapped)
+    """
+    # Zero-copy mmap of flat index codes (faiss >= 1.10); older versions fall back to a full read
+    mmap_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap and mmap_flags is not None:
+        try:
+            return faiss.read_index(path, mmap_flags | faiss.IO_FLAG_READ_ONLY), True
+        except RuntimeError:
+            pass  # Index type without mmap support
+    return faiss.read_index(path), False
+
+def _replace_file(path: str, write):
+    """
+    Write a file under a temporary name and rename it into place. Readers (and
+    processes that have the old file memory-mapped) never see a partial write.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _write_json(data):
+    def write(path: str):
+        with open(path, "w") as f:
+            json.dump(data, f)
+    return write
+
+def _write_text(text: str):
+    def write(path: str):
+        with open(path, "w") as f:
+            f.write(text)
+    return write
+
+def _base_name(doc_id: str, generation: int) -> str:
+    return doc_id if generation == 0 else f"{doc_id}.g{generation}"
+
+def _segment_numbers(log_dir: str) -> List[int]:
+    if not os.path.isdir(log_dir):
+        return []
+    return sorted(int(name[:-4]) for name in os.listdir(log_dir) if name.endswith(".npz") and name[:-4].isdigit())
+
+def _compacted_through(log_dir: str) -> int:
+    try:
+        with open(os.path.join(log_dir, "compacted"), "r") as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+def _read_segment(path: str, with_vectors: bool = True) -> Tuple[Optional[np.ndarray], Dict]:
+    with np.load(path) as segment:
+        record = json.loads(segment["record"].tobytes().decode("utf-8"))
+        vectors = segment["vectors"] if with_vectors else None
+    return vectors, record
+
+def read_document_meta(doc_id: str) -> Optional[Dict]:
+    """
+    A document's meta file with any not-yet-compacted log segments applied
+    (chunk texts and metadata only; vectors aren't read). None if the document doesn't exist.
+    """
+    meta_path = os.path.join(VECTOR_DIR, f"{doc_id}.meta.json")
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    log_dir = os.path.join(VECTOR_DIR, f"{doc_id}.log")
+    for seq in _segment_numbers(log_dir):
+        if seq <= meta.get("last_segment", 0):
+            continue
+        try:
+            _, record = _read_segment(os.path.join(log_dir, f"{seq:08d}.npz"), with_vectors=False)
+        except FileNotFoundError:
+            continue  # Compacted meanwhile; close enough for a listing
+        meta["chunks"] = meta.get("chunks", []) + record["chunks"]
+        meta["chunk_metadata"] = meta.get("chunk_metadata", []) + record["chunk_metadata"]
+        meta.update(record.get("metadata") or {})
+    return meta
+
+def stat_signature(meta_stat: os.stat_result, log_stat: Optional[os.stat_result]) -> List[int]:
+    """Changes whenever a document is written: the meta file is replaced (new inode) on every rewrite and appends add files to the log directory."""
+    return [
+        meta_stat.st_ino, meta_stat.st_mtime_ns, meta_stat.st_size,
+        log_stat.st_mtime_ns if log_stat else 0
+    ]
+
+def document_signature(doc_id: str) -> Optional[List[int]]:
+    """The document's stat_signature, or None if it doesn't exist."""
+    try:
+        meta_stat = os.stat(os.path.join(VECTOR_DIR, f"{doc_id}.meta.json"))
+    except FileNotFoundError:
+        return None
+    try:
+        log_stat = os.stat(os.path.join(VECTOR_DIR, f"{doc_id}.log"))
+    except FileNotFoundError:
+        log_stat = None
+    return stat_signature(meta_stat, log_stat)
+
+# A dot directory: maintenance doesn't mistake lock files for document files
+LOCK_DIR = ".locks"
+
+class StoreConflict(Exception):
+    """The document was written by another writer since the caller read it."""
+
+@contextmanager
+def document_lock(doc_id: str, blocking: bool = True):
+    """
+    Exclusive lock on a document's files, across threads and worker processes. Every writer
+    holds it from reading the document's current state to committing (and cleaning up after)
+    its write, so a compaction or replacement can't drop segments appended meanwhile.
+    Yields True once held; with blocking=False, yields False at once if another writer has it.
+    Not reentrant: flock locks of separate opens of the file exclude each other even in one thread.
+    """
+    path = os.path.join(VECTOR_DIR, LOCK_DIR, f"{doc_id}.lock")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def delete_document_files(doc_id: str) -> bool:
+    """Remove every file of a document (all generations and log segments). Returns False if it didn't exist."""
+    meta_path = os.path.join(VECTOR_DIR, f"{doc_id}.meta.json")
+    with document_lock(doc_id):
+        if not os.path.exists(meta_path):
+            return False
+        # Meta first: once it's gone the document no longer exists for readers
+        os.remove(meta_path)
+        prefix = f"{doc_id}."
+        for name in os.listdir(VECTOR_DIR):
+            if name.startswith(prefix):
+                path = os.path.join(VECTOR_DIR, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+    return True
+
+def _pages_path(doc_id: str) -> str:
+    return os.path.join(VECTOR_DIR, f"{doc_id}.pages.json.gz")
+
+def write_pages(doc_id: str, pages: List[str]):
+    """Store the extracted text of a document's pages, in page order (gzip: typically 3-4x smaller than the text)."""
+    def write(path: str):
+        # Level 6: most of level 9's ratio at a fraction of its time
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"pages": pages}, f)
+    _replace_file(_pages_path(doc_id), write)
+
+def read_pages(doc_id: str) -> Optional[List[str]]:
+    """The stored page texts of a document, or None for documents stored without them."""
+    try:
+        with gzip.open(_pages_path(doc_id), "rt", encoding="utf-8") as f:
+            return json.load(f)["pages"]
+    except FileNotFoundError:
+        return None
+
+# Per process: don't record a document's reads more often than this
+ACCESS_RECORD_INTERVAL = 60
+_access_recorded: Dict[str, float] = {}
+ACCESS_LOG = "access.log"
+# Only the end of the access log is read (and kept by maintenance): recent history, in bounded time
+ACCESS_LOG_TAIL_BYTES = 1024 * 1024
+
+def record_access(doc_id: str):
+    """
+    Note that a document was read: for least-recently-accessed eviction (the access file's
+    mtime) and for warming up the most read documents at startup (a line in the access log).
+    """
+    now = time.time()
+    if now - _access_recorded.get(doc_id, 0) < ACCESS_RECORD_INTERVAL:
+        return
+    _access_recorded[doc_id] = now
+    path = os.path.join(VECTOR_DIR, f"{doc_id}.access")
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        open(path, "a").close()
+    # A single short append: lines from concurrent workers don't interleave
+    with open(os.path.join(VECTOR_DIR, ACCESS_LOG), "a") as f:
+        f.write(f"{int(now)} {doc_id}\n")
+
+def most_accessed(limit: int) -> List[str]:
+    """doc_ids with the most recorded reads in the recent access log, most read first."""
+    try:
+        with open(os.path.join(VECTOR_DIR, ACCESS_LOG), "rb") as f:
+            start = max(0, f.seek(0, os.SEEK_END) - ACCESS_LOG_TAIL_BYTES)
+            f.seek(start)
+            lines = f.read().decode("utf-8", errors="replace").splitlines()
+    except FileNotFoundError:
+        return []
+    if start:
+        lines = lines[1:]  # Starts mid-line
+    counts = Counter(line.split(" ", 1)[1] for line in lines if " " in line)
+    return [doc_id for doc_id, _ in counts.most_common(limit)]
 
 class LocalFaissStore:
     def __init__(self, doc_id: str):
         self.doc_id = doc_id
-        self.index_path = os.path.join(VECTOR_DIR, f"{doc_id}.faiss")
         self.meta_path = os.path.join(VECTOR_DIR, f"{doc_id}.meta.json")
-        self.index = None
+        self.log_dir = os.path.join(VECTOR_DIR, f"{doc_id}.log")
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.generation = 0
+        self.index = None  # base vectors, possibly memory-mapped
+        self.index_mapped = False
+        self.delta_index = None  # vectors from log segments not yet compacted into the base
         self.chunks: List[str] = []
         self.chunk_metadata: List[Dict] = []
-        self._load()
+        # Document-level fields (filename, upload_date, pages, ...)
+        self.metadata: Dict = {}
+        # Embedding backend the vectors came from; queries must be embedded the same way
+        self.embedding_provider: Optional[str] = None
+        self.embedding_model: Optional[str] = None
+        self.base_count = 0  # chunks stored in the base files
+        self.last_segment = 0  # highest log segment folded into the base
+        self.segments: List[int] = []  # log segments applied on top of the base
+        self._lexical_index = None
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(VECTOR_DIR, f"{_base_name(self.doc_id, self.generation)}.faiss")
+
+    @property
+    def lexical_path(self) -> str:
+        return os.path.join(VECTOR_DIR, f"{_base_name(self.doc_id, self.generation)}.bm25.json")
+
+    @property
+    def ntotal(self) -> int:
+        base = self.index.ntotal if self.index is not None else 0
+        return base + (self.delta_index.ntotal if self.delta_index is not None else 0)
 
     def _load(self):
-        if os.path.exists(self.meta_path):
-            with open(self.meta_path, "r") as f:
-                meta = json.load(f)
-                self.chunks = meta.get("chunks", [])
-                self.chunk_metadata = meta.get("chunk_metadata", [])
-                dim = meta.get("dim", 1536)
-                if os.path.exists(self.index_path):
-                    self.index = faiss.read_index(self.index_path)
-                else:
-                    self.index = faiss.IndexFlatIP(dim)
-        else:
+        for attempt in range(2):
+            try:
+                self._reset()
+                self._load_base()
+                for seq in _segment_numbers(self.log_dir):
+                    if seq > self.last_segment:
+                        self._apply_segment(seq)
+                return
+            except FileNotFoundError:
+                # A compaction swapped the base while we were reading; read the new one
+                if attempt:
+                    raise
+
+    def _load_base(self):
+        if not os.path.exists(self.meta_path):
             # lazy init; dimension created on first add
-            pass
+            return
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        self.chunks = meta.get("chunks", [])
+        self.chunk_metadata = meta.get("chunk_metadata", [])
+        self.metadata = {key: value for key, value in meta.items() if key not in _CORE_META_KEYS}
+        # Documents from before pluggable providers were all embedded with OpenAI
+        self.embedding_provider = meta.get("embedding_provider", "openai")
+        self.embedding_model = meta.get("embedding_model", OPENAI_EMBEDDING_MODEL)
+        self.generation = meta.get("generation", 0)
+        self.last_segment = meta.get("last_segment", 0)
+        self.base_count = len(self.chunks)
+        dim = meta.get("dim", 1536)
+        if self.generation or os.path.exists(self.index_path):
+            try:
+                self.index, self.index_mapped = read_index(self.index_path)
+            except RuntimeError:
+                if not os.path.exists(self.index_path):
+                    raise FileNotFoundError(self.index_path)
+                raise
+        else:
+            self.index = faiss.IndexFlatIP(dim)
 
-    def _save(self, dim: int, metadata: dict = None):
+    def _apply_segment(self, seq: int):
+        vectors, record = _read_segment(self._segment_path(seq))
+        self._append(seq, record["chunks"], vectors, record["chunk_metadata"], record.get("metadata"))
+
+    def _append(self, seq: int, chunk_texts: List[str], emb: np.ndarray, chunk_metadata: List[Dict], metadata: Optional[Dict]):
+        """Apply a log segment in memory; the mapped base index is left untouched."""
+        if self.delta_index is None:
+            self.delta_index = faiss.IndexFlatIP(emb.shape[1])
+        self.delta_index.add(emb)  # type: ignore
+        self.chunks.extend(chunk_texts)
+        self.chunk_metadata.extend(chunk_metadata)
+        if metadata:
+            self.metadata.update(metadata)
+        if self._lexical_index is not None:
+            self._lexical_index.add(chunk_texts)
+        self.segments.append(seq)
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.log_dir, f"{seq:08d}.npz")
+
+    def _write_segment(self, chunk_texts: List[str], emb: np.ndarray, chunk_metadata: List[Dict], metadata: Optional[Dict]) -> int:
+        """Durably write one log segment and return its sequence number. O(size of the segment)."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        record = json.dumps({"chunks": chunk_texts, "chunk_metadata": chunk_metadata, "metadata": metadata or {}})
+        tmp_path = os.path.join(self.log_dir, f"{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, vectors=emb, record=np.frombuffer(record.encode("utf-8"), dtype=np.uint8))
+                f.flush()
+                os.fsync(f.fileno())
+            seq = max([self.last_segment, _compacted_through(self.log_dir), *_segment_numbers(self.log_dir)]) + 1
+            while True:
+                try:
+                    # Unlike a rename, link refuses to replace a segment another worker just wrote
+                    os.link(tmp_path, self._segment_path(seq))
+                    return seq
+                except FileExistsError:
+                    seq += 1
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _save(self):
+        """Write the base files, meta last: replacing the meta file is the commit point."""
+        _replace_file(self.index_path, lambda path: faiss.write_index(self.index, path))
+        self._save_lexical()
         meta = {
-            "doc_id": self.doc_id, 
-            "dim": dim, 
+            **self.metadata,
+            "doc_id": self.doc_id,
+            "dim": self.index.d,
             "chunks": self.chunks,
-            "chunk_metadata": self.chunk_metadata
+            "chunk_metadata": self.chunk_metadata,
+            "embedding_provider": self.embedding_provider,
+            "embedding_model": self.embedding_model,
+            "generation": self.generation,
+            "last_segment": self.last_segment
         }
-        if metadata:
-            meta.update(metadata)
-        with open(self.meta_path, "w") as f:
-            json.dump(meta, f)
-        faiss.write_index(self.index, self.index_path)
+        _replace_file(self.meta_path, _write_json(meta))
+
+    @property
+    def lexical_index(self) -> BM25Index:
+        """BM25 index over the chunks; loaded on first use, rebuilt if missing or stale."""
+        if self._lexical_index is None:
+            index = None
+            if os.path.exists(self.lexical_path):
+                with open(self.lexical_path, "r") as f:
+                    index = BM25Index.from_dict(json.load(f))
+            fresh = index is not None and len(index) == self.base_count
+            record_cache("bm25_index", fresh)
+            if fresh:
+                # The base index, plus chunks appended since
+                index.add(self.chunks[self.base_count:])
+                self._lexical_index = index
+            else:
+                # Documents ingested before the lexical index existed
+                self._lexical_index = BM25Index()
+                self._lexical_index.add(self.chunks)
+                if self.chunks and self.generation == 0 and not self.segments and os.path.exists(self.meta_path):
+                    self._save_lexical()
+        return self._lexical_index
+
+    def _save_lexical(self):
+        if self._lexical_index is None:
+            # Saving new base files: the chunks in memory are authoritative, there's nothing to load
+            self._lexical_index = BM25Index()
+            self._lexical_index.add(self.chunks)
+        _replace_file(self.lexical_path, _write_json(self.lexical_index.to_dict()))
 
-    def add(self, chunk_texts: list[str], embeddings: np.ndarray, chunk_metadata: List[Dict] = None, metadata: dict = None):
+    def add(
+        self,
+        chunk_texts: list[str],
+        embeddings: np.ndarray,
+        chunk_metadata: List[Dict] = None,
+        metadata: dict = None,
+        embedding_provider: Optional[str] = None,
+        embedding_model: Optional[str] = None
+    ):
+        """
+        Add chunks to the document. A new document is written directly; chunks added to an
+        existing one go to an append-only log segment, costing O(new chunks) rather than
+        rewriting the document. Segments are compacted after STORE_MAX_SEGMENTS appends.
+        """
         emb = np.asarray(embeddings, dtype="float32")
         faiss.normalize_L2(emb)
 
-        if self.index is None:
-            self.index = faiss.IndexFlatIP(emb.shape[1])
-
-        self.index.add(emb)  # type: ignore
-        self.chunks.extend(chunk_texts)
-        if chunk_metadata:
-            self.chunk_metadata.extend(chunk_metadata)
+        # Never mix vectors from different embedding spaces in one index
+        if self.chunks:
+            if (embedding_provider and embedding_provider != self.embedding_provider) or \
+                    (embedding_model and embedding_model != self.embedding_model):
+                raise ValueError(
+                    f"Document {self.doc_id} was embedded with {self.embedding_provider}/{self.embedding_model}, "
+                    f"not {embedding_provider}/{embedding_model}."
+                )
         else:
-            # Create empty metadata for chunks without page info
-            self.chunk_metadata.extend([{}] * len(chunk_texts))
-        self._save(emb.shape[1], metadata)
+            self.embedding_provider = embedding_provider or self.embedding_provider
+            self.embedding_model = embedding_model or self.embedding_model
+
+        if self.index is not None and self.index.d != emb.shape[1]:
+            raise ValueError(f"Embedding dimension {emb.shape[1]} does not match index dimension {self.index.d}.")
+
+        # Create empty metadata for chunks without page info
+        chunk_metadata = list(chunk_metadata) if chunk_metadata else [{} for _ in chunk_texts]
+
+        with document_lock(self.doc_id):
+            if not os.path.exists(self.meta_path):
+                # New document: write the base files directly
+                self.index = faiss.IndexFlatIP(emb.shape[1])
+                self.index_mapped = False
+                self.index.add(emb)  # type: ignore
+                self.chunks.extend(chunk_texts)
+                self.chunk_metadata.extend(chunk_metadata)
+                if metadata:
+                    self.metadata.update(metadata)
+                self.base_count = len(self.chunks)
+                self._lexical_index = None
+                self._save()
+                return
+
+            seq = self._write_segment(list(chunk_texts), emb, chunk_metadata, metadata)
+            self._append(seq, list(chunk_texts), emb, chunk_metadata, metadata)
+            if len(self.segments) >= STORE_MAX_SEGMENTS:
+                self._compact()
+
+    def compact(self, wait: bool = True) -> bool:
+        """
+        Fold log segments into a new base generation. The new index and BM25 files are
+        written under new names and committed by replacing the meta file, so readers see
+        either the old base plus its segments or the new base, never a mix. O(document).
+        With wait=False, returns False without compacting if another writer holds the document.
+        """
+        with document_lock(self.doc_id, blocking=wait) as locked:
+            if not locked:
+                return False
+            self._compact()
+        return True
 
-    def search(self, query_embedding: np.ndarray, top_k: int = 3):
+    def _compact(self):
+        # Re-read from disk: other workers may have appended segments this instance hasn't seen
+        self._load()
+        if not self.segments:
+            return
+
+        self._write_generation(self.reconstruct(np.arange(self.ntotal)), self.lexical_index)
+
+    def replace(
+        self,
+        chunk_texts: List[str],
+        embeddings: np.ndarray,
+        chunk_metadata: List[Dict] = None,
+        metadata: dict = None,
+        embedding_provider: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        expected_signature: Optional[List[int]] = None
+    ):
+        """
+        Replace all of the document's chunks (e.g. with those of a new version), merging in the
+        document metadata. The embedding model is kept unless a new one is given (re-embedding
+        the whole document). Written as a new base generation and committed like compact(), so
+        readers see either the old content or the new.
+        Callers that built the new chunks from an earlier read of the document pass that read's
+        document_signature: if the document has been written since, StoreConflict is raised
+        instead of silently dropping that write.
+        """
+        emb = np.asarray(embeddings, dtype="float32")
+        faiss.normalize_L2(emb)
+        with document_lock(self.doc_id):
+            if expected_signature is not None and document_signature(self.doc_id) != expected_signature:
+                raise StoreConflict(f"Document {self.doc_id} was modified by another writer.")
+            self._load()
+            if embedding_provider or embedding_model:
+                # Every vector is replaced, so the index may change dimension too
+                self.embedding_provider = embedding_provider or self.embedding_provider
+                self.embedding_model = embedding_model or self.embedding_model
+            elif self.index is not None and self.index.d != emb.shape[1]:
+                raise ValueError(f"Embedding dimension {emb.shape[1]} does not match index dimension {self.index.d}.")
+
+            self.chunks = list(chunk_texts)
+            self.chunk_metadata = list(chunk_metadata) if chunk_metadata else [{} for _ in chunk_texts]
+            if metadata:
+                self.metadata.update(metadata)
+            self._write_generation(emb, None)
+
+    def _write_generation(self, vectors: np.ndarray, lexical: Optional[BM25Index]):
+        """Write self.chunks with these vectors as the next base generation, folding in all segments."""
+        old_files = [self.index_path, self.lexical_path]
+        folded = list(self.segments)
+
+        self.index = faiss.IndexFlatIP(vectors.shape[1])
+        self.index.add(vectors)  # type: ignore
+        self.index_mapped = False
+        self.delta_index = None
+        self._lexical_index = lexical
+        self.generation += 1
+        if folded:
+            self.last_segment = folded[-1]
+        self.base_count = len(self.chunks)
+        self.segments = []
+        self._save()
+
+        if folded:
+            # Writers number new segments above this, even once the folded ones are deleted
+            _replace_file(os.path.join(self.log_dir, "compacted"), _write_text(str(self.last_segment)))
+        for seq in folded:
+            try:
+                os.remove(self._segment_path(seq))
+            except FileNotFoundError:
+                pass
+        for path in old_files:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _search_vectors(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the base and the appended vectors; returns (distances, ids) like faiss, best first."""
+        distances, indices = self.index.search(q, k)  # type: ignore
+        if self.delta_index is None:
+            return distances, indices
+        delta_distances, delta_indices = self.delta_index.search(q, k)  # type: ignore
+        delta_indices = np.where(delta_indices == -1, -1, delta_indices + self.index.ntotal)
+        distances = np.concatenate([distances, delta_distances], axis=1)
+        indices = np.concatenate([indices, delta_indices], axis=1)
+        # Missing results (-1) come with the lowest possible score, so they sort last
+        order = np.argsort(-distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        ids = np.asarray(ids, dtype="int64")
+        out = np.empty((len(ids), self.index.d), dtype="float32")
+        in_base = ids < self.index.ntotal
+        if in_base.any():
+            out[in_base] = self.index.reconstruct_batch(ids[in_base])  # type: ignore
+        if not in_base.all():
+            out[~in_base] = self.delta_index.reconstruct_batch(ids[~in_base] - self.index.ntotal)  # type: ignore
+        return out
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3, diversify: bool = False):
+        return self.search_batch(np.expand_dims(np.asarray(query_embedding), axis=0), top_k, diversify)[0]
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 3, diversify: bool = False):
+        """
+        Search many queries with a single matrix search.
+        Returns one hit list per query row.
+        With diversify=True, top_k * MMR_FETCH_MULTIPLIER candidates are fetched and
+        re-ranked with maximal marginal relevance so near-identical chunks aren't all returned.
+        """
         if self.index is None:
             raise RuntimeError("Vector index not initialized.")
 
-        q = np.asarray(query_embedding, dtype="float32")
-        q = np.expand_dims(q, axis=0)
+        q = np.array(query_embeddings, dtype="float32")
+        if q.ndim == 1:
+            q = np.expand_dims(q, axis=0)
         faiss.normalize_L2(q)
 
-        distances, indices = self.index.search(q, top_k)  # type: ignore
+        fetch_k = top_k * MMR_FETCH_MULTIPLIER if diversify else top_k
+        distances, indices = self._search_vectors(q, fetch_k)
+        if not diversify:
+            return [self._hits(row_idx, row_dist) for row_idx, row_dist in zip(indices, distances)]
+
+        results = []
+        for query, row_idx, row_dist in zip(q, indices, distances):
+            valid = row_idx != -1
+            row_idx, row_dist = row_idx[valid], row_dist[valid]
+            # Stored vectors are already normalized, so MMR can work on them directly
+            candidates = self.reconstruct(row_idx)
+            order = maximal_marginal_relevance(query, candidates, top_k, MMR_LAMBDA)
+            results.append(self._hits(row_idx[order], row_dist[order]))
+        return results
+
+    def lexical_search(self, query: str, top_k: int = 3):
+        """BM25 keyword search; returns hits in the same format as search() without embedding the query."""
+        matches = self.lexical_index.search(query, top_k)
+        return self._hits([idx for idx, _ in matches], [score for _, score in matches])
 
+    def _hits(self, indices, distances):
         out = []
-        for idx, score in zip(indices[0], distances[0]):
+        for idx, score in zip(indices, distances):
             if idx == -1:
                 continue
             chunk_idx = int(idx)
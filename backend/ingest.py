@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion: load a directory of PDFs straight into the vector store, bypassing the API.
+Usage: python ingest.py <directory> [--recursive] [--workers 4] [--batch-tokens 1000000]
+       [--checkpoint ./data/ingest_checkpoint.jsonl]
+PDFs are parsed and chunked across a process pool, and the chunks of many documents are
+embedded together in large batches. Documents are written exactly as POST /api/upload
+writes them (page texts included, so they can be reindexed later), and the document catalog is written once at the end. Every stored document
+is recorded in the checkpoint, so running the same command again after an interruption
+skips the files already ingested.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+
+DEFAULT_CHECKPOINT = "./data/ingest_checkpoint.jsonl"
+
+def find_pdfs(directory: str, recursive: bool = False) -> List[str]:
+    if recursive:
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(directory)
+            for name in names
+        ]
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    return sorted(os.path.abspath(p) for p in paths if p.lower().endswith(".pdf") and os.path.isfile(p))
+
+def file_key(path: str) -> List:
+    """Identifies a file's contents well enough to skip it on resume: path, size and mtime."""
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+class Checkpoint:
+    """
+    Append-only JSONL record of the run. A document is logged as "writing" (with its
+    doc_id) before its files are written and as "done" after, so a run killed mid-write
+    can remove the partial document on resume.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by the interruption
+                    self.records[record["path"]] = record
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a")
+
+    def is_done(self, path: str) -> bool:
+        record = self.records.get(path)
+        return bool(record) and record["status"] == "done" and record["key"] == file_key(path)
+
+    def interrupted(self) -> List[Dict]:
+        """Documents whose write was cut short."""
+        return [record for record in self.records.values() if record["status"] == "writing"]
+
+    def log(self, path: str, status: str, **fields):
+        record = {"path": path, "key": file_key(path), "status": status, **fields}
+        self.records[path] = record
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+def parse_pdf(path: str, max_tokens: int) -> Dict:
+    """Parse and chunk one PDF, in a worker process. The same steps as an upload."""
+    from services.pdf_parser import extract_pages
+    from utils.chunker import chunk_pages
+    try:
+        with open(path, "rb") as f:
+            file_bytes = f.read()
+        content_hashes, page_texts = extract_pages(file_bytes)
+    except Exception as e:
+        return {"path": path, "error": f"Failed to extract text: {e}"}
+    if not any(text.strip() for text in page_texts.values()):
+        return {"path": path, "error": "No extractable text found"}
+    chunks, chunk_metadata = chunk_pages(sorted(page_texts.items()), max_tokens=max_tokens)
+    return {
+        "path": path,
+        "content_hashes": content_hashes,
+        "page_texts": page_texts,
+        "chunks": chunks,
+        "chunk_metadata": chunk_metadata
+    }
+
+class Ingester:
+    def __init__(self, checkpoint: Checkpoint, batch_tokens: int, provider: Optional[str] = None, max_tokens: int = 500):
+        from services.embeddings import get_embedding_provider
+        self.checkpoint = checkpoint
+        self.batch_tokens = batch_tokens
+        self.max_tokens = max_tokens
+        self.provider = get_embedding_provider(provider)
+        self.pending: List[Dict] = []
+        self.pending_tokens = 0
+        self.records: List[Dict] = []  # for the catalog
+        self.ingested = 0
+        self.failed = 0
+        self.chunks = 0
+
+    def add(self, parsed: Dict):
+        """Queue a parsed document; embed the queue once it holds batch_tokens tokens."""
+        self.pending.append(parsed)
+        self.pending_tokens += sum(meta["token_count"] for meta in parsed["chunk_metadata"])
+        if self.pending_tokens >= self.batch_tokens:
+            self.flush()
+
+    def flush(self):
+        """Embed every queued document in one cross-document batch, then store each."""
+        from db.catalog import store_record
+        from db.vector_store import LocalFaissStore, write_pages
+        from routers.upload import sanitize_filename
+        from services.versioning import document_pages, new_document_metadata
+
+        if not self.pending:
+            return
+        docs, self.pending, self.pending_tokens = self.pending, [], 0
+        chunks = [chunk for doc in docs for chunk in doc["chunks"]]
+        token_counts = [meta["token_count"] for doc in docs for meta in doc["chunk_metadata"]]
+        vectors = self.provider.embed(chunks, token_counts)
+
+        offset = 0
+        for doc in docs:
+            count = len(doc["chunks"])
+            doc_id = str(uuid.uuid4())
+            self.checkpoint.log(doc["path"], "writing", doc_id=doc_id)
+            filename = sanitize_filename(os.path.basename(doc["path"]))
+            write_pages(doc_id, document_pages(doc["content_hashes"], doc["page_texts"]))
+            store = LocalFaissStore(doc_id)
+            store.add(
+                doc["chunks"], vectors[offset:offset + count], doc["chunk_metadata"],
+                new_document_metadata(filename, doc["content_hashes"], doc["page_texts"], max_tokens=self.max_tokens),
+                self.provider.name, self.provider.model
+            )
+            offset += count
+            self.checkpoint.log(doc["path"], "done", doc_id=doc_id, pages=len(doc["content_hashes"]), chunks=count)
+            self.records.append(store_record(store))
+            self.ingested += 1
+            self.chunks += count
+
+    def fail(self, path: str, error: str):
+        self.checkpoint.log(path, "failed", error=error)
+        self.failed += 1
+        print(f"  skipped {path}: {error}", file=sys.stderr)
+
+def check_file(path: str) -> Optional[str]:
+    """The upload endpoint's checks that need no parsing; returns the error, if any."""
+    from routers.upload import MAX_FILE_SIZE, validate_pdf_signature
+    size = os.path.getsize(path)
+    if size == 0:
+        return "File is empty"
+    if size > MAX_FILE_SIZE:
+        return f"File exceeds {MAX_FILE_SIZE / (1024 * 1024):.0f}MB"
+    with open(path, "rb") as f:
+        if not validate_pdf_signature(f.read(4)):
+            return "Not a PDF file"
+    return None
+
+def remove_interrupted(checkpoint: Checkpoint):
+    from db.vector_store import delete_document_files
+    for record in checkpoint.interrupted():
+        if delete_document_files(record["doc_id"]):
+            print(f"Removed the partly written document of {record['path']}")
+
+def run(args) -> int:
+    from db.catalog import add_to_catalog
+
+    checkpoint = Checkpoint(args.checkpoint)
+    remove_interrupted(checkpoint)
+    paths = find_pdfs(args.directory, args.recursive)
+    todo = [path for path in paths if not checkpoint.is_done(path)]
+    print(f"{len(paths)} PDFs found, {len(paths) - len(todo)} already ingested, {len(todo)} to go")
+
+    ingester = Ingester(checkpoint, args.batch_tokens, args.provider, args.max_tokens)
+    start = time.perf_counter()
+    # Spawn, like the API's parse pool: workers don't inherit this process's threads
+    pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"))
+    window = args.workers * 4  # parsed documents queued ahead of the embedder, bounding memory
+    remaining = iter(todo)
+    in_flight = set()
+    try:
+        while True:
+            while len(in_flight) < window:
+                path = next(remaining, None)
+                if path is None:
+                    break
+                error = check_file(path)
+                if error:
+                    ingester.fail(path, error)
+                    continue
+                in_flight.add(pool.submit(parse_pdf, path, args.max_tokens))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                parsed = future.result()
+                if "error" in parsed:
+                    ingester.fail(parsed["path"], parsed["error"])
+                else:
+                    ingester.add(parsed)
+            processed = ingester.ingested + ingester.failed + len(ingester.pending)
+            print(f"\r  {processed}/{len(todo)} parsed, {ingester.ingested} stored", end="", flush=True)
+        ingester.flush()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        # One catalog write for the whole run, even an interrupted one
+        if ingester.records:
+            add_to_catalog(ingester.records)
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\nIngested {ingester.ingested} documents ({ingester.chunks} chunks) in {elapsed:.1f}s, "
+          f"{ingester.failed} skipped")
+    return 1 if ingester.failed else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", help="directory of PDF files")
+    parser.add_argument("--recursive", action="store_true", help="include subdirectories")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="parse processes")
+    parser.add_argument("--batch-tokens", type=int, default=1_000_000,
+                        help="tokens of chunks (across documents) collected before each embedding call")
+    parser.add_argument("--provider", choices=["openai", "hashing"], help="embedding provider (default: EMBEDDING_PROVIDER)")
+    parser.add_argument("--max-tokens", type=int, help="tokens per chunk (default: CHUNK_MAX_TOKENS, as for uploads)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="progress file used to resume")
+    args = parser.parse_args()
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+    if args.max_tokens is None:
+        from utils.config import CHUNK_MAX_TOKENS
+        args.max_tokens = CHUNK_MAX_TOKENS
+    try:
+        sys.exit(run(args))
+    except KeyboardInterrupt:
+        sys.exit("\nInterrupted. Run the same command again to resume.")
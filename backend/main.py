@@ -1,11 +1,67 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
-from routers import upload, summarize, ask, documents
-from utils.config import ENVIRONMENT, ALLOWED_ORIGINS
+from fastapi.responses import JSONResponse, Response
+from routers import upload, summarize, ask, documents, auth, admin
+from db.maintenance import run_maintenance
+from db.store_cache import warm_up, warmup_status
+from utils.config import ENVIRONMENT, ALLOWED_ORIGINS, MAINTENANCE_INTERVAL_SECONDS
+from utils.executors import ExecutorSaturated, executor_stats, io_executor, shutdown_executors
+from utils.metrics import render_metrics, server_timing_header, start_request_timings
+from utils.profiling import profiler
+import math
 import time
 
-app = FastAPI(title="AI Document Assistant")
+async def maintenance_loop():
+    """Run storage maintenance every MAINTENANCE_INTERVAL_SECONDS (see db/maintenance.py)."""
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            report = await io_executor.run(run_maintenance)
+        except Exception as e:
+            print(f"[ERROR] Storage maintenance failed: {e}")
+            continue
+        if report is None:
+            continue  # Another worker is running it
+        print(
+            f"[MAINTENANCE] {len(report['expired'])} expired, {len(report['evicted'])} evicted, "
+            f"{len(report['removed_files'])} leftover files removed, {len(report['compacted'])} compacted; "
+            f"{report['freed_bytes']} bytes freed in {report['duration_s']}s"
+        )
+
+async def warm_up_in_background():
+    """Preload the most read documents; GET /ready reports 503 until this has finished."""
+    try:
+        status = await io_executor.run(warm_up)
+    except Exception as e:
+        warmup_status.update({"ready": True, "errors": [str(e)]})
+        print(f"[ERROR] Warm-up failed: {e}")
+        return
+    print(f"[WARMUP] {status['documents']} documents loaded in {status['duration_s']}s")
+    for error in status["errors"]:
+        print(f"[WARMUP] {error}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In the background, so /health answers while warming up
+    tasks = [asyncio.create_task(warm_up_in_background())]
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(maintenance_loop()))
+    yield
+    for task in tasks:
+        task.cancel()
+    shutdown_executors(wait=False)
+
+app = FastAPI(title="AI Document Assistant", lifespan=lifespan)
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The server is busy. Please try again shortly."},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
 
 # CORS configuration - tighter for production
 if ENVIRONMENT == "production":
@@ -59,13 +115,50 @@ async def limit_request_size(request: Request, call_next):
     response = await call_next(request)
     return response
 
+# Outermost middleware: times the whole request
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    Add a Server-Timing header with the stage breakdown (store_load, search, embed, ...) of API
+    requests, and profile them while an admin has armed the profiler.
+    For streaming responses, only the stages before the first byte are included.
+    """
+    path = request.url.path
+    if not path.startswith("/api/"):
+        return await call_next(request)
+    
+    timings = start_request_timings()
+    profiled = profiler.begin() if profiler.armed and not path.startswith("/api/admin/") else None
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        if profiled is not None:
+            profiler.end(profiled)
+    response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - start)
+    return response
+
 app.include_router(upload.router, prefix="/api")
 app.include_router(summarize.router, prefix="/api")
 app.include_router(ask.router, prefix="/api")
 app.include_router(documents.router, prefix="/api")
+app.include_router(auth.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 @app.get("/health")
 def health():
     """Health check endpoint with rate limiting consideration."""
     # Note: Health checks should be rate limited in production
-    return {"status": "ok", "timestamp": time.time()}
+    return {"status": "ok", "timestamp": time.time(), "executors": executor_stats()}
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the most read documents have been loaded (see warm_up), 503 before."""
+    if not warmup_status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready", "warmup": warmup_status}
+
+@app.get("/metrics")
+def metrics():
+    """Stage latencies, cache hit ratios, executor queues and upstream calls, in the Prometheus text format."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
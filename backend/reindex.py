@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Reindex stored documents: re-chunk and re-embed them from their stored page texts, without the PDFs.
+Usage: python reindex.py [--doc DOC_ID ...] [--max-tokens 500] [--provider openai|hashing]
+       [--model MODEL] [--workers 4] [--force]
+Run it after changing CHUNK_MAX_TOKENS or the embedding model; the API keeps serving while
+documents are rewritten one at a time. Documents already chunked and embedded as requested
+are skipped, so running the same command again after an interruption resumes it.
+Documents stored before page texts were kept can't be reindexed and are reported as failed.
+"""
+import argparse
+import sys
+
+def run(args) -> int:
+    from db.catalog import list_documents
+    from services.reindex import reindex_documents
+
+    doc_ids = args.doc or [doc["doc_id"] for doc in list_documents()]
+    print(f"Reindexing {len(doc_ids)} documents with {args.max_tokens}-token chunks")
+    done = 0
+
+    def progress(result):
+        nonlocal done
+        done += 1
+        if result["status"] == "failed":
+            print(f"\n  failed {result['doc_id']}: {result['error']}", file=sys.stderr)
+        print(f"\r  {done}/{len(doc_ids)}", end="", flush=True)
+
+    summary = reindex_documents(
+        doc_ids, args.workers, progress,
+        max_tokens=args.max_tokens, embedding_provider=args.provider, embedding_model=args.model, force=args.force
+    )
+    print(f"\nReindexed {summary['reindexed']} documents ({summary['chunks']} chunks) in {summary['duration_s']:.1f}s, "
+          f"{summary['skipped']} already up to date, {summary['failed']} failed")
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--doc", action="append", help="document to reindex (repeatable; default: all)")
+    parser.add_argument("--max-tokens", type=int, help="tokens per chunk (default: CHUNK_MAX_TOKENS)")
+    parser.add_argument("--provider", choices=["openai", "hashing"], help="embedding provider (default: each document's own)")
+    parser.add_argument("--model", help="embedding model (default: the document's, or the provider's default)")
+    parser.add_argument("--workers", type=int, default=4, help="documents reindexed at once")
+    parser.add_argument("--force", action="store_true", help="reindex documents that are already up to date")
+    args = parser.parse_args()
+    if args.max_tokens is None:
+        from utils.config import CHUNK_MAX_TOKENS
+        args.max_tokens = CHUNK_MAX_TOKENS
+    try:
+        sys.exit(run(args))
+    except KeyboardInterrupt:
+        sys.exit("\nInterrupted. Run the same command again to resume.")
@@ -0,0 +1,88 @@
+import math
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from db.maintenance import run_maintenance
+from routers.auth import require_session
+from services.reindex import PagesUnavailable, ReindexConflict, reindex_document
+from services.upstream import UpstreamUnavailable
+from utils.config import CHUNK_MAX_TOKENS, PROFILING_ENABLED, PROFILING_MAX_REQUESTS
+from utils.executors import io_executor
+from utils.profiling import profiler
+
+router = APIRouter(tags=["admin"], dependencies=[Depends(require_session)])
+
+class ProfileRequest(BaseModel):
+    mode: Literal["cpu", "memory"] = "cpu"
+    requests: int = Field(default=10, ge=1)
+    sample_rate: float = Field(default=1.0, gt=0, le=1)
+
+def _require_profiling():
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+
+@router.post("/admin/profile", dependencies=[Depends(_require_profiling)])
+def start_profile(body: ProfileRequest):
+    """
+    Profile the next `requests` API requests (cProfile for "cpu", tracemalloc for "memory").
+    The aggregated report is returned by GET /api/admin/profile once they have completed.
+    """
+    if body.requests > PROFILING_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {PROFILING_MAX_REQUESTS} requests can be profiled at once.")
+    try:
+        profiler.start(body.mode, body.requests, body.sample_rate)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+@router.get("/admin/profile", dependencies=[Depends(_require_profiling)])
+def get_profile():
+    """Progress of the current profiling session, or the report of the last one."""
+    return profiler.status()
+
+@router.delete("/admin/profile", dependencies=[Depends(_require_profiling)])
+def stop_profile():
+    """Stop profiling early and build the report from the requests captured so far."""
+    profiler.stop()
+    return profiler.status()
+
+@router.post("/admin/maintenance")
+async def maintenance(dry_run: bool = Query(default=False, description="Report what would be done without changing anything")):
+    """
+    Run storage maintenance now: expire documents, remove leftover files, evict least recently
+    accessed documents while over STORE_QUOTA_BYTES and compact fragmented documents.
+    """
+    report = await io_executor.run(run_maintenance, dry_run)
+    if report is None:
+        raise HTTPException(status_code=409, detail="Maintenance is already running.")
+    return report
+
+class ReindexRequest(BaseModel):
+    max_tokens: int = Field(default=CHUNK_MAX_TOKENS, ge=50, le=8000)
+    embedding_provider: Optional[Literal["openai", "hashing"]] = None  # default: the document's own
+    embedding_model: Optional[str] = None
+    force: bool = False
+
+@router.post("/admin/reindex/{doc_id}")
+async def reindex(doc_id: str, body: ReindexRequest = ReindexRequest()):
+    """
+    Re-chunk and re-embed a document from its stored page texts, without its PDF. To reindex
+    the whole corpus, run `python reindex.py` instead.
+    """
+    try:
+        report = await io_executor.run(
+            reindex_document, doc_id, body.max_tokens, body.embedding_provider, body.embedding_model, body.force
+        )
+    except (PagesUnavailable, ReindexConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid embedding model: {e}")
+    except UpstreamUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The embedding service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    if report is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return report
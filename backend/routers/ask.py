@@ -1,24 +1,44 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional
 import json
+import math
+import time
 import asyncio
-from services.embeddings import embed_query
-from db.vector_store import LocalFaissStore
-from services.qa import answer_with_context, answer_with_context_stream
-from routers.rate_limit import get_client_identifier, rate_limiter
-from utils.logger import log_rate_limit_violation
+from db.store_cache import open_store
+from db.vector_store import LocalFaissStore, document_signature, record_access
+from services.retrieval import embed_question, embed_questions, retrieve, retrieve_batch
+from services.sessions import (
+    add_turn, answered, create_session, delete_session, load_session, retain, retrieval_reason, save_session,
+    session_hits, session_prompt
+)
+from services.qa import CompletionCancel, answer_with_context, answer_with_context_stream
+from services.upstream import UpstreamUnavailable
+from routers.rate_limit import rate_limit
+from utils.config import (
+    BATCH_ASK_CONCURRENCY, CONTEXT_TOKEN_BUDGET, CONVERSATION_TTL_SECONDS, MMR_ENABLED, RETRIEVAL_MODE,
+    SESSION_CONTEXT_TOKENS
+)
+from utils.executors import ExecutorSaturated, io_executor, search_executor, stream_executor
+from utils.metrics import STAGE_SECONDS, time_stage
+from utils.sse import HEARTBEAT, event, stream_chunks
 
 router = APIRouter(tags=["qa"])
 
 MAX_QUESTION_LENGTH = 2000  # Maximum question length
 REQUEST_TIMEOUT = 30  # Timeout for AI operations in seconds
+MAX_BATCH_QUESTIONS = 50  # Maximum questions per batch request
 
 class AskRequest(BaseModel):
     question: str = Field(..., min_length=1, max_length=MAX_QUESTION_LENGTH)
     use_web_search: bool = False
     top_k: int = Field(default=3, ge=1, le=10)
     stream: bool = False
+    max_context_tokens: Optional[int] = Field(default=None, ge=100, le=8000)
+    diversify: Optional[bool] = None  # MMR re-ranking; defaults to MMR_ENABLED
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = None  # Defaults to RETRIEVAL_MODE
+    session_id: Optional[str] = None  # From POST /api/{doc_id}/sessions: a follow-up in that conversation
     
     @field_validator('question')
     @classmethod
@@ -29,84 +49,206 @@ class AskRequest(BaseModel):
             raise ValueError(f'Question exceeds maximum length of {MAX_QUESTION_LENGTH} characters')
         return v.strip()
 
-@router.post("/{doc_id}")
-async def ask(doc_id: str, request: AskRequest, req: Request):
-    client_ip = get_client_identifier(req).split(':')[0]  # Extract IP for logging
-    user_agent = req.headers.get("user-agent", "Unknown")
+class BatchAskRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_QUESTIONS)
+    use_web_search: bool = False
+    top_k: int = Field(default=3, ge=1, le=10)
+    max_context_tokens: Optional[int] = Field(default=None, ge=100, le=8000)
+    diversify: Optional[bool] = None  # MMR re-ranking; defaults to MMR_ENABLED
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = None  # Defaults to RETRIEVAL_MODE
+    format: Literal["ndjson", "sse"] = "ndjson"
     
-    # Rate limiting: 20 requests per minute per IP
-    identifier = get_client_identifier(req)
-    is_allowed, remaining, reset_after = rate_limiter.is_allowed(identifier, max_requests=20, window_seconds=60)
-    if not is_allowed:
-        log_rate_limit_violation(client_ip, f"/api/{doc_id}", user_agent)
-        raise HTTPException(
-            status_code=429,
-            detail=f"Rate limit exceeded. Maximum 20 requests per minute. Try again in {reset_after} seconds.",
-            headers={
-                "X-RateLimit-Limit": "20",
-                "X-RateLimit-Remaining": "0",
-                "X-RateLimit-Reset": str(reset_after)
-            }
-        )
-    store = LocalFaissStore(doc_id)
+    @field_validator('questions')
+    @classmethod
+    def validate_questions(cls, v: List[str]) -> List[str]:
+        cleaned = []
+        for question in v:
+            if not question or not question.strip():
+                raise ValueError('Questions cannot be empty')
+            if len(question) > MAX_QUESTION_LENGTH:
+                raise ValueError(f'Question exceeds maximum length of {MAX_QUESTION_LENGTH} characters')
+            cleaned.append(question.strip())
+        return cleaned
+
+def _unavailable(e: UpstreamUnavailable) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The AI service is temporarily unavailable. Please try again shortly.",
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+def _busy(e: ExecutorSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The server is busy. Please try again shortly.",
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+def _diversify(request) -> bool:
+    return MMR_ENABLED if request.diversify is None else request.diversify
+
+def _retrieval_mode(request) -> str:
+    return request.retrieval_mode or RETRIEVAL_MODE
+
+async def _load_store(doc_id: str, operation: str) -> LocalFaissStore:
+    try:
+        with time_stage(operation, "store_load"):
+            store = await io_executor.run(open_store, doc_id)
+    except ExecutorSaturated as e:
+        raise _busy(e)
     if not store.chunks or store.index is None:
         raise HTTPException(status_code=404, detail="Document not found.")
+    record_access(doc_id)
+    return store
+
+async def _retrieve(store: LocalFaissStore, request: AskRequest):
+    # Embedding waits on the API; the search itself is CPU work
+    mode = _retrieval_mode(request)
+    with time_stage("ask", "query_embed"):
+        q = await io_executor.run(embed_question, store, request.question, mode)
+    with time_stage("ask", "search"):
+        return await search_executor.run(
+            retrieve, store, request.question, request.top_k, mode, _diversify(request), q
+        )
+
+async def _session_retrieve(store: LocalFaissStore, session: dict, request: AskRequest):
+    """
+    The session's chunks for this question, retrieving (and adding to them) only if the
+    question drifts from the conversation. Returns (hits, session info for the response).
+    """
+    signature = await io_executor.run(document_signature, store.doc_id)
+    reason, drift = retrieval_reason(session, request.question, signature)
+    if reason:
+        hits = await _retrieve(store, request)
+        max_tokens = request.max_context_tokens or SESSION_CONTEXT_TOKENS
+        await io_executor.run(retain, session, request.question, hits, signature, max_tokens)
+    info = {
+        "session_id": session["session_id"],
+        "retrieval": reason or "reused",
+        "drift": round(drift, 3),
+        "turn": answered(session) + 1
+    }
+    return session_hits(session), info
+
+async def _retrieve_batch(store: LocalFaissStore, request: BatchAskRequest):
+    mode = _retrieval_mode(request)
+    with time_stage("ask_batch", "query_embed"):
+        q = await io_executor.run(embed_questions, store, request.questions, mode)
+    with time_stage("ask_batch", "search"):
+        return await search_executor.run(
+            retrieve_batch, store, request.questions, request.top_k, mode, _diversify(request), q
+        )
+
+# Rate limiting: 20 requests per minute per IP
+@router.post("/{doc_id}", dependencies=[Depends(rate_limit("ask", 20, 60, "20 requests per minute"))])
+async def ask(doc_id: str, request: AskRequest, req: Request):
+    store = await _load_store(doc_id, "ask")
+    session = None
+    if request.session_id:
+        session = await io_executor.run(load_session, request.session_id)
+        if session is None or session["doc_id"] != doc_id:
+            raise HTTPException(status_code=404, detail="Session not found or expired.")
     
     try:
+        # Each open stream holds a stream_executor thread until it ends; when they are all taken,
+        # turn the request away before retrieval rather than with an error event inside the stream
+        if request.stream and stream_executor.full:
+            raise ExecutorSaturated(stream_executor.name)
         # Add timeout protection for AI operations
-        q = await asyncio.wait_for(
-            asyncio.to_thread(embed_query, request.question),
-            timeout=REQUEST_TIMEOUT
-        )
-        hits = await asyncio.wait_for(
-            asyncio.to_thread(store.search, q, request.top_k),
-            timeout=REQUEST_TIMEOUT
-        )
+        if session is None:
+            hits = await asyncio.wait_for(_retrieve(store, request), timeout=REQUEST_TIMEOUT)
+            prompt_contexts = [h[2] for h in hits]
+            answer_kwargs = {}
+        else:
+            hits, session_info = await asyncio.wait_for(_session_retrieve(store, session, request), timeout=REQUEST_TIMEOUT)
+            # The session's chunks are already packed; each goes after the turns before it was
+            # retrieved, exactly as sent before, so the prompt extends the previous one
+            history, prompt_contexts = session_prompt(session)
+            answer_kwargs = {"history": history, "packed": True}
         contexts = [h[2] for h in hits]
         page_numbers_list = [h[3] if len(h) > 3 else [] for h in hits]
+        max_context_tokens = request.max_context_tokens or CONTEXT_TOKEN_BUDGET
         
         # Determine if web search was used
         web_results = []
         if request.use_web_search:
             from services.web_search import search_web
-            web_results = await asyncio.wait_for(
-                asyncio.to_thread(search_web, request.question, 5),
-                timeout=10  # Shorter timeout for web search
-            )
+            with time_stage("ask", "web_search"):
+                web_results = await asyncio.wait_for(
+                    io_executor.run(search_web, request.question, 5),
+                    timeout=10  # Shorter timeout for web search
+                )
         
         # Stream response if requested
         if request.stream:
-            def generate():
+            async def generate():
                 # Send initial metadata with page numbers
                 contexts_with_pages = [
                     {"text": contexts[i], "page_numbers": page_numbers_list[i] if i < len(page_numbers_list) else []}
                     for i in range(len(contexts))
                 ]
-                yield f"data: {json.dumps({'type': 'start', 'sources': {'document': len(contexts) > 0, 'web': request.use_web_search and len(web_results) > 0}, 'contexts': contexts_with_pages})}\n\n"
+                start = {
+                    'type': 'start',
+                    'sources': {'document': len(contexts) > 0, 'web': request.use_web_search and len(web_results) > 0},
+                    'contexts': contexts_with_pages
+                }
+                if session is not None:
+                    start['session'] = session_info
+                yield event(start)
                 
-                # Stream answer chunks
+                # Stream answer chunks, coalesced into frames; if the client goes away, the
+                # upstream completion is closed instead of being read to the end
+                usage = {}
+                started = time.perf_counter()
+                first_token = True
+                answer = []
+                cancel = CompletionCancel()
                 try:
-                    for chunk in answer_with_context_stream(request.question, contexts, use_web_search=request.use_web_search):
-                        yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
+                    stream = answer_with_context_stream(
+                        request.question,
+                        prompt_contexts,
+                        use_web_search=request.use_web_search,
+                        max_context_tokens=max_context_tokens,
+                        usage=usage,
+                        cancel=cancel,
+                        **answer_kwargs
+                    )
+                    async for frame in stream_chunks(stream_executor, stream, cancel=cancel, collect=answer):
+                        if first_token and frame is not HEARTBEAT:
+                            STAGE_SECONDS.observe(time.perf_counter() - started, "ask", "llm_first_token")
+                            first_token = False
+                        yield frame
                 except Exception as e:
-                    yield f"data: {json.dumps({'type': 'error', 'content': 'An error occurred while generating the answer.'})}\n\n"
+                    answer = None
+                    yield event({'type': 'error', 'content': 'An error occurred while generating the answer.'})
+                STAGE_SECONDS.observe(time.perf_counter() - started, "ask", "llm_total")
+                if session is not None:
+                    # Keep the retrieval even if the answer failed; only answered turns join the history
+                    if answer is not None:
+                        add_turn(session, request.question, "".join(answer))
+                    await io_executor.run(save_session, session)
                 
-                # Send end signal
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                # Send end signal with token usage
+                yield event({'type': 'done', 'usage': usage})
             
             return StreamingResponse(generate(), media_type="text/event-stream")
         
         # Non-streaming response with timeout
-        result = await asyncio.wait_for(
-            asyncio.to_thread(answer_with_context, request.question, contexts, request.use_web_search),
-            timeout=REQUEST_TIMEOUT
-        )
+        with time_stage("ask", "llm_total"):
+            result = await asyncio.wait_for(
+                io_executor.run(
+                    answer_with_context, request.question, prompt_contexts, request.use_web_search, max_context_tokens,
+                    **answer_kwargs
+                ),
+                timeout=REQUEST_TIMEOUT
+            )
         
         # Return snippets with scores and page numbers for transparency
-        return {
+        response = {
             "doc_id": doc_id,
             "answer": result["answer"],
             "sources": result["sources"],
+            "usage": result["usage"],
             "contexts": [
                 {
                     "rank": i+1, 
@@ -114,16 +256,145 @@ async def ask(doc_id: str, request: AskRequest, req: Request):
                     "text": t,
                     "page_numbers": page_numbers_list[i] if i < len(page_numbers_list) else []
                 } 
-                for i, (_, s, t) in enumerate(hits)
+                for i, (_, s, t, *_) in enumerate(hits)
             ]
         }
+        if session is not None:
+            add_turn(session, request.question, result["answer"])
+            await io_executor.run(save_session, session)
+            response["session"] = session_info
+        return response
     except asyncio.TimeoutError:
         raise HTTPException(
             status_code=504,
             detail="Request timeout. The operation took too long. Please try again with a simpler question."
         )
+    except UpstreamUnavailable as e:
+        raise _unavailable(e)
+    except ExecutorSaturated as e:
+        raise _busy(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail="An error occurred while processing your question. Please try again later."
         )
+
+
+# Rate limiting: 10 new sessions per minute per IP
+@router.post("/{doc_id}/sessions", dependencies=[Depends(rate_limit("ask_session", 10, 60, "10 sessions per minute"))])
+async def start_session(doc_id: str, req: Request):
+    """
+    Start a conversation about a document. Asks that pass the returned session_id reuse the
+    chunks retrieved for earlier turns while the questions stay on topic, and send earlier
+    turns along, in a prompt that extends the previous one (see services/sessions.py).
+    """
+    if await io_executor.run(document_signature, doc_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    session = await io_executor.run(create_session, doc_id)
+    return {"session_id": session["session_id"], "doc_id": doc_id, "expires_in": CONVERSATION_TTL_SECONDS}
+
+@router.delete("/{doc_id}/sessions/{session_id}")
+async def end_session(doc_id: str, session_id: str):
+    session = await io_executor.run(load_session, session_id)
+    if session is None or session["doc_id"] != doc_id:
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+    await io_executor.run(delete_session, session_id)
+    return {"message": "Session ended", "session_id": session_id}
+
+# Rate limiting: 5 batch requests per minute per IP
+@router.post("/{doc_id}/batch", dependencies=[Depends(rate_limit("ask_batch", 5, 60, "5 batch requests per minute"))])
+async def ask_batch(doc_id: str, request: BatchAskRequest, req: Request):
+    """
+    Answer many questions against one document in a single request.
+    All questions are embedded in one API call and searched with one matrix search
+    (or looked up in the BM25 index only, in lexical mode);
+    answers are generated with bounded concurrency and streamed back as they complete.
+    """
+    store = await _load_store(doc_id, "ask_batch")
+    
+    questions = request.questions
+    try:
+        all_hits = await asyncio.wait_for(_retrieve_batch(store, request), timeout=REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Request timeout. The operation took too long. Please try again with fewer questions."
+        )
+    except UpstreamUnavailable as e:
+        raise _unavailable(e)
+    except ExecutorSaturated as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while processing your questions. Please try again later."
+        )
+    
+    semaphore = asyncio.Semaphore(BATCH_ASK_CONCURRENCY)
+    max_context_tokens = request.max_context_tokens or CONTEXT_TOKEN_BUDGET
+    
+    async def answer_one(i: int) -> dict:
+        hits = all_hits[i]
+        contexts = [h[2] for h in hits]
+        async with semaphore:
+            try:
+                with time_stage("ask_batch", "llm_total"):
+                    result = await asyncio.wait_for(
+                        io_executor.run(
+                            answer_with_context, questions[i], contexts, request.use_web_search, max_context_tokens
+                        ),
+                        timeout=REQUEST_TIMEOUT
+                    )
+            except asyncio.TimeoutError:
+                return {"type": "error", "index": i, "question": questions[i], "detail": "Request timeout."}
+            except UpstreamUnavailable:
+                return {
+                    "type": "error",
+                    "index": i,
+                    "question": questions[i],
+                    "detail": "The AI service is temporarily unavailable."
+                }
+            except ExecutorSaturated:
+                return {"type": "error", "index": i, "question": questions[i], "detail": "The server is busy."}
+            except Exception:
+                return {
+                    "type": "error",
+                    "index": i,
+                    "question": questions[i],
+                    "detail": "An error occurred while generating the answer."
+                }
+        return {
+            "type": "result",
+            "index": i,
+            "question": questions[i],
+            "answer": result["answer"],
+            "sources": result["sources"],
+            "usage": result["usage"],
+            "contexts": [
+                {"rank": rank + 1, "score": s, "text": t, "page_numbers": pages}
+                for rank, (_, s, t, pages) in enumerate(hits)
+            ]
+        }
+    
+    if request.format == "sse":
+        def frame(payload: dict) -> str:
+            return f"data: {json.dumps(payload)}\n\n"
+        media_type = "text/event-stream"
+    else:
+        def frame(payload: dict) -> str:
+            return json.dumps(payload) + "\n"
+        media_type = "application/x-ndjson"
+    
+    async def generate():
+        tasks = [asyncio.create_task(answer_one(i)) for i in range(len(questions))]
+        try:
+            # Emit each answer as soon as it is ready; "index" ties it back to the request
+            for next_done in asyncio.as_completed(tasks):
+                yield frame(await next_done)
+            yield frame({"type": "done", "count": len(questions)})
+        finally:
+            # Client went away: don't start answers nobody will read
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(generate(), media_type=media_type)
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import BaseModel, Field
+from routers.rate_limit import rate_limit
+from utils.config import ENVIRONMENT
+from utils.logger import log_failed_login, log_successful_login
+from utils.security import (
+    brute_force_protection, password_verifier, VerifierBusy,
+    issue_session_token, verify_session_token, SESSION_TTL_SECONDS
+)
+
+router = APIRouter(tags=["auth"])
+
+SESSION_COOKIE = "docassist_session"
+
+class LoginRequest(BaseModel):
+    password: str = Field(..., min_length=1, max_length=1024)
+
+def get_session_token(request: Request) -> Optional[str]:
+    """Read the session token from the cookie or an 'Authorization: Bearer' header."""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return request.cookies.get(SESSION_COOKIE)
+
+# Rate limiting: 10 requests per minute per IP, on top of per-IP lockouts
+@router.post("/auth/login", dependencies=[Depends(rate_limit("login", 10, 60, "10 login attempts per minute"))])
+async def login(body: LoginRequest, request: Request, response: Response):
+    ip = request.client.host if request.client else "unknown"
+    user_agent = request.headers.get("user-agent")
+
+    if brute_force_protection.is_locked(ip):
+        remaining = brute_force_protection.get_remaining_lockout_time(ip)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many failed attempts. Please try again in {max(1, remaining // 60)} minute(s).",
+            headers={"Retry-After": str(remaining)}
+        )
+
+    # Apply exponential backoff delay
+    delay = brute_force_protection.get_delay(ip)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    try:
+        is_valid = await password_verifier.verify(body.password)
+    except VerifierBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+
+    if not is_valid:
+        brute_force_protection.record_failed_attempt(ip)
+        log_failed_login(ip, user_agent)
+        raise HTTPException(status_code=401, detail="Incorrect password.")
+
+    brute_force_protection.record_success(ip)
+    log_successful_login(ip, user_agent)
+
+    token = issue_session_token()
+    is_production = ENVIRONMENT == "production"
+    response.set_cookie(
+        SESSION_COOKIE,
+        token,
+        max_age=SESSION_TTL_SECONDS,
+        httponly=True,
+        secure=is_production,
+        samesite="strict" if is_production else "lax"
+    )
+    return {"success": True, "token": token, "expires_in": SESSION_TTL_SECONDS}
+
+def require_session(request: Request):
+    """Dependency for endpoints only a logged-in user may call. Only an HMAC check; bcrypt never runs after login."""
+    if not verify_session_token(get_session_token(request)):
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+
+@router.get("/auth/check", dependencies=[Depends(require_session)])
+def check(request: Request):
+    return {"authenticated": True}
+
+@router.post("/auth/logout")
+def logout(response: Response):
+    response.delete_cookie(SESSION_COOKIE)
+    return {"success": True}
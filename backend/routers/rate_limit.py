@@ -1,67 +1,164 @@
 from fastapi import Request, HTTPException
-from functools import lru_cache
-from collections import defaultdict
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Optional, Tuple
+import math
+import os
+import sqlite3
+import threading
 import time
 import hashlib
+from utils.config import RATE_LIMIT_BACKEND, RATE_LIMIT_DB_PATH, RATE_LIMIT_ENABLED
 from utils.logger import log_rate_limit_violation
 
-# Simple in-memory rate limiter
-# For production, consider using Redis or a proper rate limiting library
+# Sliding window counter: requests are counted in fixed windows, and the previous
+# window's count is weighted by how much of it still overlaps the sliding window.
+# Each key holds three numbers, so every check is O(1) whatever the request rate.
+def _slide(
+    state: Optional[Tuple[float, int, int]],
+    max_requests: int,
+    window_seconds: int,
+    now: float
+) -> Tuple[bool, int, int, Tuple[float, int, int]]:
+    """
+    Apply one request to a (window_start, current_count, previous_count) state.
+    Returns: (is_allowed, remaining_requests, reset_after_seconds, new_state)
+    """
+    # Integral boundaries compare exactly, across calls and across workers
+    window_start = int(now // window_seconds) * window_seconds
+    current, previous = 0, 0
+    if state is not None:
+        if state[0] == window_start:
+            current, previous = state[1], state[2]
+        elif state[0] == window_start - window_seconds:
+            previous = state[1]
+
+    elapsed = now - window_start
+    previous_weight = (window_seconds - elapsed) / window_seconds
+    estimate = previous * previous_weight + current
+
+    if estimate + 1 > max_requests:
+        # Wait until the previous window's share has decayed enough, or for the next window
+        if previous and current < max_requests:
+            wait = window_seconds - elapsed - (max_requests - 1 - current) * window_seconds / previous
+        else:
+            wait = window_seconds - elapsed
+        return False, 0, max(1, math.ceil(wait)), (window_start, current, previous)
+
+    current += 1
+    remaining = max(0, math.floor(max_requests - estimate - 1))
+    return True, remaining, window_seconds, (window_start, current, previous)
+
+class MemoryRateLimitBackend:
+    """Per-process counters. Keys are kept in last-used order so expired ones are swept from the front."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self.entries: "OrderedDict[str, Tuple[Tuple[float, int, int], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, int, int]:
+        with self._lock:
+            entry = self.entries.get(key)
+            allowed, remaining, reset_after, state = _slide(
+                entry[0] if entry else None, max_requests, window_seconds, now
+            )
+            # A key is irrelevant once both of its windows have passed
+            self.entries[key] = (state, state[0] + 2 * window_seconds)
+            self.entries.move_to_end(key)
+            self._sweep(now)
+            return allowed, remaining, reset_after
+
+    def _sweep(self, now: float):
+        # Least recently used keys are at the front; stop at the first live one
+        while self.entries:
+            key, (_, expires_at) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.max_keys:
+                break
+            self.entries.popitem(last=False)
+
+class SQLiteRateLimitBackend:
+    """
+    Counters in a SQLite file shared by every worker on the host, so N workers
+    enforce one limit instead of N. Each check is one short write transaction.
+    """
+
+    SWEEP_EVERY = 1000  # Delete expired rows every N checks
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._checks = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, window_start REAL, current INTEGER, previous INTEGER, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS rate_limits_expires ON rate_limits (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, int, int]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, current, previous FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            allowed, remaining, reset_after, state = _slide(row, max_requests, window_seconds, now)
+            conn.execute(
+                "INSERT INTO rate_limits (key, window_start, current, previous, expires_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET window_start = excluded.window_start, "
+                "current = excluded.current, previous = excluded.previous, expires_at = excluded.expires_at",
+                (key, state[0], state[1], state[2], state[0] + 2 * window_seconds)
+            )
+            self._checks += 1
+            if self._checks % self.SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM rate_limits WHERE expires_at < ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, remaining, reset_after
+
+def create_backend(kind: str = RATE_LIMIT_BACKEND):
+    if kind == "sqlite":
+        return SQLiteRateLimitBackend(RATE_LIMIT_DB_PATH)
+    if kind == "memory":
+        return MemoryRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend: {kind}")
+
 class RateLimiter:
-    def __init__(self):
-        self.requests = defaultdict(list)
-        self.cleanup_interval = 300  # Clean up old entries every 5 minutes
-        self.last_cleanup = time.time()
-
-    def _cleanup_old_entries(self):
-        """Remove entries older than 1 hour"""
-        current_time = time.time()
-        if current_time - self.last_cleanup > self.cleanup_interval:
-            cutoff_time = current_time - 3600  # 1 hour
-            for key in list(self.requests.keys()):
-                self.requests[key] = [
-                    req_time for req_time in self.requests[key]
-                    if req_time > cutoff_time
-                ]
-                if not self.requests[key]:
-                    del self.requests[key]
-            self.last_cleanup = current_time
-
-    def is_allowed(self, identifier: str, max_requests: int, window_seconds: int) -> tuple:
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryRateLimitBackend()
+
+    def is_allowed(
+        self,
+        identifier: str,
+        max_requests: int,
+        window_seconds: int,
+        now: Optional[float] = None
+    ) -> tuple:
         """
-        Check if request is allowed
-        
+        Check if request is allowed, and count it if so
+
         Returns:
             (is_allowed, remaining_requests, reset_after_seconds)
         """
-        self._cleanup_old_entries()
-        
-        current_time = time.time()
-        cutoff_time = current_time - window_seconds
-        
-        # Filter out old requests
-        self.requests[identifier] = [
-            req_time for req_time in self.requests[identifier]
-            if req_time > cutoff_time
-        ]
-        
-        # Check if limit exceeded
-        request_count = len(self.requests[identifier])
-        if request_count >= max_requests:
-            # Calculate reset time
-            oldest_request = min(self.requests[identifier]) if self.requests[identifier] else current_time
-            reset_after = int(window_seconds - (current_time - oldest_request))
-            return False, 0, reset_after
-        
-        # Add current request
-        self.requests[identifier].append(current_time)
-        remaining = max_requests - request_count - 1
-        reset_after = window_seconds
-        return True, remaining, reset_after
+        # Wall-clock time so windows line up across workers
+        return self.backend.acquire(identifier, max_requests, window_seconds, time.time() if now is None else now)
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(create_backend())
 
 def get_client_identifier(request: Request) -> str:
     """
@@ -70,47 +167,45 @@ def get_client_identifier(request: Request) -> str:
     """
     client_ip = request.client.host if request.client else "unknown"
     user_agent = request.headers.get("user-agent", "")
-    
+
     # Create a combined identifier hash for better tracking
-    # In production, consider using Redis with IP + fingerprint
     combined = f"{client_ip}:{user_agent}"
     identifier_hash = hashlib.md5(combined.encode()).hexdigest()
-    
+
     # Return IP for logging, but use hash for rate limiting
     return f"{client_ip}:{identifier_hash[:8]}"
 
-def rate_limit(max_requests: int = 10, window_seconds: int = 60):
+def rate_limit(scope: str, max_requests: int, window_seconds: int, description: str):
     """
-    Rate limiting decorator/middleware
-    
+    FastAPI dependency enforcing a per-client limit for one endpoint.
+
     Args:
+        scope: Name of the limit; each scope is counted separately
         max_requests: Maximum number of requests allowed
         window_seconds: Time window in seconds
-    """
-    def decorator(func):
-        async def wrapper(*args, **kwargs):
-            # Extract request from args/kwargs
-            request = None
-            for arg in args:
-                if isinstance(arg, Request):
-                    request = arg
-                    break
-            
-            if not request:
-                for key, value in kwargs.items():
-                    if isinstance(value, Request):
-                        request = value
-                        break
-            
-            if request:
-                identifier = get_client_identifier(request)
-                if not rate_limiter.is_allowed(identifier, max_requests, window_seconds):
-                    raise HTTPException(
-                        status_code=429,
-                        detail=f"Rate limit exceeded. Maximum {max_requests} requests per {window_seconds} seconds."
-                    )
-            
-            return await func(*args, **kwargs)
-        return wrapper
-    return decorator
+        description: Human-readable limit for the error message, e.g. "20 requests per minute"
 
+    Usage:
+        @router.post("/path", dependencies=[Depends(rate_limit("ask", 20, 60, "20 requests per minute"))])
+    """
+    def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        identifier = get_client_identifier(request)
+        is_allowed, remaining, reset_after = rate_limiter.is_allowed(
+            f"{scope}:{identifier}", max_requests, window_seconds
+        )
+        if not is_allowed:
+            log_rate_limit_violation(
+                identifier.split(':')[0], request.url.path, request.headers.get("user-agent", "Unknown")
+            )
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded. Maximum {description}. Try again in {reset_after} seconds.",
+                headers={
+                    "X-RateLimit-Limit": str(max_requests),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(reset_after)
+                }
+            )
+    return dependency
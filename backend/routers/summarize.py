@@ -1,41 +1,44 @@
-from fastapi import APIRouter, HTTPException, Request, Query
-from db.vector_store import LocalFaissStore
+import math
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from db.store_cache import open_store
+from db.vector_store import record_access
 from services.summarizer import summarize_text
-from routers.rate_limit import get_client_identifier, rate_limiter
-from utils.logger import log_rate_limit_violation
+from services.upstream import UpstreamUnavailable
+from routers.rate_limit import rate_limit
+from utils.executors import ExecutorSaturated, io_executor
+from utils.metrics import time_stage
 
 router = APIRouter(tags=["summarize"])
 
-@router.post("/summarize")
+# Rate limiting: 10 requests per minute per IP
+@router.post("/summarize", dependencies=[Depends(rate_limit("summarize", 10, 60, "10 requests per minute"))])
 async def summarize(
     doc_id: str, 
     request: Request,
     expanded: bool = Query(default=False, description="Generate an expanded, detailed summary")
 ):
-    client_ip = get_client_identifier(request).split(':')[0]  # Extract IP for logging
-    user_agent = request.headers.get("user-agent", "Unknown")
-    
-    # Rate limiting: 10 requests per minute per IP
-    identifier = get_client_identifier(request)
-    is_allowed, remaining, reset_after = rate_limiter.is_allowed(identifier, max_requests=10, window_seconds=60)
-    if not is_allowed:
-        log_rate_limit_violation(client_ip, "/api/summarize", user_agent)
+    try:
+        with time_stage("summarize", "store_load"):
+            store = await io_executor.run(open_store, doc_id)
+        if not store.chunks:
+            raise HTTPException(status_code=404, detail="Document not found.")
+        record_access(doc_id)
+        
+        # Use more chunks for expanded summaries
+        num_chunks = 50 if expanded else 20
+        joined = "\n".join(store.chunks[:num_chunks])
+        with time_stage("summarize", "llm_total"):
+            summary = await io_executor.run(summarize_text, joined, max_words=220, expanded=expanded)
+    except ExecutorSaturated as e:
         raise HTTPException(
-            status_code=429,
-            detail=f"Rate limit exceeded. Maximum 10 requests per minute. Try again in {reset_after} seconds.",
-            headers={
-                "X-RateLimit-Limit": "10",
-                "X-RateLimit-Remaining": "0",
-                "X-RateLimit-Reset": str(reset_after)
-            }
+            status_code=503,
+            detail="The server is busy. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except UpstreamUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The AI service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
         )
-    
-    store = LocalFaissStore(doc_id)
-    if not store.chunks:
-        raise HTTPException(status_code=404, detail="Document not found.")
-    
-    # Use more chunks for expanded summaries
-    num_chunks = 50 if expanded else 20
-    joined = "\n".join(store.chunks[:num_chunks])
-    summary = summarize_text(joined, max_words=220, expanded=expanded)
     return {"doc_id": doc_id, "summary": summary, "expanded": expanded}
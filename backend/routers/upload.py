@@ -1,14 +1,24 @@
 import uuid
 import os
 import re
-from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, HTTPException, Request
-from services.pdf_parser import extract_pdf_text
-from utils.chunker import chunk_text
-from services.embeddings import embed_texts
-from db.vector_store import LocalFaissStore
-from routers.rate_limit import get_client_identifier, rate_limiter
-from utils.logger import log_file_upload, log_rate_limit_violation
+import math
+from datetime import datetime, timezone
+from typing import Collection, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
+from services.pdf_parser import extract_pages
+from utils.chunker import chunk_pages
+from services.embeddings import embed_texts, get_embedding_provider
+from services.upstream import UpstreamUnavailable
+from services.versioning import (
+    assemble_version, chunk_max_tokens, document_pages, known_content_hashes, new_document_metadata, page_hashes,
+    pages_match, plan_version, version_entry, version_history, version_pages
+)
+from db.vector_store import LocalFaissStore, StoreConflict, document_signature, read_pages, write_pages
+from routers.rate_limit import get_client_identifier, rate_limit
+from utils.config import CHUNK_MAX_TOKENS
+from utils.executors import ExecutorSaturated, io_executor, parse_executor
+from utils.logger import log_file_upload
+from utils.metrics import record_cache, time_stage
 
 router = APIRouter(tags=["upload"])
 
@@ -48,26 +58,21 @@ def sanitize_filename(filename: str) -> str:
     
     return filename
 
-@router.post("/upload")
-async def upload(request: Request, file: UploadFile = File(...)):
-    client_ip = get_client_identifier(request).split(':')[0]  # Extract IP for logging
-    user_agent = request.headers.get("user-agent", "Unknown")
-    
-    # Rate limiting: 5 uploads per hour per IP
-    identifier = get_client_identifier(request)
-    is_allowed, remaining, reset_after = rate_limiter.is_allowed(identifier, max_requests=5, window_seconds=3600)
-    if not is_allowed:
-        log_rate_limit_violation(client_ip, "/api/upload", user_agent)
-        raise HTTPException(
-            status_code=429,
-            detail=f"Rate limit exceeded. Maximum 5 uploads per hour. Try again in {reset_after} seconds.",
-            headers={
-                "X-RateLimit-Limit": "5",
-                "X-RateLimit-Remaining": "0",
-                "X-RateLimit-Reset": str(reset_after)
-            }
-        )
-    
+def _busy(e: ExecutorSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The server is busy processing other documents. Please try again shortly.",
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+async def _read_pdf(
+    file: UploadFile, client_ip: str, operation: str, known_hashes: Collection[str] = frozenset()
+) -> Tuple[bytes, str, List[str], Dict[int, str]]:
+    """
+    Validate an uploaded PDF and extract the text of its pages, skipping pages whose
+    content hash is in known_hashes.
+    Returns: (file_bytes, safe_filename, content_hashes, page_texts)
+    """
     # Validate file type
     if file.content_type not in ("application/pdf", "application/octet-stream"):
         raise HTTPException(
@@ -97,9 +102,13 @@ async def upload(request: Request, file: UploadFile = File(...)):
     # Sanitize filename
     safe_filename = sanitize_filename(file.filename or "untitled.pdf")
     
-    # Extract text from PDF with timeout protection
+    # Extract text from PDF in the parse process pool, off the event loop
     try:
-        text, pages, page_mapping = extract_pdf_text(file_bytes)
+        with time_stage(operation, "parse"):
+            content_hashes, page_texts = await parse_executor.run(extract_pages, file_bytes, known_hashes)
+    except ExecutorSaturated as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise _busy(e)
     except Exception as e:
         log_file_upload(client_ip, safe_filename, len(file_bytes), False)
         raise HTTPException(
@@ -107,26 +116,50 @@ async def upload(request: Request, file: UploadFile = File(...)):
             detail="Failed to extract text from PDF. The file may be corrupted or encrypted."
         )
     
-    if not text.strip():
+    # A new version may reuse every page, so it's checked once its chunks are known
+    if not known_hashes and not any(text.strip() for text in page_texts.values()):
         log_file_upload(client_ip, safe_filename, len(file_bytes), False)
         raise HTTPException(
             status_code=400, 
             detail="No extractable text found in PDF. The PDF may be image-based or corrupted."
         )
+    
+    return file_bytes, safe_filename, content_hashes, page_texts
+
+# Rate limiting: 5 uploads per hour per IP
+@router.post("/upload", dependencies=[Depends(rate_limit("upload", 5, 3600, "5 uploads per hour"))])
+async def upload(
+    request: Request,
+    file: UploadFile = File(...),
+    ttl_seconds: Optional[int] = Query(default=None, ge=0, description="Delete the document after this many seconds (0 = never)")
+):
+    client_ip = get_client_identifier(request).split(':')[0]  # Extract IP for logging
+    
+    file_bytes, safe_filename, content_hashes, page_texts = await _read_pdf(file, client_ip, "upload")
+    pages = len(content_hashes)
 
     # Process document
     try:
         doc_id = str(uuid.uuid4())
-        chunks, chunk_metadata = chunk_text(text, max_tokens=500, page_mapping=page_mapping)
-        vectors = embed_texts(chunks)
+        # Page-aligned chunks, so a later version can reuse the chunks of unchanged pages
+        with time_stage("upload", "chunk"):
+            chunks, chunk_metadata = await parse_executor.run(
+                chunk_pages, sorted(page_texts.items()), max_tokens=CHUNK_MAX_TOKENS
+            )
+        provider = get_embedding_provider()
+        # The chunker already tokenized every chunk; don't tokenize them again
+        token_counts = [meta["token_count"] for meta in chunk_metadata]
+        with time_stage("upload", "embed"):
+            vectors = await io_executor.run(embed_texts, chunks, provider, token_counts)
 
         store = LocalFaissStore(doc_id)
-        metadata = {
-            "filename": safe_filename,
-            "upload_date": datetime.utcnow().isoformat(),
-            "pages": pages
-        }
-        store.add(chunks, vectors, chunk_metadata, metadata)
+        metadata = new_document_metadata(safe_filename, content_hashes, page_texts, ttl_seconds)
+        with time_stage("upload", "index"):
+            # Page texts first: a document that exists can always be reindexed (see services/reindex.py)
+            await io_executor.run(write_pages, doc_id, document_pages(content_hashes, page_texts))
+            await io_executor.run(
+                store.add, chunks, vectors, chunk_metadata, metadata, provider.name, provider.model
+            )
         
         log_file_upload(client_ip, safe_filename, len(file_bytes), True)
 
@@ -136,6 +169,16 @@ async def upload(request: Request, file: UploadFile = File(...)):
             "chunks": len(chunks), 
             "filename": safe_filename
         }
+    except ExecutorSaturated as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise _busy(e)
+    except UpstreamUnavailable as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise HTTPException(
+            status_code=503,
+            detail="The embedding service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except Exception as e:
         log_file_upload(client_ip, safe_filename, len(file_bytes), False)
         # Log the actual error for debugging
@@ -153,3 +196,189 @@ async def upload(request: Request, file: UploadFile = File(...)):
             status_code=500,
             detail=detail_msg
         )
+
+# Rate limiting: shares the upload budget (5 per hour per IP)
+@router.post("/upload/{doc_id}/append", dependencies=[Depends(rate_limit("upload", 5, 3600, "5 uploads per hour"))])
+async def append(doc_id: str, request: Request, file: UploadFile = File(...)):
+    """
+    Append a PDF's pages to an existing document (e.g. an amendment to a contract).
+    Only the new chunks are embedded and written, so the cost doesn't grow with the document.
+    """
+    client_ip = get_client_identifier(request).split(':')[0]  # Extract IP for logging
+    
+    store = await io_executor.run(LocalFaissStore, doc_id)
+    if not store.chunks or store.index is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    
+    file_bytes, safe_filename, content_hashes, page_texts = await _read_pdf(file, client_ip, "append")
+    pages = len(content_hashes)
+
+    try:
+        # New pages are numbered after the document's existing ones
+        page_offset = store.metadata.get("pages", 0)
+        with time_stage("append", "chunk"):
+            chunks, chunk_metadata = await parse_executor.run(
+                chunk_pages, [(page_num + page_offset, text) for page_num, text in sorted(page_texts.items())],
+                max_tokens=chunk_max_tokens(store.metadata)
+            )
+        # Embed the same way as the rest of the document
+        provider = get_embedding_provider(store.embedding_provider, store.embedding_model)
+        token_counts = [meta["token_count"] for meta in chunk_metadata]
+        with time_stage("append", "embed"):
+            vectors = await io_executor.run(embed_texts, chunks, provider, token_counts)
+
+        metadata = {
+            "pages": page_offset + pages,
+            "last_appended": datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+        }
+        # Keep page hashes complete so the document can still be versioned page by page
+        if len(store.metadata.get("page_hashes") or []) == page_offset and page_offset:
+            metadata["page_hashes"] = store.metadata["page_hashes"] + page_hashes(content_hashes, page_texts)
+        with time_stage("append", "index"):
+            # Keep the stored page texts complete; without the earlier ones there is nothing to extend
+            old_pages = await io_executor.run(read_pages, doc_id)
+            if old_pages is not None and pages_match(store.metadata, old_pages):
+                await io_executor.run(write_pages, doc_id, old_pages + document_pages(content_hashes, page_texts))
+            await io_executor.run(
+                store.add, chunks, vectors, chunk_metadata, metadata, provider.name, provider.model
+            )
+        
+        log_file_upload(client_ip, safe_filename, len(file_bytes), True)
+
+        return {
+            "doc_id": doc_id,
+            "pages": page_offset + pages,
+            "chunks": len(store.chunks),
+            "added_chunks": len(chunks),
+            "filename": store.metadata.get("filename", safe_filename)
+        }
+    except ExecutorSaturated as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise _busy(e)
+    except UpstreamUnavailable as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise HTTPException(
+            status_code=503,
+            detail="The embedding service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except Exception as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        print(f"[ERROR] Append failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to append to the document. Please try again later."
+        )
+
+# Rate limiting: shares the upload budget (5 per hour per IP)
+@router.post("/upload/{doc_id}/version", dependencies=[Depends(rate_limit("upload", 5, 3600, "5 uploads per hour"))])
+async def upload_version(doc_id: str, request: Request, file: UploadFile = File(...)):
+    """
+    Replace a document with a new version of it. Pages whose text is unchanged keep their
+    chunks and vectors; only edited and new pages are extracted, chunked and embedded.
+    """
+    client_ip = get_client_identifier(request).split(':')[0]  # Extract IP for logging
+    
+    # Taken before the read: the new version is built from it, so it must still be current when committed
+    signature = await io_executor.run(document_signature, doc_id)
+    store = await io_executor.run(LocalFaissStore, doc_id)
+    if not store.chunks or store.index is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    
+    known_hashes = frozenset(known_content_hashes(store.metadata))
+    file_bytes, safe_filename, content_hashes, page_texts = await _read_pdf(file, client_ip, "version", known_hashes)
+    pages = len(content_hashes)
+
+    try:
+        hashes, reused, changed = plan_version(store, content_hashes, page_texts)
+        # Pages of the previous version are a cache of chunks and vectors
+        record_cache("version_pages", True, len(reused))
+        record_cache("version_pages", False, len(changed))
+        chunks, chunk_metadata, vectors = [], [], None
+        if changed:
+            with time_stage("version", "chunk"):
+                chunks, chunk_metadata = await parse_executor.run(
+                    chunk_pages, changed, max_tokens=chunk_max_tokens(store.metadata)
+                )
+        if chunks:
+            # Embed the same way as the rest of the document
+            provider = get_embedding_provider(store.embedding_provider, store.embedding_model)
+            token_counts = [meta["token_count"] for meta in chunk_metadata]
+            with time_stage("version", "embed"):
+                vectors = await io_executor.run(embed_texts, chunks, provider, token_counts)
+
+        all_chunks, all_chunk_metadata, all_vectors = await io_executor.run(
+            assemble_version, store, pages, reused, chunks, chunk_metadata, vectors
+        )
+        if not all_chunks:
+            log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+            raise HTTPException(
+                status_code=400, 
+                detail="No extractable text found in PDF. The PDF may be image-based or corrupted."
+            )
+
+        new_text_hashes = {text for _, text in hashes}
+        removed_pages = sum(1 for _, text in store.metadata.get("page_hashes") or [] if text not in new_text_hashes)
+        history = version_history(store.metadata)
+        version = history[-1]["version"] + 1
+        entry = version_entry(
+            version, safe_filename, pages,
+            reused_pages=len(reused), embedded_pages=len(changed), removed_pages=removed_pages
+        )
+        metadata = {
+            "filename": safe_filename,
+            "pages": pages,
+            "page_hashes": hashes,
+            "version": version,
+            "versions": history + [entry]
+        }
+        with time_stage("version", "index"):
+            old_pages = await io_executor.run(read_pages, doc_id)
+            if old_pages is not None and not pages_match(store.metadata, old_pages):
+                old_pages = None
+            await io_executor.run(
+                store.replace, all_chunks, all_vectors, all_chunk_metadata, metadata, expected_signature=signature
+            )
+            # After the commit, so a rejected version doesn't leave its pages behind
+            pages_text = version_pages(pages, page_texts, reused, old_pages)
+            if pages_text is not None:
+                await io_executor.run(write_pages, doc_id, pages_text)
+        
+        log_file_upload(client_ip, safe_filename, len(file_bytes), True)
+
+        return {
+            "doc_id": doc_id,
+            "version": version,
+            "pages": pages,
+            "chunks": len(all_chunks),
+            "embedded_chunks": len(chunks),
+            "reused_pages": len(reused),
+            "embedded_pages": len(changed),
+            "removed_pages": removed_pages,
+            "filename": safe_filename
+        }
+    except HTTPException:
+        raise
+    except StoreConflict:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise HTTPException(
+            status_code=409,
+            detail="The document was modified while this version was being processed. Please upload it again."
+        )
+    except ExecutorSaturated as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise _busy(e)
+    except UpstreamUnavailable as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        raise HTTPException(
+            status_code=503,
+            detail="The embedding service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except Exception as e:
+        log_file_upload(client_ip, safe_filename, len(file_bytes), False)
+        print(f"[ERROR] Version upload failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to update the document. Please try again later."
+        )
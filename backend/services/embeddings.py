@@ -1,55 +1,197 @@
-from typing import List
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import math
+import re
+import zlib
 import numpy as np
-import tiktoken
-from openai import OpenAI
-from utils.config import OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL
-
-_client = OpenAI(api_key=OPENAI_API_KEY)
+from services.openai_client import get_openai_client
+from services.upstream import call_upstream, INTERACTIVE, BACKGROUND
+from utils.config import (
+    OPENAI_EMBEDDING_MODEL, EMBEDDING_PROVIDER, LOCAL_EMBEDDING_DIM, EMBEDDING_MAX_CONCURRENCY
+)
+from utils.tokenizer import get_encoding
 
 # Maximum tokens per batch (safely under OpenAI's 300k limit)
 MAX_TOKENS_PER_BATCH = 250000
+# Maximum inputs per embeddings request (OpenAI API limit)
+MAX_INPUTS_PER_BATCH = 2048
+# Don't split work into batches smaller than this just to fill every worker
+MIN_TOKENS_PER_BATCH = 8000
 
-def embed_texts(texts: List[str]) -> np.ndarray:
+def pack_batches(
+    token_counts: List[int],
+    concurrency: int = 1,
+    max_tokens: int = MAX_TOKENS_PER_BATCH,
+    max_inputs: int = MAX_INPUTS_PER_BATCH
+) -> List[Tuple[int, int]]:
     """
-    Embed texts with automatic batching to handle large documents.
-    Batches chunks to stay under OpenAI's token limit.
+    Split consecutive texts into batches that respect both per-request limits.
+    Large inputs are split so the tokens spread evenly over `concurrency` workers
+    instead of leaving most workers idle behind a few maximal batches; small inputs
+    (under MIN_TOKENS_PER_BATCH) stay in a single request.
+    Returns (start, end) index ranges in input order.
     """
-    if not texts:
-        return np.array([], dtype="float32")
-    
-    # Use tiktoken to count tokens accurately
-    enc = tiktoken.get_encoding("cl100k_base")
-    
-    # Batch texts to stay under token limit
+    total = sum(token_counts)
+    target_tokens = min(max_tokens, max(MIN_TOKENS_PER_BATCH, math.ceil(total / max(concurrency, 1))))
+
     batches = []
-    current_batch = []
+    start = 0
     current_tokens = 0
-    
-    for text in texts:
-        text_tokens = len(enc.encode(text))
-        
-        # If adding this text would exceed the limit, start a new batch
-        if current_tokens + text_tokens > MAX_TOKENS_PER_BATCH and current_batch:
-            batches.append(current_batch)
-            current_batch = [text]
-            current_tokens = text_tokens
+    for i, tokens in enumerate(token_counts):
+        # If adding this text would exceed a limit, start a new batch
+        if i > start and (current_tokens + tokens > target_tokens or i - start >= max_inputs):
+            batches.append((start, i))
+            start = i
+            current_tokens = 0
+        current_tokens += tokens
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into float32 vectors. Every document records the provider name and
+    model it was embedded with, so its queries are embedded the same way.
+    """
+    name: str = ""
+    model: str = ""
+
+    @abstractmethod
+    def embed(
+        self,
+        texts: List[str],
+        token_counts: Optional[List[int]] = None,
+        priority: int = BACKGROUND
+    ) -> np.ndarray:
+        """
+        Return a (len(texts), dim) float32 matrix in input order.
+        token_counts, when known (e.g. from the chunker), saves re-tokenizing the texts.
+        priority is the upstream lane for remote providers (INTERACTIVE for queries).
+        """
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL):
+        self.model = model
+        self._client = None  # the shared client unless overridden
+
+    def _embed_batch(self, batch: List[str], priority: int = BACKGROUND) -> List[List[float]]:
+        client = self._client or get_openai_client()
+        resp = call_upstream(
+            "embeddings", client.embeddings.create, model=self.model, input=batch, priority=priority
+        )
+        # The API reports each embedding's input position; don't rely on response order
+        ordered = sorted(resp.data, key=lambda d: d.index)
+        return [d.embedding for d in ordered]
+
+    def embed(
+        self,
+        texts: List[str],
+        token_counts: Optional[List[int]] = None,
+        priority: int = BACKGROUND
+    ) -> np.ndarray:
+        """
+        Embed texts with automatic batching to handle large documents.
+        Batches stay under OpenAI's per-request token and input limits and are sent
+        concurrently (at most EMBEDDING_MAX_CONCURRENCY in flight); results keep input order.
+        """
+        if not texts:
+            return np.array([], dtype="float32")
+
+        if token_counts is None:
+            # Use tiktoken to count tokens accurately
+            token_counts = [len(tokens) for tokens in get_encoding().encode_batch(texts)]
+
+        batches = pack_batches(token_counts, EMBEDDING_MAX_CONCURRENCY)
+        if len(batches) == 1:
+            return np.array(self._embed_batch(texts, priority), dtype="float32")
+
+        with ThreadPoolExecutor(max_workers=min(EMBEDDING_MAX_CONCURRENCY, len(batches))) as pool:
+            # map() yields results in submission order, whatever order batches finish in
+            results = pool.map(
+                lambda batch: self._embed_batch(batch, priority),
+                [texts[start:end] for start, end in batches]
+            )
+            all_embeddings = [embedding for batch in results for embedding in batch]
+
+        return np.array(all_embeddings, dtype="float32")
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local CPU embeddings with no network or model download: word unigrams and bigrams
+    are feature-hashed into a fixed number of signed buckets and L2-normalized.
+    Much weaker semantically than a trained model, but fast, deterministic across
+    processes and good enough for offline ingestion, tests and benchmarks.
+    """
+    name = "hashing"
+    _WORD = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.model = f"feature-hash-{dim}"
+
+    def _features(self, text: str) -> List[bytes]:
+        words = self._WORD.findall(text.lower())
+        return [w.encode() for w in words] + [f"{a} {b}".encode() for a, b in zip(words, words[1:])]
+
+    def embed(
+        self,
+        texts: List[str],
+        token_counts: Optional[List[int]] = None,
+        priority: int = BACKGROUND
+    ) -> np.ndarray:
+        if not texts:
+            return np.array([], dtype="float32")
+
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            # crc32 is stable across processes, unlike hash()
+            hashes = np.fromiter((zlib.crc32(f) for f in self._features(text)), dtype=np.uint32)
+            if len(hashes) == 0:
+                continue
+            buckets = (hashes % self.dim).astype(np.int64)
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype("float32")
+            np.add.at(out[row], buckets, signs)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+_providers: Dict[Tuple[str, str], EmbeddingProvider] = {}
+
+def get_embedding_provider(name: Optional[str] = None, model: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Return the (cached) provider for a name/model pair.
+    Defaults to EMBEDDING_PROVIDER with its default model.
+    """
+    name = name or EMBEDDING_PROVIDER
+    key = (name, model or "")
+    provider = _providers.get(key)
+    if provider is None:
+        if name == "openai":
+            provider = OpenAIEmbeddingProvider(model or OPENAI_EMBEDDING_MODEL)
+        elif name == "hashing":
+            dim = int(model.rsplit("-", 1)[-1]) if model else LOCAL_EMBEDDING_DIM
+            provider = HashingEmbeddingProvider(dim)
         else:
-            current_batch.append(text)
-            current_tokens += text_tokens
-    
-    # Add the last batch if it has items
-    if current_batch:
-        batches.append(current_batch)
-    
-    # Process each batch and combine results
-    all_embeddings = []
-    for batch in batches:
-        resp = _client.embeddings.create(model=OPENAI_EMBEDDING_MODEL, input=batch)
-        batch_embeddings = [d.embedding for d in resp.data]
-        all_embeddings.extend(batch_embeddings)
-    
-    return np.array(all_embeddings, dtype="float32")
-
-def embed_query(text: str) -> np.ndarray:
-    resp = _client.embeddings.create(model=OPENAI_EMBEDDING_MODEL, input=[text])
-    return np.array(resp.data[0].embedding, dtype="float32")
+            raise ValueError(f"Unknown embedding provider: {name}")
+        _providers[key] = provider
+    return provider
+
+def embed_texts(
+    texts: List[str],
+    provider: Optional[EmbeddingProvider] = None,
+    token_counts: Optional[List[int]] = None
+) -> np.ndarray:
+    return (provider or get_embedding_provider()).embed(texts, token_counts)
+
+def embed_query(text: str, provider: Optional[EmbeddingProvider] = None) -> np.ndarray:
+    return (provider or get_embedding_provider()).embed([text], priority=INTERACTIVE)[0]
+
+def embed_queries(texts: List[str], provider: Optional[EmbeddingProvider] = None) -> np.ndarray:
+    """
+    Embed several short queries in a single call.
+    Returns a (len(texts), dim) matrix in the same order as the input.
+    """
+    return (provider or get_embedding_provider()).embed(texts, priority=INTERACTIVE)
@@ -0,0 +1,17 @@
+import threading
+from utils.config import OPENAI_API_KEY, OPENAI_BASE_URL
+
+# One client (and so one HTTP connection pool) per process, built on first use:
+# importing the SDK takes most of a second, which app import and worker spawn shouldn't pay
+_client = None
+_client_lock = threading.Lock()
+
+def get_openai_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                # Retries are handled by the shared upstream layer
+                _client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+    return _client
@@ -1,7 +1,10 @@
-from typing import Tuple, List, Dict
-import pdfplumber
+from typing import Tuple, List, Dict, Collection
+import hashlib
 import io
 
+# pdfplumber/pdfminer are imported where used: parsing runs in the parse worker
+# processes, so the API process never needs them
+
 def extract_pdf_text(file_bytes: bytes) -> Tuple[str, int, List[Dict[str, any]]]:
     """
     Return extracted text, page count, and page mapping.
@@ -13,6 +16,7 @@ def extract_pdf_text(file_bytes: bytes) -> Tuple[str, int, List[Dict[str, any]]]
     page_mapping = []
     current_char = 0
     
+    import pdfplumber
     with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
         pages = len(pdf.pages)
         for page_num, page in enumerate(pdf.pages, start=1):
@@ -30,3 +34,28 @@ def extract_pdf_text(file_bytes: bytes) -> Tuple[str, int, List[Dict[str, any]]]
     
     full_text = "\n".join(text_parts).strip()
     return full_text, pages, page_mapping
+
+def page_content_hash(page) -> str:
+    """Hash of a page's decoded content streams; far cheaper than extracting its text."""
+    from pdfminer.pdftypes import resolve1
+    digest = hashlib.sha256()
+    for stream in page.page_obj.contents:
+        digest.update(resolve1(stream).get_data())
+    return digest.hexdigest()
+
+def extract_pages(file_bytes: bytes, known_hashes: Collection[str] = ()) -> Tuple[List[str], Dict[int, str]]:
+    """
+    Return the content hash of every page, and the text of each page whose hash isn't in
+    known_hashes (so unchanged pages of a new document version aren't extracted again).
+    Returns: (content_hashes, page_texts) with page_texts keyed by 1-based page number
+    """
+    content_hashes = []
+    page_texts = {}
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        for page_num, page in enumerate(pdf.pages, start=1):
+            content_hash = page_content_hash(page)
+            content_hashes.append(content_hash)
+            if content_hash not in known_hashes:
+                page_texts[page_num] = page.extract_text() or ""
+    return content_hashes, page_texts
@@ -1,20 +1,60 @@
-from typing import List, Dict, Any, Optional, Iterator
-from openai import OpenAI
-from utils.config import OPENAI_API_KEY, OPENAI_CHAT_MODEL
+import threading
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from utils.config import OPENAI_CHAT_MODEL, CONTEXT_TOKEN_BUDGET
+from utils.context_packer import pack_contexts
+from utils.tokenizer import get_encoding
 from services.web_search import search_web, format_web_context
+from services.openai_client import get_openai_client
+from services.upstream import call_upstream
 
-_client = OpenAI(api_key=OPENAI_API_KEY)
+# Instructions first and the question last: prompts then share their longest possible prefix
+# (instructions, document context, earlier turns), which the provider's prompt cache reuses
+DOCUMENT_SYSTEM_PROMPT = (
+    "You are Dr.Doc, an AI assistant that answers questions strictly using the provided document context. "
+    "You MUST NOT use any information outside of the provided context. "
+    "If the answer is not in the document context, respond with: "
+    "'I don't have enough information in the document to answer this question. "
+    "Please enable web search if you'd like me to search the internet for additional information.'\n"
+    "Answer the question using ONLY the document context provided. "
+    "Cite which snippets you used by numbering them (e.g., [1], [2]). "
+    "If the answer is not in the context, say you don't know."
+)
+WEB_SYSTEM_PROMPT = (
+    "You are Dr.Doc, an AI assistant that helps users understand documents. "
+    "You have access to both the uploaded document context and web search results. "
+    "When answering:\n"
+    "1. FIRST try to answer using the document context provided\n"
+    "2. If the answer is not in the document, you may use web search results\n"
+    "3. Always clearly indicate which source you used (Document or Web)\n"
+    "4. If neither source has the answer, say 'I don't have enough information to answer this question.'\n"
+    "5. Cite sources using [Doc] for document snippets and [Web] for web sources\n"
+    "Provide a comprehensive answer using the available sources. "
+    "Clearly indicate whether your answer comes from the document or web search."
+)
 
-def answer_with_context_stream(
-    question: str, 
-    contexts: List[str], 
-    use_web_search: bool = False
-) -> Iterator[str]:
+def _build_messages(
+    question: str,
+    contexts: List[str],
+    use_web_search: bool,
+    max_context_tokens: int,
+    history: Optional[List[Dict[str, Any]]] = None,
+    packed: bool = False
+) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]], int]:
     """
-    Stream answers using document context and optionally web search.
-    Returns an iterator of text chunks.
+    Pack the document context into the token budget (unless `packed`: the contexts were
+    already packed, as a session's are), run the web search if enabled, and build the
+    chat messages, with earlier {"question", "answer"} turns of a session before the question.
+    A turn's "contexts", if any, are the chunks retrieved for it and go just before its
+    question; `contexts` go just before this question. A follow-up's messages thus start
+    with the previous prompt's (see services/sessions.py).
+    Returns: (messages, web_results, context_tokens)
     """
-    doc_context = "\n\n---\n\n".join(contexts[:3])
+    if packed:
+        enc = get_encoding()
+        earlier = [text for turn in history or [] for text in turn.get("contexts", [])]
+        context_tokens = sum(len(enc.encode(text)) for text in earlier + contexts)
+    else:
+        contexts, context_tokens = pack_contexts(question, contexts, max_context_tokens)
     
     # Perform web search if enabled
     web_results = []
@@ -23,121 +63,144 @@ def answer_with_context_stream(
         web_results = search_web(question, max_results=5)
         web_context = format_web_context(web_results)
     
-    # Build system prompt based on mode
     if use_web_search and web_results:
-        system = (
-            "You are Dr.Doc, an AI assistant that helps users understand documents. "
-            "You have access to both the uploaded document context and web search results. "
-            "When answering:\n"
-            "1. FIRST try to answer using the document context provided\n"
-            "2. If the answer is not in the document, you may use web search results\n"
-            "3. Always clearly indicate which source you used (Document or Web)\n"
-            "4. If neither source has the answer, say 'I don't have enough information to answer this question.'\n"
-            "5. Cite sources using [Doc] for document snippets and [Web] for web sources"
-        )
-        user = (
-            f"=== Document Context ===\n{doc_context}\n\n"
-            f"{web_context}\n\n"
-            f"Question: {question}\n\n"
-            "Provide a comprehensive answer using the available sources. "
-            "Clearly indicate whether your answer comes from the document or web search."
-        )
+        messages = [{"role": "system", "content": WEB_SYSTEM_PROMPT}]
+        context_label = "=== Document Context ===\n"
+        question_message = f"{web_context}\n\nQuestion: {question}"
     else:
-        system = (
-            "You are Dr.Doc, an AI assistant that answers questions strictly using the provided document context. "
-            "You MUST NOT use any information outside of the provided context. "
-            "If the answer is not in the document context, respond with: "
-            "'I don't have enough information in the document to answer this question. "
-            "Please enable web search if you'd like me to search the internet for additional information.'"
-        )
-        user = (
-            f"Document Context:\n{doc_context}\n\n"
-            f"Question: {question}\n\n"
-            "Answer the question using ONLY the document context provided above. "
-            "Cite which snippets you used by numbering them (e.g., [1], [2]). "
-            "If the answer is not in the context, say you don't know."
-        )
+        messages = [{"role": "system", "content": DOCUMENT_SYSTEM_PROMPT}]
+        context_label = "Document Context:\n"
+        question_message = f"Question: {question}"
+    
+    def add_context(texts: List[str]):
+        messages.append({"role": "system", "content": context_label + "\n\n---\n\n".join(texts)})
+    
+    for turn in history or []:
+        if turn.get("contexts"):
+            add_context(turn["contexts"])
+        messages.append({"role": "user", "content": f"Question: {turn['question']}"})
+        messages.append({"role": "assistant", "content": turn["answer"]})
+    if contexts or not history:
+        add_context(contexts)
+    messages.append({"role": "user", "content": question_message})
+    return messages, web_results, context_tokens
+
+def _cached_tokens(usage) -> Optional[int]:
+    """Prompt tokens the provider served from its prompt cache, if it reports them."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) if details else None
+
+class CompletionCancel:
+    """
+    Stops a streamed completion from another thread (e.g. when the client has disconnected).
+    Calling it closes the upstream response, so the provider stops generating tokens nobody
+    will read; the stream then ends at the next delta, or at once if it hasn't started.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def _attach(self, stream) -> bool:
+        """Register the upstream stream; False (and closed) if already cancelled."""
+        with self._lock:
+            self._stream = stream
+            cancelled = self.cancelled
+        if cancelled:
+            stream.close()
+        return not cancelled
+
+    def __call__(self):
+        with self._lock:
+            self.cancelled = True
+            stream = self._stream
+        if stream is not None:
+            stream.close()
+
+def answer_with_context_stream(
+    question: str, 
+    contexts: List[str], 
+    use_web_search: bool = False,
+    max_context_tokens: int = CONTEXT_TOKEN_BUDGET,
+    usage: Optional[Dict[str, Any]] = None,
+    history: Optional[List[Dict[str, Any]]] = None,
+    packed: bool = False,
+    cancel: Optional[CompletionCancel] = None
+) -> Iterator[str]:
+    """
+    Stream answers using document context and optionally web search.
+    Returns an iterator of text chunks.
+    If a `usage` dict is passed, it is filled with context and prompt token counts.
+    history and packed are as for answer_with_context; `cancel` can stop the stream early.
+    """
+    messages, _, context_tokens = _build_messages(
+        question, contexts, use_web_search, max_context_tokens, history, packed
+    )
+    if usage is not None:
+        usage["context_tokens"] = context_tokens
     
-    stream = _client.chat.completions.create(
+    stream = call_upstream(
+        "chat",
+        get_openai_client().chat.completions.create,
         model=OPENAI_CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user}
-        ],
+        messages=messages,
         temperature=0.2,
         stream=True,
+        stream_options={"include_usage": True},
     )
     
-    for chunk in stream:
-        if chunk.choices[0].delta.content:
-            yield chunk.choices[0].delta.content
+    if cancel is not None and not cancel._attach(stream):
+        return
+    try:
+        for chunk in stream:
+            if cancel is not None and cancel.cancelled:
+                return
+            # The final chunk carries usage and no choices
+            if chunk.usage is not None and usage is not None:
+                usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                usage["cached_tokens"] = _cached_tokens(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception:
+        if cancel is not None and cancel.cancelled:
+            return  # Reading a response closed by cancel()
+        raise
+    finally:
+        stream.close()
 
 def answer_with_context(
     question: str, 
     contexts: List[str], 
-    use_web_search: bool = False
+    use_web_search: bool = False,
+    max_context_tokens: int = CONTEXT_TOKEN_BUDGET,
+    history: Optional[List[Dict[str, Any]]] = None,
+    packed: bool = False
 ) -> Dict[str, Any]:
     """
     Answer questions using document context and optionally web search.
     
     Args:
         question: The user's question
-        contexts: List of document context chunks
+        contexts: List of document context chunks, best match first
         use_web_search: Whether to enable web search for additional context
+        max_context_tokens: Token budget for the packed document context
+        history: Earlier {"question", "answer"} turns of a session, oldest first, each with
+            the "contexts" retrieved for it, if any (see services/sessions.py)
+        packed: The contexts are already packed and are used as they are
     
     Returns:
-        Dictionary with answer and source information
+        Dictionary with answer, source information and token usage
     """
-    doc_context = "\n\n---\n\n".join(contexts[:3])
-    
-    # Perform web search if enabled
-    web_results = []
-    web_context = ""
-    if use_web_search:
-        web_results = search_web(question, max_results=5)
-        web_context = format_web_context(web_results)
-    
-    # Build system prompt based on mode
-    if use_web_search and web_results:
-        system = (
-            "You are Dr.Doc, an AI assistant that helps users understand documents. "
-            "You have access to both the uploaded document context and web search results. "
-            "When answering:\n"
-            "1. FIRST try to answer using the document context provided\n"
-            "2. If the answer is not in the document, you may use web search results\n"
-            "3. Always clearly indicate which source you used (Document or Web)\n"
-            "4. If neither source has the answer, say 'I don't have enough information to answer this question.'\n"
-            "5. Cite sources using [Doc] for document snippets and [Web] for web sources"
-        )
-        user = (
-            f"=== Document Context ===\n{doc_context}\n\n"
-            f"{web_context}\n\n"
-            f"Question: {question}\n\n"
-            "Provide a comprehensive answer using the available sources. "
-            "Clearly indicate whether your answer comes from the document or web search."
-        )
-    else:
-        system = (
-            "You are Dr.Doc, an AI assistant that answers questions strictly using the provided document context. "
-            "You MUST NOT use any information outside of the provided context. "
-            "If the answer is not in the document context, respond with: "
-            "'I don't have enough information in the document to answer this question. "
-            "Please enable web search if you'd like me to search the internet for additional information.'"
-        )
-        user = (
-            f"Document Context:\n{doc_context}\n\n"
-            f"Question: {question}\n\n"
-            "Answer the question using ONLY the document context provided above. "
-            "Cite which snippets you used by numbering them (e.g., [1], [2]). "
-            "If the answer is not in the context, say you don't know."
+    messages, web_results, context_tokens = _build_messages(
+        question, contexts, use_web_search, max_context_tokens, history, packed
     )
     
-    resp = _client.chat.completions.create(
+    resp = call_upstream(
+        "chat",
+        get_openai_client().chat.completions.create,
         model=OPENAI_CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user}
-        ],
+        messages=messages,
         temperature=0.2,
     )
     content = resp.choices[0].message.content or ""
@@ -145,8 +208,13 @@ def answer_with_context(
     return {
         "answer": content.strip(),
         "sources": {
-            "document": len(contexts) > 0,
+            "document": len(contexts) > 0 or any(turn.get("contexts") for turn in history or []),
             "web": use_web_search and len(web_results) > 0,
             "web_results": web_results[:3] if web_results else []
+        },
+        "usage": {
+            "context_tokens": context_tokens,
+            "prompt_tokens": resp.usage.prompt_tokens if resp.usage else None,
+            "cached_tokens": _cached_tokens(resp.usage)
         }
     }
@@ -0,0 +1,121 @@
+"""
+Re-chunking and re-embedding documents from their stored page texts (see write_pages), e.g.
+after changing CHUNK_MAX_TOKENS or the embedding model, without the PDFs: nothing is parsed.
+A document's new chunks and vectors are written as a new base generation, like a new
+version, so readers see either the old index or the new one. Documents already chunked and
+embedded as requested are skipped, so an interrupted corpus reindex can simply be run again.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from db.vector_store import LocalFaissStore, StoreConflict, document_signature, read_pages
+from services.embeddings import embed_texts, get_embedding_provider
+from services.versioning import chunk_max_tokens, pages_match
+from utils.chunker import chunk_pages
+from utils.config import CHUNK_MAX_TOKENS
+
+class PagesUnavailable(Exception):
+    """The document's page texts weren't stored (it predates the page store) or are outdated."""
+
+class ReindexConflict(StoreConflict):
+    """The document was written by someone else while it was being reindexed."""
+
+def reindex_document(
+    doc_id: str,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    embedding_provider: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    force: bool = False
+) -> Optional[Dict]:
+    """
+    Rebuild a document's chunks and vectors from its stored pages. The embedding provider and
+    model default to the document's own; a different provider without a model uses that
+    provider's default model. Returns a report, or None if the document doesn't exist.
+    """
+    start = time.perf_counter()
+    signature = document_signature(doc_id)
+    if signature is None:
+        return None
+    store = LocalFaissStore(doc_id)
+    if not store.chunks:
+        return None
+    if embedding_provider is None or embedding_provider == store.embedding_provider:
+        provider = get_embedding_provider(store.embedding_provider, embedding_model or store.embedding_model)
+    else:
+        provider = get_embedding_provider(embedding_provider, embedding_model)
+    report = {
+        "doc_id": doc_id,
+        "status": "skipped",
+        "chunks_before": len(store.chunks),
+        "chunks": len(store.chunks),
+        "max_tokens": max_tokens,
+        "embedding_provider": provider.name,
+        "embedding_model": provider.model
+    }
+    unchanged = (
+        chunk_max_tokens(store.metadata) == max_tokens
+        and (provider.name, provider.model) == (store.embedding_provider, store.embedding_model)
+    )
+    if unchanged and not force:
+        report["duration_s"] = round(time.perf_counter() - start, 3)
+        return report
+
+    pages = read_pages(doc_id)
+    if pages is None:
+        raise PagesUnavailable(f"Document {doc_id} was stored without its page texts; upload it again.")
+    if not pages_match(store.metadata, pages):
+        raise PagesUnavailable(f"The stored page texts of document {doc_id} are not those of its current version.")
+
+    chunks, chunk_metadata = chunk_pages(list(enumerate(pages, start=1)), max_tokens=max_tokens)
+    token_counts = [meta["token_count"] for meta in chunk_metadata]
+    vectors = embed_texts(chunks, provider, token_counts)
+
+    metadata = {"chunk_max_tokens": max_tokens, "reindexed_at": datetime.now(timezone.utc).replace(tzinfo=None).isoformat()}
+    try:
+        # Checked under the document's write lock: appends or a new version committed meanwhile aren't overwritten
+        store.replace(
+            chunks, vectors, chunk_metadata, metadata, provider.name, provider.model, expected_signature=signature
+        )
+    except StoreConflict:
+        raise ReindexConflict(f"Document {doc_id} changed while it was being reindexed.")
+    report.update({
+        "status": "reindexed",
+        "chunks": len(chunks),
+        "duration_s": round(time.perf_counter() - start, 3)
+    })
+    return report
+
+def reindex_documents(
+    doc_ids: List[str],
+    workers: int = 4,
+    progress: Optional[Callable[[Dict], None]] = None,
+    **options
+) -> Dict:
+    """
+    Reindex many documents in parallel (see reindex_document for the options). Workers spend
+    most of their time waiting for embeddings, so threads suffice. A failed document is
+    reported and the rest carry on. progress, if given, is called with each document's result.
+    """
+    start = time.perf_counter()
+    summary = {"reindexed": 0, "skipped": 0, "failed": 0, "chunks": 0, "errors": {}}
+
+    def one(doc_id: str) -> Dict:
+        try:
+            report = reindex_document(doc_id, **options)
+        except Exception as e:
+            return {"doc_id": doc_id, "status": "failed", "error": str(e)}
+        return report or {"doc_id": doc_id, "status": "failed", "error": "Document not found"}
+
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        for future in as_completed([pool.submit(one, doc_id) for doc_id in doc_ids]):
+            result = future.result()
+            summary[result["status"]] += 1
+            if result["status"] == "failed":
+                summary["errors"][result["doc_id"]] = result["error"]
+            else:
+                summary["chunks"] += result["chunks"]
+            if progress is not None:
+                progress(result)
+    summary["duration_s"] = round(time.perf_counter() - start, 3)
+    return summary
@@ -0,0 +1,92 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from db.vector_store import LocalFaissStore
+from db.rerank import reciprocal_rank_fusion
+from services.embeddings import embed_query, embed_queries, get_embedding_provider
+from utils.config import HYBRID_CANDIDATES, RRF_K
+
+# Retrieval modes:
+#   "vector"  - embedding similarity search (one embeddings API call per question)
+#   "lexical" - BM25 keyword search; no embeddings call at all
+#   "hybrid"  - both, merged with reciprocal rank fusion
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+
+Hit = Tuple[int, float, str, List[int]]
+
+def _fuse(vector_hits: List[Hit], lexical_hits: List[Hit], top_k: int) -> List[Hit]:
+    by_idx = {hit[0]: hit for hit in vector_hits + lexical_hits}
+    fused = reciprocal_rank_fusion(
+        [[hit[0] for hit in vector_hits], [hit[0] for hit in lexical_hits]],
+        k=RRF_K
+    )
+    return [
+        (idx, score, by_idx[idx][2], by_idx[idx][3])
+        for idx, score in fused[:top_k]
+    ]
+
+def embed_question(store: LocalFaissStore, question: str, mode: str = "vector") -> Optional[np.ndarray]:
+    """
+    The query vector retrieve() needs, embedded the way the document was; None in lexical mode.
+    This is the upstream-bound half of retrieval; the search itself is CPU-bound.
+    """
+    if mode == "lexical":
+        return None
+    return embed_query(question, get_embedding_provider(store.embedding_provider, store.embedding_model))
+
+def embed_questions(store: LocalFaissStore, questions: List[str], mode: str = "vector") -> Optional[np.ndarray]:
+    """embed_question() for many questions in one embeddings call."""
+    if mode == "lexical":
+        return None
+    return embed_queries(questions, get_embedding_provider(store.embedding_provider, store.embedding_model))
+
+def retrieve(
+    store: LocalFaissStore,
+    question: str,
+    top_k: int = 3,
+    mode: str = "vector",
+    diversify: bool = False,
+    q: Optional[np.ndarray] = None
+) -> List[Hit]:
+    """
+    Find the chunks of a document that best answer a question.
+    q is the question's vector if already embedded (see embed_question).
+    Returns (chunk_idx, score, text, page_numbers) hits, best first.
+    """
+    if mode == "lexical":
+        return store.lexical_search(question, top_k)
+
+    if q is None:
+        q = embed_question(store, question, mode)
+    if mode == "hybrid":
+        candidates = max(top_k, HYBRID_CANDIDATES)
+        return _fuse(
+            store.search(q, candidates, diversify),
+            store.lexical_search(question, candidates),
+            top_k
+        )
+    return store.search(q, top_k, diversify)
+
+def retrieve_batch(
+    store: LocalFaissStore,
+    questions: List[str],
+    top_k: int = 3,
+    mode: str = "vector",
+    diversify: bool = False,
+    q: Optional[np.ndarray] = None
+) -> List[List[Hit]]:
+    """
+    retrieve() for many questions at once: one embeddings call and one matrix search.
+    """
+    if mode == "lexical":
+        return [store.lexical_search(question, top_k) for question in questions]
+
+    if q is None:
+        q = embed_questions(store, questions, mode)
+    if mode == "hybrid":
+        candidates = max(top_k, HYBRID_CANDIDATES)
+        vector_hits = store.search_batch(q, candidates, diversify)
+        return [
+            _fuse(hits, store.lexical_search(question, candidates), top_k)
+            for question, hits in zip(questions, vector_hits)
+        ]
+    return store.search_batch(q, top_k, diversify)
@@ -0,0 +1,198 @@
+"""
+Conversation sessions: follow-up asks against one document that build on earlier turns.
+A session keeps the chunks retrieved so far, packed and in the order they were added (under
+SESSION_CONTEXT_TOKENS), and its earlier turns (under SESSION_HISTORY_TOKENS). A follow-up
+re-runs retrieval only when it drifts, i.e. when too many of its terms occur neither in the
+kept chunks nor in earlier turns, or when the document has changed. Chunks retrieved for a
+turn go into the prompt just before its question (see session_prompt), so a follow-up's
+prompt is the previous one plus its answer, any new chunks and the new question, and the
+provider's prompt cache serves the shared prefix. Over a budget, the oldest chunks or turns
+are dropped down to TRIM_TO of it at once, so the prefix changes only every few turns.
+Sessions are JSON files in SESSION_DIR, so any worker can serve any turn; concurrent
+turns of one session are not merged (the last one saved wins).
+"""
+import json
+import os
+import re
+import time
+import uuid
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from db.vector_store import _replace_file, _write_json
+from services.retrieval import Hit
+from utils.config import (
+    SESSION_DIR, CONVERSATION_TTL_SECONDS, SESSION_CONTEXT_TOKENS, SESSION_HISTORY_TOKENS, SESSION_DRIFT_THRESHOLD
+)
+from utils.context_packer import content_terms, pack_context_items
+from utils.tokenizer import get_encoding
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+SWEEP_EVERY = 100  # Remove expired session files every N sessions created
+TRIM_TO = 0.5  # Fraction of a budget left after trimming the oldest chunks or turns
+_created = 0
+
+def _path(session_id: str) -> str:
+    return os.path.join(SESSION_DIR, f"{session_id}.json")
+
+def _expired(session: Dict, now: float) -> bool:
+    return now - session["updated_at"] > CONVERSATION_TTL_SECONDS
+
+def create_session(doc_id: str) -> Dict:
+    global _created
+    now = time.time()
+    session = {
+        "session_id": uuid.uuid4().hex,
+        "doc_id": doc_id,
+        "created_at": now,
+        "updated_at": now,
+        "signature": None,  # of the document when the kept chunks were retrieved
+        "contexts": [],  # {"chunk_idx", "score", "text", "page_numbers", "tokens", "turn"}, in prompt order
+        "turns": []  # {"question", "answer", "tokens", "turn"}, oldest first
+    }
+    save_session(session)
+    _created += 1
+    if _created % SWEEP_EVERY == 0:
+        sweep_sessions()
+    return session
+
+def load_session(session_id: str) -> Optional[Dict]:
+    """The session, or None if it doesn't exist or has expired."""
+    if not _SESSION_ID.match(session_id):
+        return None
+    try:
+        with open(_path(session_id), "r") as f:
+            session = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if _expired(session, time.time()):
+        delete_session(session_id)
+        return None
+    return session
+
+def save_session(session: Dict):
+    session["updated_at"] = time.time()
+    _replace_file(_path(session["session_id"]), _write_json(session))
+
+def delete_session(session_id: str) -> bool:
+    if not _SESSION_ID.match(session_id):
+        return False
+    try:
+        os.remove(_path(session_id))
+    except FileNotFoundError:
+        return False
+    return True
+
+def sweep_sessions():
+    """Remove the files of expired sessions."""
+    if not os.path.isdir(SESSION_DIR):
+        return
+    # A session's file is rewritten on every turn, so its mtime is its last activity
+    cutoff = time.time() - CONVERSATION_TTL_SECONDS
+    with os.scandir(SESSION_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+def drift(session: Dict, question: str) -> float:
+    """
+    Fraction of the question's terms that occur neither in the session's chunks nor in its
+    earlier turns. 0 for questions without content terms ("why?", "tell me more").
+    """
+    terms = content_terms(question)
+    if not terms:
+        return 0.0
+    known = set()
+    for context in session["contexts"]:
+        known |= content_terms(context["text"])
+    for turn in session["turns"]:
+        known |= content_terms(turn["question"]) | content_terms(turn["answer"])
+    return len(terms - known) / len(terms)
+
+def answered(session: Dict) -> int:
+    """Number of turns answered so far, including those dropped from the history."""
+    return session["turns"][-1]["turn"] if session["turns"] else 0
+
+def retrieval_reason(session: Dict, question: str, signature: Optional[List[int]]) -> Tuple[Optional[str], float]:
+    """
+    Why the question needs a new retrieval ("first turn", "document changed" or "drift"),
+    or None if the session's chunks can be reused; and the question's drift.
+    """
+    if not session["contexts"]:
+        return "first turn", 1.0
+    if session["signature"] != signature:
+        return "document changed", 1.0
+    score = drift(session, question)
+    return ("drift" if score > SESSION_DRIFT_THRESHOLD else None), score
+
+def _trim(items: List[Dict], max_tokens: int, keep: int):
+    """Drop the oldest items beyond max_tokens down to TRIM_TO of it, keeping at least the last `keep`."""
+    total = sum(item["tokens"] for item in items)
+    if total <= max_tokens:
+        return
+    while len(items) > keep and total > max_tokens * TRIM_TO:
+        total -= items.pop(0)["tokens"]
+
+def retain(
+    session: Dict,
+    question: str,
+    hits: List[Hit],
+    signature: Optional[List[int]],
+    max_tokens: int = SESSION_CONTEXT_TOKENS
+):
+    """
+    Add newly retrieved hits to the session's chunks, after those it already has, for the
+    next turn. Chunks already kept are left as they are; only beyond max_tokens are the
+    oldest ones dropped, down to TRIM_TO of it (never those just added).
+    """
+    if session["signature"] != signature:
+        # Chunk numbers and texts of another version of the document
+        session["contexts"] = []
+        session["signature"] = signature
+    kept = {context["chunk_idx"] for context in session["contexts"]}
+    new = [hit for hit in hits if hit[0] not in kept]
+    turn = answered(session)
+    added = 0
+    for position, text, tokens in pack_context_items(question, [hit[2] for hit in new], max_tokens):
+        chunk_idx, score, _, page_numbers = new[position]
+        session["contexts"].append({
+            "chunk_idx": chunk_idx, "score": score, "text": text, "page_numbers": page_numbers, "tokens": tokens,
+            "turn": turn
+        })
+        added += 1
+    _trim(session["contexts"], max_tokens, keep=added)
+
+def session_hits(session: Dict) -> List[Hit]:
+    """The session's chunks, as retrieval hits in prompt order."""
+    return [
+        (context["chunk_idx"], context["score"], context["text"], context["page_numbers"])
+        for context in session["contexts"]
+    ]
+
+def session_prompt(session: Dict) -> Tuple[List[Dict], List[str]]:
+    """
+    The session's turns for answer_with_context's history, each with the "contexts" retrieved
+    for it, and the chunks retrieved for the next question. Chunks of turns dropped from the
+    history go with the oldest turn kept.
+    """
+    history = [{"question": turn["question"], "answer": turn["answer"], "contexts": []} for turn in session["turns"]]
+    numbers = [turn["turn"] for turn in session["turns"]]
+    current = []
+    for context in session["contexts"]:
+        # Retrieved after context["turn"] answers, i.e. for the question of the next turn
+        position = bisect_left(numbers, context["turn"] + 1)
+        (history[position]["contexts"] if position < len(history) else current).append(context["text"])
+    return history, current
+
+def add_turn(session: Dict, question: str, answer: str, max_tokens: int = SESSION_HISTORY_TOKENS):
+    """Record an answered question; beyond max_tokens, the oldest turns are dropped down to TRIM_TO of it."""
+    enc = get_encoding()
+    session["turns"].append({
+        "question": question,
+        "answer": answer,
+        "tokens": len(enc.encode(question)) + len(enc.encode(answer)),
+        "turn": answered(session) + 1
+    })
+    _trim(session["turns"], max_tokens, keep=1)
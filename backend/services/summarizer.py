@@ -1,7 +1,6 @@
-from openai import OpenAI
-from utils.config import OPENAI_API_KEY, OPENAI_CHAT_MODEL
-
-_client = OpenAI(api_key=OPENAI_API_KEY)
+from utils.config import OPENAI_CHAT_MODEL
+from services.openai_client import get_openai_client
+from services.upstream import call_upstream
 
 def summarize_text(text: str, max_words: int = 200, expanded: bool = False) -> str:
     """
@@ -34,7 +33,9 @@ def summarize_text(text: str, max_words: int = 200, expanded: bool = False) -> s
         )
         system_message = "You are a concise technical summarizer."
     
-    resp = _client.chat.completions.create(
+    resp = call_upstream(
+        "chat",
+        get_openai_client().chat.completions.create,
         model=OPENAI_CHAT_MODEL,
         messages=[
             {"role": "system", "content": system_message},
@@ -0,0 +1,229 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from utils.config import (
+    UPSTREAM_MAX_CONCURRENCY, UPSTREAM_MAX_RETRIES, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX,
+    UPSTREAM_QUEUE_TIMEOUT, CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_SECONDS
+)
+from utils.metrics import Gauge
+
+# Priority lanes: lower value is served first
+INTERACTIVE = 0  # a user is waiting (asks, query embeddings, summaries)
+BACKGROUND = 1   # ingestion work that can yield (document embeddings)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class UpstreamUnavailable(Exception):
+    """The upstream is failing (circuit open) or saturated; callers should fail fast."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Upstream '{endpoint}' is unavailable. Retry after {retry_after:.0f}s.")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+class PrioritySemaphore:
+    """Counting semaphore where waiting INTERACTIVE callers always go before BACKGROUND ones."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiting = [0, 0]
+        self._cond = threading.Condition()
+
+    @property
+    def waiting(self) -> int:
+        return sum(self._waiting)
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while self.in_use >= self.limit or any(self._waiting[:priority]):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self.in_use += 1
+            finally:
+                self._waiting[priority] -= 1
+            # Lower-priority waiters may have been held back only by us
+            self._cond.notify_all()
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify_all()
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and rejects calls
+    for `reset_timeout` seconds; then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Read Retry-After (seconds) or retry-after-ms from an HTTP error response, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def classify_error(exc: Exception) -> Tuple[bool, Optional[float]]:
+    """
+    Decide whether an upstream error is worth retrying.
+    Returns: (retryable, retry_after_seconds)
+    """
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES, _retry_after(exc)
+    # No HTTP status: connection failures and timeouts are transient, anything else is a bug
+    name = type(exc).__name__
+    transient = any(marker in name for marker in ("Timeout", "Connection"))
+    return transient or isinstance(exc, (TimeoutError, ConnectionError)), None
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a server-provided Retry-After is a lower bound."""
+    delay = random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+class UpstreamEndpoint:
+    """Admission control, retries and circuit breaking for one upstream API."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_retries: int = UPSTREAM_MAX_RETRIES,
+        queue_timeout: float = UPSTREAM_QUEUE_TIMEOUT,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURES,
+        reset_timeout: float = CIRCUIT_BREAKER_RESET_SECONDS
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.semaphore = PrioritySemaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def call(self, fn: Callable, *args, priority: int = INTERACTIVE, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise UpstreamUnavailable(self.name, self.breaker.retry_after())
+            if not self.semaphore.acquire(priority, timeout=self.queue_timeout):
+                # Saturated for too long: shed load rather than pile up threads
+                raise UpstreamUnavailable(self.name, self.queue_timeout)
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                retryable, retry_after = classify_error(e)
+                if not retryable:
+                    # The upstream answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or (retry_after or 0) > UPSTREAM_BACKOFF_MAX:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self.semaphore.release()
+
+            # Back off outside the semaphore so the slot can serve other callers
+            time.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+_endpoints: Dict[str, UpstreamEndpoint] = {}
+_endpoints_lock = threading.Lock()
+
+Gauge(
+    "docassist_upstream_in_flight", "Upstream API calls in progress, per endpoint.", ("endpoint",),
+    collect=lambda: {(name,): endpoint.semaphore.in_use for name, endpoint in list(_endpoints.items())}
+)
+Gauge(
+    "docassist_upstream_waiting", "Callers waiting for an upstream concurrency slot, per endpoint.", ("endpoint",),
+    collect=lambda: {(name,): endpoint.semaphore.waiting for name, endpoint in list(_endpoints.items())}
+)
+Gauge(
+    "docassist_upstream_circuit_open", "1 while an endpoint's circuit breaker is rejecting calls.", ("endpoint",),
+    collect=lambda: {(name,): int(endpoint.breaker.state == "open") for name, endpoint in list(_endpoints.items())}
+)
+
+def get_endpoint(name: str) -> UpstreamEndpoint:
+    with _endpoints_lock:
+        endpoint = _endpoints.get(name)
+        if endpoint is None:
+            endpoint = UpstreamEndpoint(name, UPSTREAM_MAX_CONCURRENCY.get(name, 8))
+            _endpoints[name] = endpoint
+        return endpoint
+
+def call_upstream(endpoint: str, fn: Callable, *args, priority: int = INTERACTIVE, **kwargs) -> Any:
+    """
+    Run an upstream API call ("chat", "embeddings" or "web_search") through the shared
+    per-endpoint concurrency limit, retry policy and circuit breaker.
+    Raises UpstreamUnavailable when the endpoint is failing or saturated.
+    """
+    return get_endpoint(endpoint).call(fn, *args, priority=priority, **kwargs)
@@ -0,0 +1,182 @@
+"""
+Page-level versioning of documents. Every page is chunked on its own and its hashes are
+kept in the document metadata as [content_hash, text_hash] pairs. A new version then
+reuses the chunks and vectors of each page whose text is unchanged: only edited or
+new pages are extracted, chunked and embedded. The page texts themselves are stored too
+(see write_pages), so a document can be re-chunked later without its PDF.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from db.vector_store import LocalFaissStore
+from utils.config import CHUNK_MAX_TOKENS, DOCUMENT_TTL_SECONDS
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def page_hashes(content_hashes: List[str], page_texts: Dict[int, str]) -> List[List[str]]:
+    """[content_hash, text_hash] per page, for pages that were all extracted."""
+    return [[content, text_hash(page_texts[page_num])] for page_num, content in enumerate(content_hashes, start=1)]
+
+def document_pages(content_hashes: List[str], page_texts: Dict[int, str]) -> List[str]:
+    """Text of every page in page order, for pages that were all extracted."""
+    return [page_texts[page_num] for page_num in range(1, len(content_hashes) + 1)]
+
+def pages_match(metadata: Dict, pages: List[str]) -> bool:
+    """Whether stored page texts are those of the document's current version."""
+    hashes = metadata.get("page_hashes")
+    if not hashes:
+        return len(pages) == metadata.get("pages")
+    return len(pages) == len(hashes) and all(text_hash(page) == text for page, (_, text) in zip(pages, hashes))
+
+def chunk_max_tokens(metadata: Dict) -> int:
+    """Tokens per chunk the document was chunked with; documents from before it was recorded used 500."""
+    return metadata.get("chunk_max_tokens", 500)
+
+def known_content_hashes(metadata: Dict) -> Set[str]:
+    """Content hashes of the current version; pages with these needn't be extracted again."""
+    return {content for content, _ in metadata.get("page_hashes") or []}
+
+def version_entry(version: int, filename: str, pages: int, **changes) -> Dict:
+    return {
+        "version": version,
+        "filename": filename,
+        "upload_date": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+        "pages": pages,
+        **changes
+    }
+
+def new_document_metadata(
+    filename: str,
+    content_hashes: List[str],
+    page_texts: Dict[int, str],
+    ttl_seconds: Optional[int] = None,
+    max_tokens: int = CHUNK_MAX_TOKENS
+) -> Dict:
+    """
+    Document-level metadata of a newly uploaded document (version 1), chunked with max_tokens.
+    ttl_seconds defaults to DOCUMENT_TTL_SECONDS; 0 means the document never expires.
+    """
+    pages = len(content_hashes)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    metadata = {
+        "filename": filename,
+        "upload_date": now.isoformat(),
+        "pages": pages,
+        "page_hashes": page_hashes(content_hashes, page_texts),
+        "chunk_max_tokens": max_tokens,
+        "version": 1,
+        "versions": [version_entry(1, filename, pages)]
+    }
+    ttl = DOCUMENT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    if ttl:
+        metadata["expires_at"] = (now + timedelta(seconds=ttl)).isoformat()
+    return metadata
+
+def version_history(metadata: Dict) -> List[Dict]:
+    """Versions of a document, oldest first; documents uploaded before versioning are version 1."""
+    if metadata.get("versions"):
+        return list(metadata["versions"])
+    return [{
+        "version": 1,
+        "filename": metadata.get("filename", "Unknown"),
+        "upload_date": metadata.get("upload_date", ""),
+        "pages": metadata.get("pages", 0)
+    }]
+
+def plan_version(
+    store: LocalFaissStore,
+    content_hashes: List[str],
+    page_texts: Dict[int, str]
+) -> Tuple[List[List[str]], Dict[int, int], List[Tuple[int, str]]]:
+    """
+    Match the pages of a new version against the stored document by text hash.
+    page_texts only needs the pages whose content hash is new (see extract_pages).
+    Returns: (page_hashes, reused, changed)
+    reused maps a new page number to the old page whose chunks it can take over;
+    changed lists the (page_num, text) that have to be chunked and embedded.
+    Documents stored before page hashing have nothing to reuse, so every page is changed.
+    """
+    old_hashes = store.metadata.get("page_hashes") or []
+    text_of_content = {content: text for content, text in old_hashes}
+    old_page_of_text = {}
+    for page_num, (_, text) in enumerate(old_hashes, start=1):
+        old_page_of_text.setdefault(text, page_num)
+
+    hashes, reused, changed = [], {}, []
+    for page_num, content in enumerate(content_hashes, start=1):
+        if page_num in page_texts:
+            page_text_hash = text_hash(page_texts[page_num])
+        else:
+            page_text_hash = text_of_content[content]
+        hashes.append([content, page_text_hash])
+        if page_text_hash in old_page_of_text:
+            reused[page_num] = old_page_of_text[page_text_hash]
+        else:
+            changed.append((page_num, page_texts[page_num]))
+    return hashes, reused, changed
+
+def version_pages(
+    page_count: int,
+    page_texts: Dict[int, str],
+    reused: Dict[int, int],
+    old_pages: Optional[List[str]]
+) -> Optional[List[str]]:
+    """
+    Text of every page of a new version: extracted pages from page_texts, the others (all
+    reused, see plan_version) from the previous version's stored pages. None if those
+    weren't stored and are needed.
+    """
+    pages = []
+    for page_num in range(1, page_count + 1):
+        if page_num in page_texts:
+            pages.append(page_texts[page_num])
+        elif old_pages is not None:
+            pages.append(old_pages[reused[page_num] - 1])
+        else:
+            return None
+    return pages
+
+def assemble_version(
+    store: LocalFaissStore,
+    page_count: int,
+    reused: Dict[int, int],
+    chunks: List[str],
+    chunk_metadata: List[Dict],
+    vectors: Optional[np.ndarray]
+) -> Tuple[List[str], List[Dict], np.ndarray]:
+    """
+    Build the new version's chunks in page order: the stored chunks (and vectors) of
+    reused pages, renumbered, and the freshly embedded chunks of changed pages.
+    Returns: (chunks, chunk_metadata, vectors)
+    """
+    old_ids_by_page: Dict[int, List[int]] = {}
+    for idx, meta in enumerate(store.chunk_metadata):
+        if meta.get("page_numbers"):
+            old_ids_by_page.setdefault(meta["page_numbers"][0], []).append(idx)
+    new_ids_by_page: Dict[int, List[int]] = {}
+    for idx, meta in enumerate(chunk_metadata):
+        new_ids_by_page.setdefault(meta["page_numbers"][0], []).append(idx)
+
+    out_chunks, out_metadata, sources = [], [], []  # sources: (is_new, index)
+    for page_num in range(1, page_count + 1):
+        if page_num in reused:
+            for idx in old_ids_by_page.get(reused[page_num], []):
+                out_chunks.append(store.chunks[idx])
+                out_metadata.append({**store.chunk_metadata[idx], "page_numbers": [page_num]})
+                sources.append((False, idx))
+        else:
+            for idx in new_ids_by_page.get(page_num, []):
+                out_chunks.append(chunks[idx])
+                out_metadata.append(chunk_metadata[idx])
+                sources.append((True, idx))
+
+    is_new = np.array([new for new, _ in sources], dtype=bool)
+    ids = np.array([idx for _, idx in sources], dtype="int64")
+    out_vectors = np.empty((len(sources), store.index.d), dtype="float32")
+    if (~is_new).any():
+        out_vectors[~is_new] = store.reconstruct(ids[~is_new])
+    if is_new.any():
+        out_vectors[is_new] = np.asarray(vectors, dtype="float32")[ids[is_new]]
+    return out_chunks, out_metadata, out_vectors
@@ -1,6 +1,6 @@
 from typing import List, Dict, Any
-import requests
-from utils.config import TAVILY_API_KEY
+from utils.config import TAVILY_API_KEY, TAVILY_BASE_URL
+from services.upstream import call_upstream
 
 def search_web(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
     """
@@ -11,7 +11,7 @@ def search_web(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         return []
     
     try:
-        url = "https://api.tavily.com/search"
+        url = f"{TAVILY_BASE_URL}/search"
         payload = {
             "api_key": TAVILY_API_KEY,
             "query": query,
@@ -20,8 +20,14 @@ def search_web(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
             "include_raw_content": False
         }
         
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
+        import requests  # only needed once web search is used
+
+        def post():
+            response = requests.post(url, json=payload, timeout=10)
+            response.raise_for_status()
+            return response
+        
+        response = call_upstream("web_search", post)
         
         data = response.json()
         results = []
@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np
+import pytest
+from db import vector_store
+from db.vector_store import LocalFaissStore
+
+@pytest.fixture(autouse=True)
+def vector_dir(tmp_path, monkeypatch):
+    """Every test stores its documents in a directory of its own."""
+    path = tmp_path / "vectors"
+    monkeypatch.setattr(vector_store, "VECTOR_DIR", str(path))
+    return path
+
+@pytest.fixture
+def make_store():
+    """
+    Factory for stored documents: make_store(doc_id, n, dim, seed, **metadata) adds chunks
+    "chunk 0" .. "chunk {n-1}" with random vectors; metadata defaults to the filename.
+    """
+    def make(doc_id: str = "doc", n: int = 4, dim: int = 8, seed: int = 0, **metadata) -> LocalFaissStore:
+        store = LocalFaissStore(doc_id)
+        vectors = np.random.default_rng(seed).random((n, dim), dtype=np.float32)
+        store.add([f"chunk {i}" for i in range(n)], vectors, metadata={"filename": f"{doc_id}.pdf", **metadata},
+                  embedding_provider="hashing", embedding_model="m")
+        return store
+    return make
@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import json
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from db.vector_store import LocalFaissStore
+from routers import rate_limit
+from services.embeddings import HashingEmbeddingProvider, embed_queries
+
+TEXTS = [
+    "The warranty period is two years from delivery.",
+    "Shipping costs for returns are paid by the buyer.",
+    "Invoices are due within thirty days of receipt.",
+    "The agreement can be terminated with written notice.",
+    "Disputes are settled by the courts of Berlin."
+]
+QUESTIONS = ["How long is the warranty?", "Who pays for return shipping?", "When are invoices due?"]
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+@pytest.fixture
+def provider():
+    return HashingEmbeddingProvider(dim=64)
+
+@pytest.fixture
+def store(provider):
+    store = LocalFaissStore("doc")
+    store.add(TEXTS, provider.embed(TEXTS), metadata={"filename": "doc.pdf"},
+              embedding_provider=provider.name, embedding_model=provider.model)
+    return store
+
+@pytest.fixture
+def answers(monkeypatch):
+    """Stub LLM: answers echo the question; the question containing "invoices" fails."""
+    from routers import ask
+    calls = []
+    def fake_answer(question, contexts, use_web_search, max_context_tokens, **kwargs):
+        calls.append((question, contexts))
+        if "invoices" in question:
+            raise RuntimeError("model failed")
+        return {"answer": f"answer to {question}", "sources": {}, "usage": {"total_tokens": 1}}
+    monkeypatch.setattr(ask, "answer_with_context", fake_answer)
+    return calls
+
+def test_embed_queries_keeps_input_order(provider):
+    matrix = embed_queries(QUESTIONS, provider)
+    assert matrix.shape == (len(QUESTIONS), provider.dim)
+    for row, question in zip(matrix, QUESTIONS):
+        assert np.array_equal(row, provider.embed([question])[0])
+
+@pytest.mark.parametrize("diversify", [False, True])
+def test_search_batch_rows_match_single_searches(store, provider, diversify):
+    q = embed_queries(QUESTIONS, provider)
+    batch = store.search_batch(q, top_k=3, diversify=diversify)
+    assert len(batch) == len(QUESTIONS)
+    for row, hits in zip(q, batch):
+        single = store.search(row, 3, diversify)
+        assert [(h[0], h[2], h[3]) for h in hits] == [(h[0], h[2], h[3]) for h in single]
+        assert np.allclose([h[1] for h in hits], [h[1] for h in single])
+
+def _post_batch(body):
+    from main import app
+    return TestClient(app).post("/api/doc/batch", json={"questions": QUESTIONS, "top_k": 2, **body})
+
+def test_batch_streams_ndjson_with_errors_in_band(store, answers):
+    response = _post_batch({"retrieval_mode": "vector"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    frames = [json.loads(line) for line in response.text.splitlines()]
+
+    # One frame per question in completion order, then "done"
+    assert frames[-1] == {"type": "done", "count": len(QUESTIONS)}
+    by_index = {frame["index"]: frame for frame in frames[:-1]}
+    assert sorted(by_index) == [0, 1, 2]
+    # The failed question gets an error frame; the others are still answered
+    assert by_index[2] == {
+        "type": "error", "index": 2, "question": QUESTIONS[2],
+        "detail": "An error occurred while generating the answer."
+    }
+    for i in (0, 1):
+        frame = by_index[i]
+        assert frame["type"] == "result" and frame["answer"] == f"answer to {QUESTIONS[i]}"
+        assert [c["rank"] for c in frame["contexts"]] == [1, 2]
+        assert all(set(c) == {"rank", "score", "text", "page_numbers"} for c in frame["contexts"])
+    # Each question was answered with its own retrieved chunks
+    contexts = dict(answers)
+    assert sorted(contexts) == sorted(QUESTIONS)
+    for i in (0, 1):
+        assert contexts[QUESTIONS[i]] == [c["text"] for c in by_index[i]["contexts"]]
+
+def test_batch_streams_sse_frames(store, answers):
+    response = _post_batch({"format": "sse", "retrieval_mode": "lexical"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = response.text.split("\n\n")
+    assert events[-1] == ""
+    assert all(e.startswith("data: ") for e in events[:-1])
+    payloads = [json.loads(e[len("data: "):]) for e in events[:-1]]
+    assert [p["type"] for p in payloads].count("result") == 2
+    assert [p["type"] for p in payloads].count("error") == 1
+    assert payloads[-1] == {"type": "done", "count": len(QUESTIONS)}
+
+def test_single_ask_returns_ranked_contexts(store, answers):
+    from main import app
+    client = TestClient(app)
+    for mode in ("vector", "hybrid"):
+        body = client.post("/api/doc", json={"question": QUESTIONS[0], "top_k": 2, "retrieval_mode": mode}).json()
+        assert body["answer"] == f"answer to {QUESTIONS[0]}"
+        assert [c["rank"] for c in body["contexts"]] == [1, 2]
+        assert all(isinstance(c["score"], float) and c["page_numbers"] == [] for c in body["contexts"])
+        assert [c["text"] for c in body["contexts"]] == answers[-1][1]
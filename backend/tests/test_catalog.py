@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np
+import pytest
+from db import catalog
+from db.catalog import add_to_catalog, list_documents, store_record
+from db.vector_store import LocalFaissStore, delete_document_files
+
+@pytest.fixture
+def meta_reads(monkeypatch):
+    reads = []
+    real = catalog.read_document_meta
+    monkeypatch.setattr(catalog, "read_document_meta", lambda doc_id: reads.append(doc_id) or real(doc_id))
+    return reads
+
+def test_listing_reads_each_meta_file_only_when_it_changed(meta_reads, make_store):
+    make_store("a", upload_date="2024-01-01")
+    make_store("b", upload_date="2024-02-01")
+
+    assert [d["doc_id"] for d in list_documents()] == ["b", "a"]
+    assert sorted(meta_reads) == ["a", "b"]
+
+    meta_reads.clear()
+    list_documents()
+    assert meta_reads == []
+
+    # An append only adds a log segment; the entry must still be refreshed
+    LocalFaissStore("a").add(["more"], np.ones((1, 8), dtype=np.float32))
+    docs = {d["doc_id"]: d for d in list_documents()}
+    assert meta_reads == ["a"]
+    assert docs["a"]["chunks"] == 5
+
+    delete_document_files("b")
+    assert [d["doc_id"] for d in list_documents()] == ["a"]
+
+def test_entries_added_in_bulk_are_used_as_is(meta_reads, make_store):
+    stores = [make_store(f"doc-{i}", upload_date="2024-01-01") for i in range(3)]
+    add_to_catalog([store_record(store) for store in stores])
+
+    docs = list_documents()
+    assert meta_reads == []
+    assert {d["doc_id"] for d in docs} == {"doc-0", "doc-1", "doc-2"}
+    assert docs[0] == {
+        "doc_id": docs[0]["doc_id"], "filename": f"{docs[0]['doc_id']}.pdf", "upload_date": "2024-01-01",
+        "pages": 0, "chunks": 4, "version": 1, "dim": 8, "embedding_model": "m", "expires_at": None
+    }
@@ -2,7 +2,7 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from utils.chunker import chunk_text
+from utils.chunker import chunk_text, chunk_pages
 
 def test_chunk_text_basic():
     """Test basic text chunking functionality."""
@@ -34,3 +34,22 @@ def test_chunk_text_empty():
     assert len(chunks) == 0
     assert len(metadata) == 0
 
+
+def test_chunk_text_reports_token_counts():
+    """Each chunk carries its token count so embedding doesn't re-tokenize."""
+    text = "Token counting test sentence. " * 200
+    chunks, metadata = chunk_text(text, max_tokens=64)
+
+    assert all(meta["token_count"] <= 64 for meta in metadata)
+    assert sum(meta["token_count"] for meta in metadata) > 0
+    assert metadata[-1]["end_char"] == len("".join(chunks))
+
+def test_chunk_pages_never_spans_pages():
+    """Each page is chunked on its own; empty pages produce no chunks."""
+    pages = [(1, "First page. " * 100), (2, "   "), (3, "Third page.")]
+    chunks, metadata = chunk_pages(pages, max_tokens=50)
+    
+    assert [meta['page_numbers'] for meta in metadata].count([3]) == 1
+    assert all(len(meta['page_numbers']) == 1 for meta in metadata)
+    assert [2] not in [meta['page_numbers'] for meta in metadata]
+    assert chunks[-1] == "Third page."
@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import tiktoken
+from utils.context_packer import pack_contexts
+
+def _filler(topic: str, sentences: int) -> str:
+    return " ".join(f"Sentence {i} talks about {topic} in general terms." for i in range(sentences))
+
+def test_pack_contexts_respects_budget():
+    """Packed context never exceeds the token budget."""
+    contexts = [_filler(f"topic{i}", 60) for i in range(6)]
+    packed, tokens = pack_contexts("What about topic3?", contexts, max_tokens=400)
+
+    enc = tiktoken.get_encoding("cl100k_base")
+    assert tokens <= 400
+    assert sum(len(enc.encode(p)) for p in packed) == tokens
+
+def test_pack_contexts_honours_all_chunks():
+    """All distinct chunks get a share of the budget, not just the first three."""
+    contexts = [f"Clause {i} covers the warranty period for product line {i}." for i in range(6)]
+    packed, _ = pack_contexts("warranty period", contexts, max_tokens=1500)
+    assert len(packed) == 6
+
+def test_pack_contexts_drops_near_duplicates():
+    """Overlapping or near-identical chunks are sent only once."""
+    base = _filler("termination", 20)
+    other = "Invoices are payable within thirty days of receipt by bank transfer."
+    contexts = [base, base + " One extra trailing sentence.", other]
+    packed, _ = pack_contexts("termination notice", contexts, max_tokens=1500)
+
+    assert len(packed) == 2
+    assert packed[0] == base
+
+def test_pack_contexts_keeps_relevant_sentences():
+    """When a chunk must be trimmed, sentences matching the question survive."""
+    text = _filler("background", 40) + " The penalty for late delivery is 5 percent per week. " + _filler("misc", 40)
+    packed, tokens = pack_contexts("What is the penalty for late delivery?", [text], max_tokens=60)
+
+    assert tokens <= 60
+    assert "late delivery" in packed[0]
+
+def test_pack_contexts_empty():
+    """No contexts means no prompt tokens."""
+    assert pack_contexts("anything", [], max_tokens=1000) == ([], 0)
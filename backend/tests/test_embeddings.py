@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import random
+import time
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from services.embeddings import (
+    HashingEmbeddingProvider, OpenAIEmbeddingProvider, get_embedding_provider, pack_batches
+)
+
+def test_hashing_provider_shape_and_norm():
+    """Local embeddings have the configured dimension and unit length."""
+    provider = HashingEmbeddingProvider(dim=256)
+    vectors = provider.embed(["The quick brown fox.", "Lorem ipsum dolor sit amet."])
+
+    assert vectors.shape == (2, 256)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+def test_hashing_provider_is_deterministic_and_meaningful():
+    """Same text gives the same vector; overlapping texts are closer than unrelated ones."""
+    provider = HashingEmbeddingProvider(dim=512)
+    a, b, c, a_again = provider.embed([
+        "termination of the agreement requires written notice",
+        "written notice is required for termination",
+        "the invoice total includes shipping costs",
+        "termination of the agreement requires written notice",
+    ])
+
+    assert np.array_equal(a, a_again)
+    assert float(a @ b) > float(a @ c)
+
+def test_get_embedding_provider_restores_recorded_model():
+    """A document's recorded provider/model maps back to an equivalent provider."""
+    provider = get_embedding_provider("hashing", "feature-hash-128")
+    assert provider.model == "feature-hash-128"
+    assert provider.embed(["x"]).shape == (1, 128)
+    assert get_embedding_provider("hashing", "feature-hash-128") is provider
+
+    with pytest.raises(ValueError):
+        get_embedding_provider("unknown")
+
+def test_pack_batches_respects_limits():
+    """Batches never exceed the token or input limits and cover every text in order."""
+    counts = [500] * 2000
+    batches = pack_batches(counts, concurrency=4, max_tokens=250000, max_inputs=300)
+
+    assert batches[0][0] == 0 and batches[-1][1] == 2000
+    assert all(end == next_start for (_, end), (next_start, _) in zip(batches, batches[1:]))
+    assert all(end - start <= 300 for start, end in batches)
+    assert all(sum(counts[start:end]) <= 250000 for start, end in batches)
+
+def test_pack_batches_keeps_small_inputs_together():
+    """A handful of short texts (e.g. batch-ask questions) stays a single request."""
+    assert pack_batches([20] * 50, concurrency=4) == [(0, 50)]
+
+class _SlowEmbeddingsAPI:
+    """Stands in for client.embeddings: returns each input's number as its vector, after a random delay."""
+
+    def __init__(self):
+        self.calls = []
+
+    def create(self, model, input):
+        self.calls.append(len(input))
+        time.sleep(random.uniform(0, 0.02))
+        data = [SimpleNamespace(index=i, embedding=[float(text.split()[1]), 1.0]) for i, text in enumerate(input)]
+        random.shuffle(data)
+        return SimpleNamespace(data=data)
+
+def test_openai_provider_concurrent_batches_keep_order():
+    """Batches dispatched concurrently still come back in input order."""
+    provider = OpenAIEmbeddingProvider("test-model")
+    provider._client = SimpleNamespace(embeddings=_SlowEmbeddingsAPI())
+    texts = [f"chunk {i}" for i in range(2000)]
+
+    vectors = provider.embed(texts, token_counts=[500] * len(texts))
+
+    assert len(provider._client.embeddings.calls) > 1
+    assert vectors[:, 0].tolist() == [float(i) for i in range(2000)]
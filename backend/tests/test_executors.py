@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import asyncio
+import contextvars
+import threading
+import pytest
+from utils.executors import BoundedExecutor, ExecutorSaturated
+
+def test_rejects_beyond_queue_limit():
+    """Once workers and queue slots are all taken, new tasks fail fast instead of piling up."""
+    executor = BoundedExecutor("test", "thread", max_workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait, 5)
+        waiting = executor.submit(release.wait, 5)
+        assert executor.stats()["in_flight"] == 2
+        assert executor.stats()["queued"] == 1
+
+        with pytest.raises(ExecutorSaturated):
+            executor.submit(release.wait, 5)
+        assert executor.stats()["rejected"] == 1
+
+        release.set()
+        running.result(5)
+        waiting.result(5)
+        assert executor.stats()["in_flight"] == 0
+        assert executor.stats()["completed"] == 2
+    finally:
+        release.set()
+        executor.shutdown()
+
+def test_process_executor_runs_tasks():
+    executor = BoundedExecutor("test", "process", max_workers=1, max_queue=4)
+    try:
+        assert asyncio.run(executor.run(pow, 2, 10)) == 1024
+    finally:
+        executor.shutdown()
+
+def test_thread_tasks_see_caller_context():
+    """Like asyncio.to_thread, tasks run with the caller's context variables."""
+    request_id = contextvars.ContextVar("request_id", default=None)
+    executor = BoundedExecutor("test", "thread", max_workers=1, max_queue=1)
+
+    async def run():
+        request_id.set("abc")
+        return await executor.run(request_id.get)
+
+    try:
+        assert asyncio.run(run()) == "abc"
+    finally:
+        executor.shutdown()
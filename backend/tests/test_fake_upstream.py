@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import json
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+from benchmarks.fake_upstream import Latency, create_app, request_key
+
+def _client(app) -> OpenAI:
+    return OpenAI(api_key="test", base_url="http://testserver/v1", http_client=TestClient(app))
+
+def test_openai_sdk_reads_fake_responses():
+    app = create_app(embed_latency=Latency("const:0"), chat_latency=Latency("const:0"),
+                     chat_ttft=Latency("const:0"), token_delay=Latency("const:0"), completion_tokens=5)
+    client = _client(app)
+
+    # The SDK asks for base64 by default; the decoded vectors must match the float format
+    first = client.embeddings.create(model="m", input=["alpha", "beta"]).data[0].embedding
+    as_float = client.embeddings.create(model="m", input=["alpha"], encoding_format="float").data[0].embedding
+    assert len(first) == 1536
+    assert np.allclose(first, as_float)
+
+    messages = [{"role": "user", "content": "question"}]
+    answer = client.chat.completions.create(model="m", messages=messages).choices[0].message.content
+    chunks = list(client.chat.completions.create(
+        model="m", messages=messages, stream=True, stream_options={"include_usage": True}
+    ))
+    streamed = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+    assert streamed == answer
+    assert chunks[-1].usage.completion_tokens == 5
+
+def test_replay_serves_recordings_and_strict_rejects_others(tmp_path):
+    cassette = tmp_path / "tape.jsonl"
+    body = {"api_key": "secret", "query": "warranty", "max_results": 1}
+    recorded = {"query": "warranty", "results": [{"title": "Recorded"}]}
+    # Keys ignore API keys, so a recording made with another key still matches
+    key = request_key("/search", {**body, "api_key": "other"})
+    cassette.write_text(json.dumps({"key": key, "path": "/search", "status": 200, "body": recorded}) + "\n")
+    client = TestClient(create_app(mode="replay", cassette=str(cassette), strict=True))
+
+    assert client.post("/search", json=body).json() == recorded
+    assert client.post("/search", json={**body, "query": "other"}).status_code == 404
+
+def test_latency_specs():
+    assert Latency("const:0.5").sample() == 0.5
+    assert 1 <= Latency("uniform:1,2").sample() <= 2
+    with pytest.raises(ValueError):
+        Latency("normal:1")
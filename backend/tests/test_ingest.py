@@ -0,0 +1,45 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import json
+from types import SimpleNamespace
+from db.catalog import list_documents
+from db.vector_store import LocalFaissStore
+from benchmarks.synthetic import make_pdf, synthetic_pages
+import ingest
+
+def _args(tmp_path, **overrides):
+    return SimpleNamespace(**{
+        "directory": str(tmp_path / "pdfs"), "recursive": False, "workers": 1, "batch_tokens": 10_000,
+        "max_tokens": 500, "checkpoint": str(tmp_path / "checkpoint.jsonl"), "provider": "hashing", **overrides
+    })
+
+def test_ingest_stores_documents_and_resumes(tmp_path, capsys):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    for i in range(3):
+        (pdfs / f"doc{i}.pdf").write_bytes(make_pdf(synthetic_pages(2, words_per_page=60, seed=i)))
+    (pdfs / "broken.pdf").write_bytes(b"not a pdf")
+
+    assert ingest.run(_args(tmp_path)) == 1  # broken.pdf was skipped
+    docs = list_documents()
+    assert sorted(d["filename"] for d in docs) == ["doc0.pdf", "doc1.pdf", "doc2.pdf"]
+    store = LocalFaissStore(docs[0]["doc_id"])
+    assert store.metadata["pages"] == 2 and len(store.metadata["page_hashes"]) == 2
+    assert store.embedding_provider == "hashing"
+    assert store.ntotal == len(store.chunks) > 0
+
+    # A write cut short: its partial files are removed and the PDF is ingested again
+    records = [json.loads(line) for line in open(tmp_path / "checkpoint.jsonl")]
+    interrupted = next(r for r in records if r["path"].endswith("doc1.pdf") and r["status"] == "done")
+    with open(tmp_path / "checkpoint.jsonl", "a") as f:
+        f.write(json.dumps({**interrupted, "status": "writing"}) + "\n")
+
+    ingest.run(_args(tmp_path))
+    out = capsys.readouterr().out
+    assert "2 already ingested, 2 to go" in out  # doc1 and the still broken file
+    docs = list_documents()
+    assert sorted(d["filename"] for d in docs) == ["doc0.pdf", "doc1.pdf", "doc2.pdf"]
+    assert interrupted["doc_id"] not in {d["doc_id"] for d in docs}
@@ -0,0 +1,41 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from db.lexical_index import BM25Index, tokenize
+
+def test_tokenize_keeps_compound_identifiers():
+    """Part numbers and clause IDs are indexed whole and by their parts."""
+    tokens = tokenize("See clause 4.2.1 for part XR-7730.")
+    assert "4.2.1" in tokens
+    assert "xr-7730" in tokens
+    assert "xr" in tokens and "7730" in tokens
+
+def test_bm25_exact_term_lookup():
+    """A rare exact term ranks the chunk containing it first."""
+    index = BM25Index()
+    index.add([
+        "The supplier shall deliver goods within thirty days.",
+        "Replacement part XR-7730 is covered by the extended warranty.",
+        "Payment terms are net sixty days from invoice.",
+    ])
+
+    results = index.search("warranty for XR-7730", top_k=3)
+    assert results[0][0] == 1
+    assert all(score > 0 for _, score in results)
+
+def test_bm25_no_match_returns_nothing():
+    index = BM25Index()
+    index.add(["alpha beta", "gamma delta"])
+    assert index.search("omega", top_k=5) == []
+
+def test_bm25_roundtrip_and_incremental_add():
+    """A persisted index scores like the original and keeps numbering chunks on add."""
+    index = BM25Index()
+    index.add(["first chunk about invoices", "second chunk about deliveries"])
+    restored = BM25Index.from_dict(index.to_dict())
+    assert restored.search("invoices") == index.search("invoices")
+
+    restored.add(["third chunk about invoices and deliveries"])
+    assert len(restored) == 3
+    assert 2 in [idx for idx, _ in restored.search("invoices deliveries")]
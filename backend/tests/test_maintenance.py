@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from db import vector_store
+from db.catalog import list_documents
+from db.maintenance import run_maintenance
+from db.vector_store import LocalFaissStore
+
+def _age(path, seconds: float):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+def _utcnow() -> datetime:
+    """Naive UTC, as expires_at is stored."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _doc_ids(directory) -> set:
+    return {name[:-len(".meta.json")] for name in os.listdir(directory) if name.endswith(".meta.json")}
+
+def test_expired_documents_are_deleted(make_store):
+    past = (_utcnow() - timedelta(seconds=1)).isoformat()
+    future = (_utcnow() + timedelta(days=1)).isoformat()
+    make_store("old", expires_at=past)
+    make_store("new", expires_at=future)
+    make_store("kept")
+
+    report = run_maintenance(quota_bytes=0)
+    assert [d["doc_id"] for d in report["expired"]] == ["old"]
+    assert _doc_ids(vector_store.VECTOR_DIR) == {"new", "kept"}
+    assert not any(name.startswith("old.") for name in os.listdir(vector_store.VECTOR_DIR))
+
+def test_quota_evicts_least_recently_accessed(vector_dir, make_store):
+    for doc_id in ("a", "b", "c"):
+        make_store(doc_id)
+    _age(vector_dir / "a.meta.json", 300)
+    _age(vector_dir / "b.meta.json", 200)
+    _age(vector_dir / "c.meta.json", 100)
+    vector_store.record_access("a")  # Read since, so b is now the least recently used
+
+    list_documents()  # Write the catalog first, so both runs count it
+    planned = run_maintenance(dry_run=True, quota_bytes=1)
+    assert [d["doc_id"] for d in planned["evicted"]] == ["b", "c", "a"]
+    quota = planned["bytes_before"] - planned["evicted"][0]["bytes"]
+    report = run_maintenance(quota_bytes=quota)
+    assert [d["doc_id"] for d in report["evicted"]] == ["b"]
+    assert report["bytes_after"] <= quota
+    assert _doc_ids(vector_dir) == {"a", "c"}
+
+def test_leftovers_are_removed_after_the_grace_period(vector_dir, make_store):
+    store = make_store("a")
+    LocalFaissStore("a").add(["more"], np.ones((1, 8), dtype=np.float32))
+    store.compact()
+    # An old-generation index left by a crash, an interrupted write and the files of a deleted document
+    (vector_dir / "a.faiss").write_bytes(b"old")
+    (vector_dir / "a.meta.json.1.2.tmp").write_bytes(b"partial")
+    (vector_dir / "gone.faiss").write_bytes(b"orphan")
+    (vector_dir / "gone.log").mkdir()
+    (vector_dir / "gone.log" / "00000001.npz").write_bytes(b"segment")
+
+    report = run_maintenance(grace_seconds=60)
+    assert report["removed_files"] == []  # All too recent: may belong to writes in progress
+
+    for path in ("a.faiss", "a.meta.json.1.2.tmp", "gone.faiss", "gone.log/00000001.npz"):
+        _age(vector_dir / path, 120)
+    report = run_maintenance(grace_seconds=60)
+    assert {(f["path"], f["reason"]) for f in report["removed_files"]} == {
+        ("a.faiss", "stale generation"),
+        ("a.meta.json.1.2.tmp", "interrupted write"),
+        ("gone.faiss", "orphan"),
+        (os.path.join("gone.log", "00000001.npz"), "orphan"),
+    }
+    remaining = set(os.listdir(vector_dir))
+    assert not {"a.faiss", "a.meta.json.1.2.tmp", "gone.faiss", "gone.log"} & remaining
+    assert {"a.meta.json", "a.g1.faiss"} <= remaining
+    assert LocalFaissStore("a").ntotal == 5
+
+def test_fragmented_documents_are_compacted(make_store):
+    make_store("a")
+    for i in range(2):
+        LocalFaissStore("a").add([f"more {i}"], np.ones((1, 8), dtype=np.float32))
+    assert len(LocalFaissStore("a").segments) == 2
+
+    # Another worker is writing the document: it is left for the next run rather than waited for
+    with vector_store.document_lock("a"):
+        assert run_maintenance(compact_segments=2)["compacted"] == []
+    assert len(LocalFaissStore("a").segments) == 2
+
+    report = run_maintenance(compact_segments=2)
+    assert report["compacted"] == [{"doc_id": "a", "segments": 2}]
+    store = LocalFaissStore("a")
+    assert store.segments == [] and store.ntotal == 6
+
+def test_dry_run_changes_nothing(vector_dir, make_store):
+    make_store("expired", expires_at=(_utcnow() - timedelta(seconds=1)).isoformat())
+    make_store("a")
+    LocalFaissStore("a").add(["more"], np.ones((1, 8), dtype=np.float32))
+    LocalFaissStore("a").add(["more"], np.ones((1, 8), dtype=np.float32))
+    (vector_dir / "x.tmp").write_bytes(b"partial")
+    _age(vector_dir / "x.tmp", 7200)
+    before = sorted(os.listdir(vector_dir))
+
+    report = run_maintenance(dry_run=True, quota_bytes=1, compact_segments=2)
+    assert report["dry_run"]
+    assert [d["doc_id"] for d in report["expired"]] == ["expired"]
+    assert [d["doc_id"] for d in report["evicted"]] == ["a"]
+    assert [f["path"] for f in report["removed_files"]] == ["x.tmp"]
+    assert report["bytes_after"] < report["bytes_before"]
+    # The catalog and the lock file are the only files a dry run may write
+    assert sorted(set(os.listdir(vector_dir)) - {"catalog.json", ".maintenance.lock"}) == before
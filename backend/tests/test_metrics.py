@@ -0,0 +1,58 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.metrics import (
+    Counter, Gauge, Histogram, render_metrics, server_timing_header, start_request_timings, time_stage, STAGE_SECONDS
+)
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_latency_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "parse")
+
+    lines = histogram.render().splitlines()
+    assert lines[:2] == ["# HELP test_latency_seconds Test latency.", "# TYPE test_latency_seconds histogram"]
+    assert lines[2:] == [
+        'test_latency_seconds_bucket{stage="parse",le="0.1"} 1',
+        'test_latency_seconds_bucket{stage="parse",le="1"} 3',
+        'test_latency_seconds_bucket{stage="parse",le="+Inf"} 4',
+        'test_latency_seconds_sum{stage="parse"} 6.05',
+        'test_latency_seconds_count{stage="parse"} 4',
+    ]
+
+def test_counter_and_collected_gauge():
+    counter = Counter("test_lookups_total", "Test lookups.", ("result",))
+    counter.inc("hit")
+    counter.inc("hit", amount=2)
+    queue = {"io": 3}
+    Gauge("test_queue_depth", "Test queue.", ("executor",), collect=lambda: {(name,): depth for name, depth in queue.items()})
+    queue["io"] = 5  # read at scrape time, not when registered
+
+    text = render_metrics()
+    assert 'test_lookups_total{result="hit"} 3' in text
+    assert 'test_queue_depth{executor="io"} 5' in text
+
+def test_label_values_are_escaped():
+    counter = Counter("test_escaped_total", "Test escaping.", ("name",))
+    counter.inc('a "quoted"\nvalue')
+    assert 'test_escaped_total{name="a \\"quoted\\"\\nvalue"} 1' in counter.render()
+
+def test_time_stage_records_even_on_error():
+    before = STAGE_SECONDS.count("test", "failing")
+    try:
+        with time_stage("test", "failing"):
+            raise ValueError()
+    except ValueError:
+        pass
+    assert STAGE_SECONDS.count("test", "failing") == before + 1
+
+def test_server_timing_sums_repeated_stages():
+    timings = start_request_timings()
+    with time_stage("test", "search"):
+        pass
+    timings.extend([("llm_total", 0.25), ("llm_total", 0.5)])
+
+    header = server_timing_header(timings, 1.0)
+    assert header.startswith("search;dur=")
+    assert header.endswith(", llm_total;dur=750.0, total;dur=1000.0")
@@ -2,7 +2,8 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from services.pdf_parser import extract_pdf_text
+from services.pdf_parser import extract_pdf_text, extract_pages
+from benchmarks.synthetic import make_pdf
 
 def test_extract_pdf_text_structure():
     """Test that extract_pdf_text returns correct structure."""
@@ -14,3 +15,23 @@ def test_extract_pdf_text_structure():
     # Function should return tuple of (text, pages, page_mapping)
     # This is a structural test
 
+
+def test_extract_pdf_text_maps_pages():
+    pdf = make_pdf(["First page text", "Second page text"])
+    text, pages, page_mapping = extract_pdf_text(pdf)
+    
+    assert pages == 2
+    assert text == "First page text\nSecond page text"
+    assert [page['page_num'] for page in page_mapping] == [1, 2]
+    assert text[page_mapping[1]['start_char']:page_mapping[1]['end_char']] == "Second page text"
+
+def test_extract_pages_skips_known_pages():
+    """Pages whose content hash is already known aren't extracted again."""
+    pdf = make_pdf(["Unchanged page", "Edited page"])
+    content_hashes, page_texts = extract_pages(pdf)
+    assert page_texts == {1: "Unchanged page", 2: "Edited page"}
+    
+    revised = make_pdf(["Unchanged page", "Edited page, revised"])
+    revised_hashes, revised_texts = extract_pages(revised, frozenset(content_hashes))
+    assert revised_hashes[0] == content_hashes[0]
+    assert revised_texts == {2: "Edited page, revised"}
@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import threading
+import tracemalloc
+import pytest
+from utils.profiling import RequestProfiler
+
+def busy_loop():
+    return sum(i * i for i in range(20000))
+
+def test_cpu_profile_covers_next_n_requests_including_threads():
+    profiler = RequestProfiler()
+    profiler.start("cpu", requests=2)
+    for _ in range(3):
+        session = profiler.begin()
+        if session is not None:
+            # Work done on an executor thread on behalf of the request
+            worker = threading.Thread(target=busy_loop)
+            worker.start()
+            worker.join()
+            profiler.end(session)
+
+    status = profiler.status()
+    assert (status["armed"], status["profiled"]) == (False, 2)
+    assert "busy_loop" in status["report"]
+    assert profiler.begin() is None  # disarmed: later requests aren't touched
+
+def test_memory_profile_reports_allocations():
+    profiler = RequestProfiler()
+    profiler.start("memory", requests=1)
+    session = profiler.begin()
+    held = [bytearray(1024) for _ in range(100)]
+    profiler.end(session)
+
+    assert not tracemalloc.is_tracing()
+    assert "test_profiling.py" in profiler.status()["report"]
+    del held
+
+def test_one_session_at_a_time():
+    profiler = RequestProfiler()
+    profiler.start("cpu", requests=1)
+    with pytest.raises(RuntimeError):
+        profiler.start("memory", requests=1)
+    profiler.stop()
+    assert profiler.status()["report"] == "No requests were profiled."
+
+def test_requests_of_a_stopped_session_are_ignored():
+    profiler = RequestProfiler()
+    profiler.start("cpu", requests=2)
+    late = profiler.begin()
+    profiler.stop()
+
+    profiler.start("cpu", requests=2)
+    first = profiler.begin()
+    profiler.end(late)  # still in flight when the first session was stopped
+    assert (profiler.active, profiler.profiled) == (1, 0)
+    second = profiler.begin()
+    busy_loop()
+    profiler.end(first)
+    profiler.end(second)
+
+    status = profiler.status()
+    assert (status["armed"], status["profiled"]) == (False, 2)
+    assert "busy_loop" in status["report"]
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pytest
+from routers.rate_limit import MemoryRateLimitBackend, RateLimiter, SQLiteRateLimitBackend
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path):
+    if request.param == "memory":
+        return RateLimiter(MemoryRateLimitBackend())
+    return RateLimiter(SQLiteRateLimitBackend(str(tmp_path / "limits.db")))
+
+def test_limit_enforced_within_window(limiter):
+    """The (max_requests + 1)th request in a window is rejected with a reset hint."""
+    now = 6000.0
+    results = [limiter.is_allowed("client", 5, 60, now=now + i) for i in range(6)]
+
+    assert [allowed for allowed, _, _ in results] == [True] * 5 + [False]
+    assert [remaining for _, remaining, _ in results[:5]] == [4, 3, 2, 1, 0]
+    assert 0 < results[-1][2] <= 60
+
+def test_previous_window_decays(limiter):
+    """Requests from the previous window count in proportion to their remaining overlap."""
+    for i in range(10):
+        assert limiter.is_allowed("client", 10, 60, now=6000.0 + i)[0]
+
+    # Halfway into the next window, about half of the previous 10 still count
+    allowed = [limiter.is_allowed("client", 10, 60, now=6090.0)[0] for _ in range(10)]
+    assert allowed.count(True) == 5
+
+    # Two windows later everything has expired
+    assert limiter.is_allowed("client", 10, 60, now=6200.0)[1] == 9
+
+def test_keys_are_independent(limiter):
+    """One client (or endpoint scope) exhausting its limit doesn't affect another."""
+    for _ in range(3):
+        limiter.is_allowed("upload:a", 3, 3600, now=7200.0)
+    assert not limiter.is_allowed("upload:a", 3, 3600, now=7201.0)[0]
+    assert limiter.is_allowed("ask:a", 3, 3600, now=7201.0)[0]
+    assert limiter.is_allowed("upload:b", 3, 3600, now=7201.0)[0]
+
+def test_sqlite_backend_shared_between_workers(tmp_path):
+    """Two limiters on the same file (e.g. two uvicorn workers) enforce one combined limit."""
+    path = str(tmp_path / "limits.db")
+    worker_a = RateLimiter(SQLiteRateLimitBackend(path))
+    worker_b = RateLimiter(SQLiteRateLimitBackend(path))
+
+    allowed = [
+        (worker_a if i % 2 else worker_b).is_allowed("client", 4, 60, now=6000.0 + i)[0]
+        for i in range(8)
+    ]
+    assert allowed == [True] * 4 + [False] * 4
+
+def test_memory_backend_sweeps_expired_keys():
+    """Memory stays bounded: stale keys are dropped as new ones arrive."""
+    backend = MemoryRateLimitBackend(max_keys=1000)
+    limiter = RateLimiter(backend)
+    for i in range(5000):
+        limiter.is_allowed(f"client-{i}", 5, 60, now=6000.0 + i)
+
+    assert len(backend.entries) <= 1000
+    # Only keys seen in the last two windows can still matter
+    assert all(expires_at > 6000.0 + 4999 for _, expires_at in backend.entries.values())
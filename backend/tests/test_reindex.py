@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from db.catalog import list_documents
+from db.vector_store import LocalFaissStore, read_pages, write_pages
+from benchmarks.synthetic import make_pdf, synthetic_pages
+from services.reindex import PagesUnavailable, ReindexConflict, reindex_document, reindex_documents
+from services.versioning import page_hashes, pages_match, version_pages
+import ingest
+import reindex
+
+@pytest.fixture
+def doc_ids(tmp_path):
+    """Three documents stored by the bulk ingester, which keeps their page texts."""
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    for i in range(3):
+        (pdfs / f"doc{i}.pdf").write_bytes(make_pdf(synthetic_pages(2, words_per_page=300, seed=i)))
+    ingest.run(SimpleNamespace(
+        directory=str(pdfs), recursive=False, workers=1, batch_tokens=10_000, max_tokens=500,
+        checkpoint=str(tmp_path / "checkpoint.jsonl"), provider="hashing"
+    ))
+    return sorted(doc["doc_id"] for doc in list_documents())
+
+def test_pages_are_stored_compressed(doc_ids, vector_dir):
+    pages = read_pages(doc_ids[0])
+    store = LocalFaissStore(doc_ids[0])
+    assert len(pages) == 2 and pages_match(store.metadata, pages)
+    assert "".join(store.chunks).replace(" ", "") in "".join(pages).replace(" ", "")
+    assert (vector_dir / f"{doc_ids[0]}.pages.json.gz").stat().st_size < len("".join(pages).encode()) / 2
+    assert read_pages("missing") is None
+
+def test_reindex_rechunks_from_stored_pages(doc_ids):
+    before = LocalFaissStore(doc_ids[0])
+    report = reindex_document(doc_ids[0], max_tokens=100)
+    assert report["status"] == "reindexed" and report["chunks_before"] == len(before.chunks)
+
+    store = LocalFaissStore(doc_ids[0])
+    assert len(store.chunks) == report["chunks"] > len(before.chunks)
+    assert max(meta["token_count"] for meta in store.chunk_metadata) <= 100
+    assert store.metadata["chunk_max_tokens"] == 100 and store.ntotal == len(store.chunks)
+    assert store.metadata["page_hashes"] == before.metadata["page_hashes"]
+    # Already chunked that way: nothing to do unless forced
+    assert reindex_document(doc_ids[0], max_tokens=100)["status"] == "skipped"
+    assert reindex_document(doc_ids[0], max_tokens=100, force=True)["status"] == "reindexed"
+    assert reindex_document("missing") is None
+
+def test_reindex_can_switch_embedding_model(doc_ids):
+    report = reindex_document(doc_ids[0], embedding_provider="hashing", embedding_model="feature-hash-64")
+    store = LocalFaissStore(doc_ids[0])
+    assert report["status"] == "reindexed"
+    assert (store.embedding_model, store.index.d) == ("feature-hash-64", 64)
+    assert store.search(np.ones(64, dtype=np.float32), 1)
+
+def test_documents_without_current_pages_are_not_reindexed(doc_ids, vector_dir, monkeypatch):
+    write_pages(doc_ids[0], ["outdated text", "of another version"])
+    with pytest.raises(PagesUnavailable):
+        reindex_document(doc_ids[0], max_tokens=100)
+    os.remove(vector_dir / f"{doc_ids[0]}.pages.json.gz")
+    with pytest.raises(PagesUnavailable):
+        reindex_document(doc_ids[0], max_tokens=100)
+
+    # A write committed while the document was being re-embedded is not overwritten
+    from services import reindex as reindex_module
+    real_embed = reindex_module.embed_texts
+    def embed_during_append(texts, provider, token_counts):
+        store = LocalFaissStore(doc_ids[1])
+        store.add(["appended"], np.ones((1, store.index.d), dtype=np.float32))
+        return real_embed(texts, provider, token_counts)
+    monkeypatch.setattr(reindex_module, "embed_texts", embed_during_append)
+    with pytest.raises(ReindexConflict):
+        reindex_document(doc_ids[1], max_tokens=100)
+    assert LocalFaissStore(doc_ids[1]).chunks[-1] == "appended"
+
+def test_new_version_keeps_reused_pages_text():
+    old_pages = ["alpha", "beta", "gamma"]
+    # Page 1 reused from old page 1, page 2 edited, page 3 reused from old page 3
+    assert version_pages(3, {2: "beta v2"}, {1: 1, 3: 3}, old_pages) == ["alpha", "beta v2", "gamma"]
+    assert version_pages(3, {2: "beta v2"}, {1: 1, 3: 3}, None) is None
+    metadata = {"page_hashes": page_hashes(["c1", "c2", "c3"], dict(enumerate(old_pages, start=1)))}
+    assert pages_match(metadata, old_pages) and not pages_match(metadata, ["alpha", "beta v2", "gamma"])
+
+def test_corpus_reindex_runs_in_parallel_and_resumes(doc_ids, capsys):
+    args = SimpleNamespace(doc=None, max_tokens=120, provider=None, model=None, workers=3, force=False)
+    assert reindex.run(args) == 0
+    assert "Reindexed 3 documents" in capsys.readouterr().out
+    assert all(LocalFaissStore(doc_id).metadata["chunk_max_tokens"] == 120 for doc_id in doc_ids)
+
+    summary = reindex_documents(doc_ids + ["missing"], workers=2, max_tokens=120)
+    assert (summary["skipped"], summary["failed"]) == (3, 1)
+    assert summary["errors"] == {"missing": "Document not found"}
@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from db.rerank import maximal_marginal_relevance, reciprocal_rank_fusion
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    return m / np.linalg.norm(m, axis=-1, keepdims=True)
+
+def test_mmr_skips_near_duplicates():
+    """A near-copy of the best hit loses to a distinct, slightly less relevant hit."""
+    query = _normalize(np.array([1.0, 0.0, 0.0], dtype="float32"))
+    candidates = _normalize(np.array([
+        [1.0, 0.10, 0.0],   # best match
+        [1.0, 0.11, 0.0],   # near-duplicate of the best match
+        [0.8, 0.0, 0.6],    # relevant but different
+    ], dtype="float32"))
+
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+
+def test_mmr_pure_relevance_matches_similarity_order():
+    """With lambda_mult=1.0 MMR reduces to plain ranking by query similarity."""
+    rng = np.random.default_rng(0)
+    query = _normalize(rng.normal(size=16).astype("float32"))
+    candidates = _normalize(rng.normal(size=(20, 16)).astype("float32"))
+
+    expected = list(np.argsort(-(candidates @ query))[:5])
+    assert maximal_marginal_relevance(query, candidates, k=5, lambda_mult=1.0) == expected
+
+def test_mmr_k_larger_than_candidates():
+    """Asking for more results than candidates returns each candidate once."""
+    query = _normalize(np.ones(4, dtype="float32"))
+    candidates = _normalize(np.eye(4, dtype="float32")[:3])
+
+    selected = maximal_marginal_relevance(query, candidates, k=10)
+    assert sorted(selected) == [0, 1, 2]
+
+def test_mmr_empty():
+    assert maximal_marginal_relevance(np.ones(4, dtype="float32"), np.empty((0, 4), dtype="float32"), k=3) == []
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """Items ranked well by both retrievers beat items ranked first by only one."""
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 4, 1]])
+    assert [idx for idx, _ in fused][:2] == [2, 1]
+    assert {idx for idx, _ in fused} == {1, 2, 3, 4}
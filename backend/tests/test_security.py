@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncio
+import threading
+import pytest
+from utils import security
+from utils.security import (
+    BruteForceProtection, MemoryAttemptStore, SQLiteAttemptStore, PasswordVerifier, VerifierBusy,
+    issue_session_token, verify_session_token
+)
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryAttemptStore()
+    return SQLiteAttemptStore(str(tmp_path / "attempts.db"))
+
+def test_locks_after_max_attempts(store):
+    """The fifth failure inside the window locks the IP for the lockout duration."""
+    clock = FakeClock()
+    protection = BruteForceProtection(store, clock)
+
+    for i in range(4):
+        protection.record_failed_attempt("1.2.3.4")
+        clock.now += 1
+    assert not protection.is_locked("1.2.3.4")
+    assert protection.get_delay("1.2.3.4") == 8
+
+    protection.record_failed_attempt("1.2.3.4")
+    assert protection.is_locked("1.2.3.4")
+    assert protection.get_remaining_lockout_time("1.2.3.4") == 900
+    assert not protection.is_locked("5.6.7.8")
+
+    clock.now += 901
+    assert not protection.is_locked("1.2.3.4")
+
+def test_success_clears_attempts(store):
+    clock = FakeClock()
+    protection = BruteForceProtection(store, clock)
+    for _ in range(3):
+        protection.record_failed_attempt("1.2.3.4")
+
+    protection.record_success("1.2.3.4")
+    assert protection.get_delay("1.2.3.4") == 0
+
+def test_old_failures_decay(store):
+    """Failures stop counting once they fall out of the window, without a cliff at its edge."""
+    clock = FakeClock()
+    protection = BruteForceProtection(store, clock)
+    protection.record_failed_attempt("1.2.3.4")
+    clock.now += 890
+    for _ in range(3):
+        protection.record_failed_attempt("1.2.3.4")
+
+    # Just past the window boundary the earlier failures still count
+    clock.now += 20
+    protection.record_failed_attempt("1.2.3.4")
+    assert not protection.is_locked("1.2.3.4")
+    protection.record_failed_attempt("1.2.3.4")
+    assert protection.is_locked("1.2.3.4")
+
+    clock.now += 3000
+    assert protection.get_delay("1.2.3.4") == 0
+
+def test_clock_restart_discards_stale_records(store):
+    """Monotonic time restarts on reboot; records from 'the future' must not lock forever."""
+    clock = FakeClock(now=100000.0)
+    protection = BruteForceProtection(store, clock)
+    for _ in range(5):
+        protection.record_failed_attempt("1.2.3.4")
+    assert protection.is_locked("1.2.3.4")
+
+    clock.now = 50.0
+    assert not protection.is_locked("1.2.3.4")
+
+def test_lockout_shared_between_workers(tmp_path):
+    """Two protectors on one SQLite file see each other's failures."""
+    path = str(tmp_path / "attempts.db")
+    clock = FakeClock()
+    worker_a = BruteForceProtection(SQLiteAttemptStore(path), clock)
+    worker_b = BruteForceProtection(SQLiteAttemptStore(path), clock)
+
+    for i in range(5):
+        (worker_a if i % 2 else worker_b).record_failed_attempt("1.2.3.4")
+    assert worker_a.is_locked("1.2.3.4")
+    assert worker_b.is_locked("1.2.3.4")
+
+def test_memory_store_is_bounded():
+    """A spray from many distinct IPs can't grow the store past its cap."""
+    clock = FakeClock()
+    protection = BruteForceProtection(MemoryAttemptStore(max_keys=100), clock)
+    for i in range(1000):
+        protection.record_failed_attempt(f"10.0.{i // 256}.{i % 256}")
+    assert len(protection.store.entries) == 100
+
+def test_session_token_round_trip():
+    token = issue_session_token(ttl=60, now=1000.0)
+    assert verify_session_token(token, now=1059.0)
+    assert not verify_session_token(token, now=1061.0)
+
+def test_tampered_session_token_rejected():
+    expires, nonce, signature = issue_session_token(ttl=60, now=1000.0).split(".")
+    assert not verify_session_token(f"{int(expires) + 3600}.{nonce}.{signature}", now=1000.0)
+    assert not verify_session_token(f"{expires}.{nonce}.{'0' * len(signature)}", now=1000.0)
+    assert not verify_session_token("not-a-token")
+    assert not verify_session_token(None)
+
+def test_verifier_sheds_load_when_queue_full(monkeypatch):
+    """Checks beyond max_pending are rejected immediately instead of queueing more bcrypt work."""
+    release = threading.Event()
+    monkeypatch.setattr(security, "verify_auth_password", lambda password: release.wait(5))
+    verifier = PasswordVerifier(workers=1, max_pending=2)
+
+    async def run():
+        pending = [asyncio.ensure_future(verifier.verify("pw")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(VerifierBusy):
+            await verifier.verify("pw")
+        release.set()
+        assert await asyncio.gather(*pending) == [True, True]
+        # Slots are freed once the checks finish
+        assert await verifier.verify("pw")
+
+    asyncio.run(run())
@@ -0,0 +1,136 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from db.vector_store import LocalFaissStore
+from services import qa, sessions
+from services.sessions import (
+    add_turn, answered, create_session, load_session, retain, retrieval_reason, session_prompt
+)
+
+@pytest.fixture(autouse=True)
+def session_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sessions, "SESSION_DIR", str(tmp_path / "sessions"))
+
+def _hit(idx: int, text: str):
+    return (idx, 1.0 / (idx + 1), text, [idx + 1])
+
+def test_follow_ups_reuse_chunks_until_they_drift():
+    session = create_session("doc")
+    reason, _ = retrieval_reason(session, "What is the warranty period?", [1])
+    assert reason == "first turn"
+    retain(session, "What is the warranty period?", [_hit(0, "The warranty period is two years from delivery.")], [1])
+
+    assert retrieval_reason(session, "How long is the warranty?", [1])[0] is None
+    assert retrieval_reason(session, "Why?", [1]) == (None, 0.0)
+    assert retrieval_reason(session, "Who pays shipping costs for returns?", [1])[0] == "drift"
+    # A new version of the document invalidates the kept chunks
+    assert retrieval_reason(session, "How long is the warranty?", [2])[0] == "document changed"
+
+def test_new_chunks_are_added_after_kept_ones_within_budget():
+    session = create_session("doc")
+    def text(n: int) -> str:
+        return " ".join(f"chunk{n}word{i}" for i in range(20))
+    retain(session, "q", [_hit(0, text(0)), _hit(1, text(1))], [1], max_tokens=1000)
+    before = [c["text"] for c in session["contexts"]]
+
+    # Chunk 1 is already kept; only chunk 2 is new
+    retain(session, "q", [_hit(1, "ignored"), _hit(2, text(2))], [1], max_tokens=1000)
+    assert [c["chunk_idx"] for c in session["contexts"]] == [0, 1, 2]
+    assert [c["text"] for c in session["contexts"]][:2] == before
+
+    # Over the budget, the oldest chunks are dropped down to half of it at once
+    per_chunk = session["contexts"][0]["tokens"]
+    retain(session, "q", [_hit(3, text(3))], [1], max_tokens=4 * per_chunk)
+    assert [c["chunk_idx"] for c in session["contexts"]] == [0, 1, 2, 3]
+    retain(session, "q", [_hit(4, text(4))], [1], max_tokens=4 * per_chunk)
+    assert [c["chunk_idx"] for c in session["contexts"]] == [3, 4]
+
+def test_history_keeps_latest_turns_within_budget():
+    session = create_session("doc")
+    for i in range(4):
+        add_turn(session, f"question {i}", " ".join(["answer"] * 40), max_tokens=100)
+    # The third turn went over the budget: the history was cut to half of it, then grew again
+    assert [t["question"] for t in session["turns"]] == ["question 2", "question 3"]
+    add_turn(session, "question 4", " ".join(["answer"] * 40), max_tokens=100)
+    assert [t["question"] for t in session["turns"]] == ["question 4"]
+    assert answered(session) == 5
+
+def test_sessions_expire(monkeypatch):
+    session = create_session("doc")
+    assert load_session(session["session_id"])["doc_id"] == "doc"
+    monkeypatch.setattr(sessions, "CONVERSATION_TTL_SECONDS", -1)
+    assert load_session(session["session_id"]) is None
+    assert load_session("../../etc/passwd") is None
+
+def test_follow_up_prompt_extends_the_previous_one():
+    warranty = "The warranty period is two years."
+    shipping = "Shipping costs for returns are paid by the buyer."
+    session = create_session("doc")
+
+    def prompt(question):
+        history, contexts = session_prompt(session)
+        return qa._build_messages(question, contexts, False, 1500, history, packed=True)
+
+    retain(session, "How long is the warranty?", [_hit(0, warranty)], [1])
+    first, _, _ = prompt("How long is the warranty?")
+    add_turn(session, "How long is the warranty?", "Two years [1].")
+    # A follow-up reusing the kept chunks adds the answer and its question
+    second, _, _ = prompt("When does it start?")
+    add_turn(session, "When does it start?", "At delivery [1].")
+    # A drifted follow-up's chunks go after the earlier turns, just before its question
+    retain(session, "Who pays for return shipping?", [_hit(1, shipping)], [1])
+    third, _, context_tokens = prompt("Who pays for return shipping?")
+
+    assert first[0]["content"] == qa.DOCUMENT_SYSTEM_PROMPT
+    assert second[:len(first)] == first and third[:len(second)] == second
+    assert third[len(second):] == [
+        {"role": "assistant", "content": "At delivery [1]."},
+        {"role": "system", "content": f"Document Context:\n{shipping}"},
+        {"role": "user", "content": "Question: Who pays for return shipping?"}
+    ]
+    assert context_tokens == sum(c["tokens"] for c in session["contexts"])
+
+def test_session_asks_skip_retrieval_for_follow_ups(monkeypatch):
+    from main import app
+    from routers import ask
+
+    store = LocalFaissStore("doc")
+    texts = ["The warranty period is two years from delivery.", "Shipping costs for returns are paid by the buyer."]
+    store.add(texts, np.eye(2, 8, dtype=np.float32), metadata={"filename": "doc.pdf"},
+              embedding_provider="hashing", embedding_model="m")
+
+    retrievals = []
+    real_retrieve = ask._retrieve
+    async def counting_retrieve(store, request):
+        retrievals.append(request.question)
+        return await real_retrieve(store, request)
+    calls = []
+    def fake_answer(question, contexts, use_web_search, max_context_tokens, **kwargs):
+        calls.append((contexts, kwargs))
+        return {"answer": f"answer to {question}", "sources": {}, "usage": {}}
+    monkeypatch.setattr(ask, "_retrieve", counting_retrieve)
+    monkeypatch.setattr(ask, "answer_with_context", fake_answer)
+
+    client = TestClient(app)
+    session_id = client.post("/api/doc/sessions").json()["session_id"]
+    body = {"session_id": session_id, "retrieval_mode": "lexical", "top_k": 1}
+    first = client.post("/api/doc", json={**body, "question": "What is the warranty period?"}).json()
+    follow_up = client.post("/api/doc", json={**body, "question": "Does the warranty period start at delivery?"}).json()
+    drifted = client.post("/api/doc", json={**body, "question": "Who pays shipping costs for returns?"}).json()
+
+    assert [r["session"]["retrieval"] for r in (first, follow_up, drifted)] == ["first turn", "reused", "drift"]
+    assert retrievals == ["What is the warranty period?", "Who pays shipping costs for returns?"]
+    assert calls[1][1]["history"][0]["question"] == "What is the warranty period?"
+    # The drifted question's chunk comes after the first turn, which keeps its own
+    assert calls[2][0] == texts[1:]
+    assert calls[2][1]["history"][0]["contexts"] == texts[:1]
+
+    assert client.post("/api/other/sessions").status_code == 404
+    assert client.post("/api/doc", json={**body, "session_id": "0" * 32, "question": "q?"}).status_code == 404
+    assert client.delete(f"/api/doc/sessions/{session_id}").status_code == 200
+    assert client.post("/api/doc", json={**body, "question": "q?"}).status_code == 404
@@ -0,0 +1,119 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import asyncio
+import json
+import threading
+import time
+import pytest
+from services.qa import CompletionCancel
+from utils.executors import BoundedExecutor
+from utils.sse import HEARTBEAT, chunk_event, event, stream_chunks
+
+@pytest.fixture
+def executor():
+    executor = BoundedExecutor("test", "thread", max_workers=2, max_queue=2)
+    yield executor
+    executor.shutdown(wait=False)
+
+def _contents(frames):
+    return [json.loads(frame[len(b"data: "):])["content"] for frame in frames if frame != HEARTBEAT]
+
+def _collect(executor, deltas, **kwargs):
+    async def run():
+        return [frame async for frame in stream_chunks(executor, deltas, **kwargs)]
+    return asyncio.run(run())
+
+def test_chunk_event_matches_json_framing():
+    for text in ("plain", 'quote " and \\', "naïve → ü\n", ""):
+        assert chunk_event(text) == event({"type": "chunk", "content": text})
+
+def test_deltas_are_coalesced_after_the_first(executor):
+    deltas = ["a"] + ["b"] * 10 + ["c"] * 10
+    frames = _collect(executor, iter(deltas), coalesce_seconds=60, coalesce_chars=10)
+    # The first delta goes out alone, then a frame per 10 characters
+    assert _contents(frames) == ["a", "b" * 10, "c" * 10]
+
+def test_buffer_is_flushed_after_coalesce_seconds(executor):
+    def slow():
+        yield "a"
+        yield "b"
+        time.sleep(0.3)
+        yield "c"
+    frames = _collect(executor, slow(), coalesce_seconds=0.05, coalesce_chars=1000)
+    assert _contents(frames) == ["a", "b", "c"]
+
+def test_heartbeat_on_idle_stream(executor):
+    def idle():
+        yield "a"
+        time.sleep(0.3)
+        yield "b"
+    frames = _collect(executor, idle(), coalesce_seconds=0.01, heartbeat_seconds=0.1)
+    assert HEARTBEAT in frames
+    assert _contents(frames) == ["a", "b"]
+
+def test_error_is_raised_after_buffered_deltas(executor):
+    def failing():
+        yield "a"
+        yield "b"
+        raise RuntimeError("upstream failed")
+    frames, collected = [], []
+    async def run():
+        async for frame in stream_chunks(executor, failing(), collect=collected, coalesce_seconds=60):
+            frames.append(frame)
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert _contents(frames) == ["a", "b"]
+    assert collected == ["a", "b"]
+
+def test_consumer_stopping_early_cancels_the_upstream(executor):
+    closed = threading.Event()
+
+    class Upstream:
+        """Stands in for the provider's response: blocks between deltas until closed."""
+        def __iter__(self):
+            yield "first"
+            closed.wait(5)
+
+        def close(self):
+            closed.set()
+
+    cancel = CompletionCancel()
+    assert cancel._attach(Upstream())
+
+    async def run():
+        stream = stream_chunks(executor, iter(Upstream()), cancel=cancel)
+        assert _contents([await stream.__anext__()]) == ["first"]
+        await stream.aclose()  # What the server does when the client disconnects
+
+    asyncio.run(run())
+    assert cancel.cancelled and closed.wait(1)
+
+def test_streamed_answers_use_their_own_pool_and_are_turned_away_when_it_is_full(make_store, monkeypatch):
+    from fastapi.testclient import TestClient
+    from main import app
+    from routers import ask, rate_limit
+
+    make_store("doc", n=2)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(ask, "answer_with_context_stream", lambda *args, **kwargs: iter(["Two ", "years."]))
+    pool = BoundedExecutor("stream", "thread", max_workers=1, max_queue=0)
+    monkeypatch.setattr(ask, "stream_executor", pool)
+    client = TestClient(app)
+    body = {"question": "How long is the warranty?", "stream": True, "retrieval_mode": "lexical"}
+    try:
+        response = client.post("/api/doc", json=body)
+        assert response.status_code == 200
+        assert b'"content": "Two "' in response.content and b'"type": "done"' in response.content
+        assert pool.completed == 1
+
+        # A slow client keeps the only stream thread busy
+        release = threading.Event()
+        pool.submit(release.wait, 5)
+        response = client.post("/api/doc", json=body)
+        release.set()
+        assert response.status_code == 503 and "Retry-After" in response.headers
+    finally:
+        pool.shutdown(wait=False)
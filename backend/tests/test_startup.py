@@ -0,0 +1,60 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import json
+import subprocess
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+# Generous, so only a heavy import sneaking back in (the OpenAI SDK alone is ~0.7s) trips it
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "3.0"))
+# Loaded on first use, never by importing the app
+LAZY_MODULES = ("openai", "faiss", "pdfplumber", "pdfminer", "tiktoken", "requests")
+
+def _import_main(tmp_path) -> dict:
+    """Import the app in a fresh interpreter (as a new worker would) and report what it cost."""
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        "from importlib.util import _LazyModule\n"
+        "loaded = [m for m in sys.modules if not isinstance(sys.modules[m], _LazyModule)]\n"
+        "print(json.dumps({'seconds': elapsed, 'modules': loaded}))\n"
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "test",
+        "VECTOR_DIR": str(tmp_path / "vectors"),
+    }
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def test_importing_the_app_is_fast_and_has_no_side_effects(tmp_path):
+    result = _import_main(tmp_path)
+
+    loaded_roots = {name.split(".")[0] for name in result["modules"]}
+    assert not loaded_roots.intersection(LAZY_MODULES)
+    assert not (tmp_path / "vectors").exists()
+    assert result["seconds"] < IMPORT_BUDGET_SECONDS
+
+def test_tokenizer_and_openai_client_are_shared():
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    from utils.tokenizer import get_encoding
+    from services.openai_client import get_openai_client
+
+    assert get_encoding() is get_encoding()
+    assert get_openai_client() is get_openai_client()
+
+def test_production_refuses_to_start_without_a_session_secret(tmp_path):
+    env = {**os.environ, "OPENAI_API_KEY": "test", "ENVIRONMENT": "production", "SESSION_SECRET": ""}
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", "import main"], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True
+    )
+    assert out.returncode != 0 and "SESSION_SECRET" in out.stderr
+    env["SESSION_SECRET"] = "s" * 32
+    subprocess.run([sys.executable, "-W", "ignore", "-c", "import main"], cwd=BACKEND_DIR, env=env, check=True)
@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from db import store_cache as store_cache_module, vector_store
+from db.store_cache import StoreCache, warm_up, warmup_status
+from db.vector_store import ACCESS_LOG, LocalFaissStore, delete_document_files, most_accessed, record_access
+
+@pytest.fixture(autouse=True)
+def access_recorded(monkeypatch):
+    monkeypatch.setattr(vector_store, "_access_recorded", {})
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = StoreCache(2)
+    monkeypatch.setattr(store_cache_module, "store_cache", cache)
+    monkeypatch.setitem(warmup_status, "ready", False)
+    return cache
+
+def test_cached_store_is_reused_until_the_document_changes(cache, make_store):
+    make_store("a")
+    first = cache.get("a")
+    assert cache.get("a") is first
+
+    LocalFaissStore("a").add(["more"], np.ones((1, 8), dtype=np.float32))
+    appended = cache.get("a")
+    assert appended is not first and len(appended.chunks) == 5
+
+    delete_document_files("a")
+    assert cache.get("a").chunks == []
+    assert "a" not in cache
+
+def test_least_recently_used_store_is_dropped(cache, make_store):
+    for doc_id in ("a", "b", "c"):
+        make_store(doc_id)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert len(cache) == 2
+
+def test_access_log_ranks_documents_by_reads(vector_dir):
+    lines = ["1 a", "2 b", "3 b", "4 c", "5 b", "6 c"]
+    vector_dir.mkdir()
+    (vector_dir / ACCESS_LOG).write_text("\n".join(lines) + "\n")
+    assert most_accessed(2) == ["b", "c"]
+
+    record_access("a")
+    record_access("a")  # Throttled: recorded once per interval
+    assert (vector_dir / ACCESS_LOG).read_text().count(" a\n") == 2
+
+def test_warm_up_loads_most_read_documents(vector_dir, cache, make_store):
+    for doc_id in ("a", "b", "c"):
+        make_store(doc_id)
+    (vector_dir / ACCESS_LOG).write_text("1 c\n2 c\n3 gone\n4 gone\n5 gone\n6 a\n7 b\n8 a\n9 c\n")
+
+    status = warm_up(limit=2)
+    assert status["ready"] and status["documents"] == 2
+    assert "c" in cache and "a" in cache and "b" not in cache
+
+def test_ready_reports_503_until_warm_up_finishes(cache, make_store):
+    make_store("a")
+    record_access("a")
+    from main import app
+
+    assert TestClient(app).get("/ready").status_code == 503
+    with TestClient(app) as client:  # Runs the lifespan, which starts warm-up
+        deadline = time.time() + 10
+        while (response := client.get("/ready")).status_code == 503 and time.time() < deadline:
+            time.sleep(0.05)
+        assert response.status_code == 200
+        assert response.json()["warmup"]["documents"] == 1
+        assert client.get("/health").status_code == 200
+    assert "a" in cache
@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai
+import pytest
+from services.upstream import (
+    BACKGROUND, INTERACTIVE, PrioritySemaphore, UpstreamEndpoint, UpstreamUnavailable
+)
+
+EMBEDDING_RESPONSE = {
+    "object": "list",
+    "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2]}],
+    "model": "test-model",
+    "usage": {"prompt_tokens": 1, "total_tokens": 1},
+}
+
+class _FakeOpenAIServer:
+    """Local HTTP server that plays back a script of (status, headers) responses to /v1/embeddings."""
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                fake.requests += 1
+                status, headers = fake.script.pop(0) if fake.script else (200, {})
+                body = json.dumps(EMBEDDING_RESPONSE if status == 200 else {"error": {"message": "fail"}}).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.client = openai.OpenAI(
+            api_key="test", base_url=f"http://127.0.0.1:{self.httpd.server_port}/v1", max_retries=0
+        )
+
+    def embed(self):
+        return self.client.embeddings.create(model="test-model", input=["hello"])
+
+@pytest.fixture
+def server():
+    fake = _FakeOpenAIServer()
+    yield fake
+    fake.httpd.shutdown()
+
+def test_retries_rate_limit_honouring_retry_after(server):
+    """429s are retried after the server-provided delay until the call succeeds."""
+    server.script = [(429, {"retry-after-ms": "50"}), (429, {"retry-after-ms": "50"})]
+    endpoint = UpstreamEndpoint("test", max_concurrency=2, max_retries=3)
+
+    start = time.monotonic()
+    resp = endpoint.call(server.embed)
+
+    assert resp.data[0].embedding == [0.1, 0.2]
+    assert server.requests == 3
+    assert time.monotonic() - start >= 0.1
+
+def test_client_errors_are_not_retried(server):
+    """A 400 means the request is wrong; retrying won't help and mustn't trip the breaker."""
+    server.script = [(400, {})]
+    endpoint = UpstreamEndpoint("test", max_concurrency=2, max_retries=3, failure_threshold=1)
+
+    with pytest.raises(openai.BadRequestError):
+        endpoint.call(server.embed)
+    assert server.requests == 1
+    assert endpoint.breaker.state == "closed"
+
+def test_circuit_opens_and_fails_fast(server):
+    """After repeated 5xx the breaker opens, rejects calls locally, then probes once."""
+    server.script = [(500, {})] * 3
+    endpoint = UpstreamEndpoint("test", max_concurrency=2, max_retries=0, failure_threshold=3, reset_timeout=0.2)
+
+    for _ in range(3):
+        with pytest.raises(openai.InternalServerError):
+            endpoint.call(server.embed)
+    with pytest.raises(UpstreamUnavailable):
+        endpoint.call(server.embed)
+    assert server.requests == 3  # rejected without reaching the server
+
+    time.sleep(0.25)
+    endpoint.call(server.embed)  # half-open trial succeeds and closes the circuit
+    assert endpoint.breaker.state == "closed"
+
+def test_interactive_callers_go_before_background():
+    """When a slot frees up, a waiting interactive caller wins over an earlier background one."""
+    semaphore = PrioritySemaphore(1)
+    semaphore.acquire(INTERACTIVE)
+    order = []
+
+    def waiter(priority, label):
+        semaphore.acquire(priority)
+        order.append(label)
+        semaphore.release()
+
+    background = threading.Thread(target=waiter, args=(BACKGROUND, "background"))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=waiter, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    time.sleep(0.05)
+
+    semaphore.release()
+    background.join(1)
+    interactive.join(1)
+    assert order == ["interactive", "background"]
+
+def test_saturated_endpoint_sheds_load():
+    """Callers that can't get a slot within the queue timeout fail fast instead of piling up."""
+    endpoint = UpstreamEndpoint("test", max_concurrency=1, queue_timeout=0.05)
+    endpoint.semaphore.acquire(INTERACTIVE)
+
+    with pytest.raises(UpstreamUnavailable):
+        endpoint.call(lambda: None)
@@ -0,0 +1,146 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import threading
+import numpy as np
+import pytest
+from db import vector_store
+from db.vector_store import LocalFaissStore, read_index
+
+def _vectors(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).random((n, dim), dtype=np.float32)
+
+def _files(directory) -> list:
+    """The document files in a directory, without the writers' lock directory."""
+    return sorted(name for name in os.listdir(directory) if name != vector_store.LOCK_DIR)
+
+def test_mapped_index_matches_copied_index(vector_dir, make_store):
+    make_store(n=20)
+    mapped, is_mapped = read_index(str(vector_dir / "doc.faiss"), mmap=True)
+    copied, _ = read_index(str(vector_dir / "doc.faiss"), mmap=False)
+    assert is_mapped
+
+    q = _vectors(3, seed=1)
+    assert np.array_equal(mapped.search(q, 5)[1], copied.search(q, 5)[1])
+
+def test_append_leaves_mapped_base_untouched(vector_dir, make_store):
+    """Appending to a mapped document writes a log segment instead of modifying the mapping."""
+    make_store(n=20)
+    store = LocalFaissStore("doc")
+    assert store.index_mapped
+
+    store.add(["extra"], _vectors(1, seed=2), embedding_provider="hashing", embedding_model="m")
+    assert store.index_mapped
+    assert os.listdir(vector_dir / "doc.log") == ["00000001.npz"]
+
+    reloaded = LocalFaissStore("doc")
+    assert reloaded.ntotal == 21
+    assert reloaded.chunks[-1] == "extra"
+    idx, _, text, _ = reloaded.search(_vectors(1, seed=2)[0], 1)[0]
+    assert (idx, text) == (20, "extra")
+    assert reloaded.lexical_search("extra", 1)[0][0] == 20
+
+def test_append_keeps_document_metadata():
+    store = LocalFaissStore("doc")
+    store.add(["a"], _vectors(1), metadata={"filename": "a.pdf", "pages": 1})
+    LocalFaissStore("doc").add(["b"], _vectors(1, seed=1), metadata={"pages": 2})
+
+    assert LocalFaissStore("doc").metadata == {"filename": "a.pdf", "pages": 2}
+
+def test_compaction_folds_segments_into_new_generation(vector_dir, monkeypatch, make_store):
+    monkeypatch.setattr(vector_store, "STORE_MAX_SEGMENTS", 3)
+    make_store(n=5)
+    for i in range(3):
+        LocalFaissStore("doc").add([f"extra {i}"], _vectors(1, seed=10 + i))
+
+    store = LocalFaissStore("doc")
+    assert store.generation == 1
+    assert store.segments == []
+    assert store.delta_index is None
+    assert store.chunks[-3:] == ["extra 0", "extra 1", "extra 2"]
+    assert _files(vector_dir) == ["doc.g1.bm25.json", "doc.g1.faiss", "doc.log", "doc.meta.json"]
+
+    # New appends are numbered after the folded segments, even though those are gone
+    store.add(["later"], _vectors(1, seed=20))
+    assert sorted(os.listdir(vector_dir / "doc.log")) == ["00000004.npz", "compacted"]
+    assert LocalFaissStore("doc").ntotal == 9
+
+def test_interrupted_append_is_invisible(vector_dir, make_store):
+    """A segment that never got published (crash before the link) is ignored."""
+    make_store(n=20)
+    os.makedirs(vector_dir / "doc.log")
+    (vector_dir / "doc.log" / "1234.5678.tmp").write_bytes(b"partial")
+
+    assert LocalFaissStore("doc").ntotal == 20
+
+def test_saves_replace_files_atomically(vector_dir, make_store):
+    """Writes go through a temp file and rename, so no temp files are left behind."""
+    make_store(n=20)
+    assert _files(vector_dir) == ["doc.bm25.json", "doc.faiss", "doc.meta.json"]
+
+def test_replace_writes_new_generation_and_folds_segments(vector_dir, make_store):
+    make_store(n=5)
+    LocalFaissStore("doc").add(["appended"], _vectors(1, seed=3), metadata={"filename": "a.pdf"})
+
+    LocalFaissStore("doc").replace(["new 0", "new 1"], _vectors(2, seed=4), metadata={"version": 2})
+    store = LocalFaissStore("doc")
+    assert (store.generation, store.segments, store.chunks) == (1, [], ["new 0", "new 1"])
+    assert store.metadata == {"filename": "a.pdf", "version": 2}
+    assert store.lexical_search("new", 1)[0][2].startswith("new")
+    assert _files(vector_dir) == ["doc.g1.bm25.json", "doc.g1.faiss", "doc.log", "doc.meta.json"]
+    assert os.listdir(vector_dir / "doc.log") == ["compacted"]
+
+def test_compaction_does_not_lose_a_concurrent_append(monkeypatch, make_store):
+    """
+    A compacts while B appends (and compacts) through another instance: without the document
+    lock, A committed a generation built from its stale read and B's append was lost.
+    """
+    make_store(n=5)
+    LocalFaissStore("doc").add(["a1"], _vectors(1, seed=1))
+    monkeypatch.setattr(vector_store, "STORE_MAX_SEGMENTS", 1)
+    compactor = LocalFaissStore("doc")
+    reconstructing, release = threading.Event(), threading.Event()
+    real_reconstruct = compactor.reconstruct
+    def slow_reconstruct(ids):
+        reconstructing.set()
+        release.wait(5)
+        return real_reconstruct(ids)
+    compactor.reconstruct = slow_reconstruct
+
+    a = threading.Thread(target=compactor.compact)
+    a.start()
+    assert reconstructing.wait(5)
+    b = threading.Thread(target=LocalFaissStore("doc").add, args=(["b1"], _vectors(1, seed=2)))
+    b.start()
+    b.join(0.3)
+    assert b.is_alive()  # Waits for A's compaction to commit
+    release.set()
+    a.join(5)
+    b.join(5)
+
+    store = LocalFaissStore("doc")
+    assert store.chunks == [f"chunk {i}" for i in range(5)] + ["a1", "b1"]
+    assert store.ntotal == 7 and not store.segments
+
+def test_non_blocking_compaction_skips_a_locked_document(make_store):
+    make_store(n=5)
+    LocalFaissStore("doc").add(["a1"], _vectors(1, seed=1))
+    with vector_store.document_lock("doc"):
+        assert LocalFaissStore("doc").compact(wait=False) is False
+    assert LocalFaissStore("doc").compact(wait=False) is True
+    assert not LocalFaissStore("doc").segments
+
+def test_replace_rejects_a_stale_read(make_store):
+    make_store(n=5)
+    signature = vector_store.document_signature("doc")
+    LocalFaissStore("doc").add(["appended"], _vectors(1, seed=3))
+
+    with pytest.raises(vector_store.StoreConflict):
+        LocalFaissStore("doc").replace(["new"], _vectors(1, seed=4), expected_signature=signature)
+    assert LocalFaissStore("doc").chunks[-1] == "appended"
+
+    current = vector_store.document_signature("doc")
+    LocalFaissStore("doc").replace(["new"], _vectors(1, seed=4), expected_signature=current)
+    assert LocalFaissStore("doc").chunks == ["new"]
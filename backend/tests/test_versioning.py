@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np
+from db.vector_store import LocalFaissStore
+from services.versioning import assemble_version, page_hashes, plan_version, text_hash
+from utils.chunker import chunk_pages
+
+def _embed(chunks):
+    """Deterministic stand-in for an embedding model: one vector per distinct text."""
+    return np.stack([np.random.default_rng(int(text_hash(chunk)[:8], 16)).random(8, dtype=np.float32) for chunk in chunks])
+
+def _upload(pages):
+    texts = {page_num: text for page_num, text in enumerate(pages, start=1)}
+    chunks, chunk_metadata = chunk_pages(sorted(texts.items()))
+    store = LocalFaissStore("doc")
+    hashes = [f"content-{text}" for text in pages]
+    store.add(chunks, _embed(chunks), chunk_metadata, {"page_hashes": page_hashes(hashes, texts)})
+    return LocalFaissStore("doc")
+
+def test_only_changed_pages_are_embedded():
+    store = _upload(["alpha", "beta", "gamma", "delta"])
+    # beta edited, gamma removed, epsilon added; unchanged pages weren't even extracted
+    new_pages = ["alpha", "beta v2", "delta", "epsilon"]
+    content_hashes = [f"content-{text}" for text in new_pages]
+    page_texts = {2: "beta v2", 4: "epsilon"}
+
+    hashes, reused, changed = plan_version(store, content_hashes, page_texts)
+    assert reused == {1: 1, 3: 4}
+    assert changed == [(2, "beta v2"), (4, "epsilon")]
+    assert [text for _, text in hashes] == [text_hash(text) for text in new_pages]
+
+    chunks, chunk_metadata = chunk_pages(changed)
+    all_chunks, all_metadata, vectors = assemble_version(store, 4, reused, chunks, chunk_metadata, _embed(chunks))
+    assert all_chunks == new_pages
+    assert [meta["page_numbers"] for meta in all_metadata] == [[1], [2], [3], [4]]
+
+    store.replace(all_chunks, vectors, all_metadata, {"page_hashes": hashes})
+    store = LocalFaissStore("doc")
+    for page_num, text in enumerate(new_pages, start=1):
+        idx, _, hit_text, hit_pages = store.search(_embed([text])[0], 1)[0]
+        assert (hit_text, hit_pages) == (text, [page_num])
+
+def test_page_with_new_content_but_same_text_is_reused():
+    """A re-saved PDF can change a page's content stream without changing its text."""
+    store = _upload(["alpha", "beta"])
+    _, reused, changed = plan_version(store, ["content-alpha", "re-encoded"], {2: "beta"})
+    assert (reused, changed) == ({1: 1, 2: 2}, [])
+
+def test_document_without_page_hashes_is_fully_reembedded():
+    store = LocalFaissStore("doc")
+    store.add(["alpha beta"], _embed(["alpha beta"]), [{"page_numbers": [1, 2]}])
+    _, reused, changed = plan_version(LocalFaissStore("doc"), ["a", "b"], {1: "alpha", 2: "beta"})
+    assert (reused, changed) == ({}, [(1, "alpha"), (2, "beta")])
+
+def test_version_upload_conflicting_with_an_append_is_rejected(monkeypatch):
+    from fastapi.testclient import TestClient
+    from benchmarks.synthetic import make_pdf, synthetic_pages
+    from main import app
+    from routers import upload
+
+    store = LocalFaissStore("doc")
+    store.add(["old page"], np.ones((1, 256), dtype=np.float32), [{"page_numbers": [1]}], {"filename": "doc.pdf"},
+              embedding_provider="hashing", embedding_model="feature-hash-256")
+    real_assemble = upload.assemble_version
+    def assemble_during_append(store, *args):
+        # Another request appends while this version is being embedded
+        LocalFaissStore("doc").add(["amendment"], np.ones((1, 256), dtype=np.float32))
+        return real_assemble(store, *args)
+    monkeypatch.setattr(upload, "assemble_version", assemble_during_append)
+
+    pdf = make_pdf(synthetic_pages(2, words_per_page=50, seed=1))
+    response = TestClient(app).post("/api/upload/doc/version", files={"file": ("v2.pdf", pdf, "application/pdf")})
+    assert response.status_code == 409
+    assert LocalFaissStore("doc").chunks == ["old page", "amendment"]
@@ -1,5 +1,5 @@
 from typing import List, Dict, Tuple
-import tiktoken
+from utils.tokenizer import get_encoding
 
 def chunk_text(
     text: str, 
@@ -10,22 +10,23 @@ def chunk_text(
     """
     Chunk text and return chunks with page number metadata.
     Returns: (chunks, chunk_metadata)
-    chunk_metadata contains page numbers for each chunk.
+    chunk_metadata contains page numbers and the token count for each chunk.
     """
-    enc = tiktoken.get_encoding("cl100k_base")
+    enc = get_encoding()
     tokens = enc.encode(text)
     chunks = []
     chunk_metadata = []
     start = 0
+    chunk_start_char = 0
     
     while start < len(tokens):
         end = min(start + max_tokens, len(tokens))
         chunk = enc.decode(tokens[start:end])
         chunks.append(chunk)
         
-        # Determine which page this chunk belongs to
-        chunk_start_char = len(enc.decode(tokens[:start]))
-        chunk_end_char = len(enc.decode(tokens[:end]))
+        # Determine which page this chunk belongs to; offsets are accumulated
+        # rather than re-decoding the whole prefix for every chunk
+        chunk_end_char = chunk_start_char + len(chunk)
         
         page_nums = []
         if page_mapping:
@@ -37,9 +38,33 @@ def chunk_text(
         chunk_metadata.append({
             'page_numbers': sorted(set(page_nums)) if page_nums else [],
             'start_char': chunk_start_char,
-            'end_char': chunk_end_char
+            'end_char': chunk_end_char,
+            'token_count': end - start
         })
         
         start = end
+        chunk_start_char = chunk_end_char
     
     return chunks, chunk_metadata
+
+def chunk_pages(
+    pages: List[Tuple[int, str]],
+    max_tokens: int = 500,
+    model: str = "gpt-4o-mini"
+) -> Tuple[List[str], List[Dict[str, any]]]:
+    """
+    Chunk each page on its own, so every chunk belongs to exactly one page and a
+    changed page can be re-chunked without touching its neighbours.
+    pages is a list of (page_num, text); char offsets in the metadata are within the page.
+    """
+    chunks = []
+    chunk_metadata = []
+    for page_num, text in pages:
+        if not text.strip():
+            continue
+        page_chunks, page_metadata = chunk_text(
+            text, max_tokens, model, [{'start_char': 0, 'end_char': len(text), 'page_num': page_num}]
+        )
+        chunks.extend(page_chunks)
+        chunk_metadata.extend(page_metadata)
+    return chunks, chunk_metadata
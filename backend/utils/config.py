@@ -6,12 +6,108 @@ load_dotenv(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+# Embedding backend for new documents: "openai" or "hashing" (local CPU, no network)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+# Embedding batches sent to the API at the same time while ingesting a document
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
 VECTOR_DIR = os.getenv("VECTOR_DIR", "./data/vector_store")
+# Memory-map FAISS indexes read-only, so workers share hot indexes through the page cache
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"
+# Appends to an existing document go to log segments; fold them into the base after this many
+STORE_MAX_SEGMENTS = int(os.getenv("STORE_MAX_SEGMENTS", "8"))
+# Loaded stores kept in memory per worker (0 = load from disk on every request)
+STORE_CACHE_SIZE = int(os.getenv("STORE_CACHE_SIZE", "32"))
+# Most read documents loaded at startup, before the worker reports ready
+WARMUP_DOCUMENTS = int(os.getenv("WARMUP_DOCUMENTS", "8"))
+# Storage maintenance: byte quota for VECTOR_DIR (0 = none), evicting least recently accessed documents
+STORE_QUOTA_BYTES = int(os.getenv("STORE_QUOTA_BYTES", "0"))
+# Default lifetime of new documents (0 = never expire); uploads can set their own
+DOCUMENT_TTL_SECONDS = int(os.getenv("DOCUMENT_TTL_SECONDS", "0"))
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))  # 0 = no background runs
+# Leftover files younger than this may belong to a write in progress and are kept
+MAINTENANCE_GRACE_SECONDS = int(os.getenv("MAINTENANCE_GRACE_SECONDS", "3600"))
+# Compact documents with at least this many log segments
+MAINTENANCE_COMPACT_SEGMENTS = int(os.getenv("MAINTENANCE_COMPACT_SEGMENTS", "2"))
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
+# Upstream API locations; point them at benchmarks/fake_upstream.py for offline load tests
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # None: the OpenAI SDK default
+TAVILY_BASE_URL = os.getenv("TAVILY_BASE_URL", "https://api.tavily.com").rstrip("/")
+
+# Upstream API calls (OpenAI, Tavily): per-endpoint concurrency per worker, retries, circuit breaker
+UPSTREAM_MAX_CONCURRENCY = {
+    "chat": int(os.getenv("UPSTREAM_MAX_CONCURRENCY_CHAT", "16")),
+    "embeddings": int(os.getenv("UPSTREAM_MAX_CONCURRENCY_EMBEDDINGS", "8")),
+    "web_search": int(os.getenv("UPSTREAM_MAX_CONCURRENCY_WEB_SEARCH", "8")),
+}
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))  # Seconds
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))  # Seconds; longer Retry-After fails fast
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "30"))  # Max wait for a concurrency slot
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))  # Consecutive failures to open
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+
+# Tokens per chunk when documents are chunked; existing documents keep theirs until reindexed
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "500"))
+# Token budget for document context sent to the LLM per question
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Streamed answers: deltas are coalesced into one SSE frame per this many seconds or characters
+STREAM_COALESCE_SECONDS = float(os.getenv("STREAM_COALESCE_SECONDS", "0.05"))
+STREAM_COALESCE_CHARS = int(os.getenv("STREAM_COALESCE_CHARS", "200"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))  # Comment frame on idle streams
+# Conversation sessions (follow-up asks): stored as files shared by all workers
+SESSION_DIR = os.getenv("SESSION_DIR", "./data/sessions")
+CONVERSATION_TTL_SECONDS = int(os.getenv("CONVERSATION_TTL_SECONDS", "1800"))  # since the last turn
+# Token budgets for the chunks a session keeps between turns and for its earlier turns
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "3000"))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "1000"))
+# Re-run retrieval when more than this fraction of a follow-up's terms is new to the session
+SESSION_DRIFT_THRESHOLD = float(os.getenv("SESSION_DRIFT_THRESHOLD", "0.5"))
+
+# Default retrieval mode for asks: "vector", "hybrid" (vector + BM25) or "lexical" (BM25 only, no embeddings call)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # Hits taken from each retriever before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))  # Reciprocal rank fusion damping constant
+
+# Maximal marginal relevance re-ranking of search hits
+MMR_ENABLED = os.getenv("MMR_ENABLED", "false").lower() == "true"
+MMR_FETCH_MULTIPLIER = int(os.getenv("MMR_FETCH_MULTIPLIER", "4"))  # Candidates fetched per requested hit
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))  # 1.0 = pure relevance, 0.0 = pure diversity
+
+# Batch ask: maximum LLM answers generated concurrently per batch request
+BATCH_ASK_CONCURRENCY = int(os.getenv("BATCH_ASK_CONCURRENCY", "4"))
+
+# Dedicated executors per workload class: worker count, and how many tasks may wait
+# before requests are turned away with 503
+#   parse  - process pool for PDF parsing and chunking (CPU-bound)
+#   search - thread pool for FAISS and BM25 search
+#   io     - thread pool for blocking upstream calls and disk reads
+#   stream - thread pool reading streamed answers; each open stream holds a thread until it
+#            ends, so streams don't queue: beyond STREAM_WORKERS they are turned away at once
+EXECUTOR_WORKERS = {
+    "parse": int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    "search": int(os.getenv("SEARCH_WORKERS", "2")),
+    "io": int(os.getenv("IO_WORKERS", "32")),
+    "stream": int(os.getenv("STREAM_WORKERS", "64")),
+}
+EXECUTOR_QUEUE_LIMITS = {
+    "parse": int(os.getenv("PARSE_QUEUE_LIMIT", "16")),
+    "search": int(os.getenv("SEARCH_QUEUE_LIMIT", "64")),
+    "io": int(os.getenv("IO_QUEUE_LIMIT", "256")),
+    "stream": int(os.getenv("STREAM_QUEUE_LIMIT", "0")),
+}
+
+# Rate limiting backend: "memory" (per worker) or "sqlite" (shared by all workers on the host)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "./data/rate_limits.db")
+# Only for load tests against a private deployment: turns off per-client request limits
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
 
 # Authentication configuration
 AUTH_PASSWORD = os.getenv("AUTH_PASSWORD", "")
 AUTH_PASSWORD_HASH = os.getenv("AUTH_PASSWORD_HASH", "")
+# Key signing login session tokens (read by utils/security.py); must be the same for every worker
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
 
 # Environment configuration
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
@@ -20,6 +116,10 @@ ALLOWED_ORIGINS = os.getenv(
     "http://localhost:3000,http://localhost:3001"
 ).split(",")
 
+# On-demand request profiling (/api/admin/profile); off in production unless enabled explicitly
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false" if ENVIRONMENT == "production" else "true").lower() == "true"
+PROFILING_MAX_REQUESTS = int(os.getenv("PROFILING_MAX_REQUESTS", "100"))
+
 if not OPENAI_API_KEY:
     raise RuntimeError("Missing OPENAI_API_KEY in .env")
 
@@ -27,3 +127,11 @@ if not OPENAI_API_KEY:
 if not AUTH_PASSWORD and not AUTH_PASSWORD_HASH:
     import warnings
     warnings.warn("AUTH_PASSWORD or AUTH_PASSWORD_HASH not set. Authentication may not work.")
+
+# A per-process random key would log users out on every restart and reject tokens from other workers
+if not SESSION_SECRET and ENVIRONMENT == "production":
+    raise RuntimeError("Missing SESSION_SECRET in .env (required in production)")
+
+if not RATE_LIMIT_ENABLED:
+    import warnings
+    warnings.warn("RATE_LIMIT_ENABLED is false: request rate limits are off. Use this for load tests only.")
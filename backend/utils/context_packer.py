@@ -0,0 +1,124 @@
+import re
+from typing import List, Tuple, Set
+from utils.tokenizer import get_encoding
+
+# Sentence boundaries: end punctuation followed by whitespace, or a blank line
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+_WORD = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "of", "on", "or", "that", "the", "this",
+    "to", "was", "what", "when", "where", "which", "who", "why", "with", "you",
+})
+
+MIN_CONTEXT_TOKENS = 40  # Fragments smaller than this aren't worth sending
+DUPLICATE_THRESHOLD = 0.8  # Shingle containment above which a chunk counts as a duplicate
+
+def content_terms(text: str) -> Set[str]:
+    """Lowercased words of a text, without stopwords."""
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _is_duplicate(shingles: Set, kept: List[Set], threshold: float) -> bool:
+    """A chunk is redundant if most of it (or most of a kept chunk) is shared with a kept chunk."""
+    if not shingles:
+        return True
+    for other in kept:
+        smaller = min(len(shingles), len(other))
+        if smaller and len(shingles & other) / smaller >= threshold:
+            return True
+    return False
+
+def _trim_to_relevant(text: str, question_terms: Set[str], max_tokens: int, enc) -> str:
+    """
+    Keep the sentences of `text` that best match the question, in their original order,
+    without exceeding max_tokens.
+    """
+    sentences = [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+    scored = []
+    for position, sentence in enumerate(sentences):
+        overlap = len(content_terms(sentence) & question_terms)
+        scored.append((overlap, position, sentence, len(enc.encode(sentence))))
+
+    # Highest overlap first; earlier sentences win ties
+    ranked = sorted(scored, key=lambda s: (-s[0], s[1]))
+    if ranked and ranked[0][0] == 0:
+        # Nothing matches the question directly: fall back to the leading sentences
+        ranked = scored
+
+    chosen = []
+    used = 0
+    for overlap, position, sentence, tokens in ranked:
+        if used + tokens > max_tokens:
+            continue
+        chosen.append((position, sentence))
+        used += tokens
+
+    if not chosen:
+        # A single sentence is larger than the allowance: hard-truncate instead
+        return enc.decode(enc.encode(text)[:max_tokens]).strip()
+
+    chosen.sort()
+    return " ".join(sentence for _, sentence in chosen)
+
+def pack_context_items(
+    question: str,
+    contexts: List[str],
+    max_tokens: int,
+    duplicate_threshold: float = DUPLICATE_THRESHOLD
+) -> List[Tuple[int, str, int]]:
+    """
+    pack_contexts(), keeping track of where each packed text came from.
+    Returns: (index in contexts, packed text, tokens) for each chunk kept, in order
+    """
+    enc = get_encoding()
+
+    # Drop overlapping/near-duplicate chunks, keeping the higher-ranked copy
+    unique = []
+    kept_shingles = []
+    for position, text in enumerate(contexts):
+        shingles = _shingles(text)
+        if _is_duplicate(shingles, kept_shingles, duplicate_threshold):
+            continue
+        kept_shingles.append(shingles)
+        unique.append((position, text))
+
+    question_terms = content_terms(question)
+    packed = []
+    used = 0
+    for i, (position, text) in enumerate(unique):
+        remaining = max_tokens - used
+        if remaining < MIN_CONTEXT_TOKENS:
+            break
+        # Split what's left evenly across the remaining chunks; unused share rolls forward
+        allowance = max(remaining // (len(unique) - i), MIN_CONTEXT_TOKENS)
+        tokens = len(enc.encode(text))
+        if tokens > allowance:
+            text = _trim_to_relevant(text, question_terms, allowance, enc)
+            tokens = len(enc.encode(text))
+        if text:
+            packed.append((position, text, tokens))
+            used += tokens
+
+    return packed
+
+def pack_contexts(
+    question: str,
+    contexts: List[str],
+    max_tokens: int,
+    duplicate_threshold: float = DUPLICATE_THRESHOLD
+) -> Tuple[List[str], int]:
+    """
+    Fit ranked context chunks into a token budget.
+    Near-duplicate chunks are dropped, and chunks that don't fit their share of the
+    remaining budget are trimmed to the sentences most relevant to the question.
+    Returns: (packed_contexts, context_tokens)
+    """
+    packed = pack_context_items(question, contexts, max_tokens, duplicate_threshold)
+    return [text for _, text, _ in packed], sum(tokens for _, _, tokens in packed)
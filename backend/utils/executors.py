@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from utils.config import EXECUTOR_WORKERS, EXECUTOR_QUEUE_LIMITS
+from utils.metrics import Counter, Gauge
+
+class ExecutorSaturated(Exception):
+    """Too many tasks are already running or queued on an executor; callers should fail fast."""
+
+    def __init__(self, name: str, retry_after: float = 1.0):
+        super().__init__(f"Executor '{name}' is saturated. Retry after {retry_after:.0f}s.")
+        self.name = name
+        self.retry_after = retry_after
+
+class BoundedExecutor:
+    """
+    A named thread or process pool with a limit on queued tasks, so one workload
+    class can't starve the others or build an unbounded backlog. The pool itself
+    is created on first use.
+    """
+
+    def __init__(self, name: str, kind: str, max_workers: int, max_queue: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0  # running + queued
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    @property
+    def full(self) -> bool:
+        """Whether a task submitted now would be rejected."""
+        return self.in_flight >= self.max_workers + self.max_queue
+
+    def _pool(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    # Forking a process that already runs FAISS/OpenMP and HTTP client threads can deadlock
+                    self._executor = ProcessPoolExecutor(
+                        self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Submit a task; raises ExecutorSaturated when the queue is full."""
+        with self._lock:
+            if self.full:
+                self.rejected += 1
+                raise ExecutorSaturated(self.name)
+            self.in_flight += 1
+
+        if self.kind == "thread":
+            # Same as asyncio.to_thread: the task sees the caller's context variables
+            fn = functools.partial(contextvars.copy_context().run, fn)
+        try:
+            try:
+                future = self._pool().submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                # A worker died (e.g. a PDF that crashed the parser); start a fresh pool
+                with self._lock:
+                    self._executor = None
+                future = self._pool().submit(fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future: Future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on this executor and await its result."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "queue_limit": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+executors: Dict[str, BoundedExecutor] = {
+    name: BoundedExecutor(name, kind, EXECUTOR_WORKERS[name], EXECUTOR_QUEUE_LIMITS[name])
+    for name, kind in (("parse", "process"), ("search", "thread"), ("io", "thread"), ("stream", "thread"))
+}
+parse_executor = executors["parse"]
+search_executor = executors["search"]
+io_executor = executors["io"]
+stream_executor = executors["stream"]
+
+Gauge(
+    "docassist_executor_in_flight", "Tasks running or queued on each executor.", ("executor",),
+    collect=lambda: {(name,): executor.in_flight for name, executor in executors.items()}
+)
+Gauge(
+    "docassist_executor_queued", "Tasks waiting for a free worker on each executor.", ("executor",),
+    collect=lambda: {(name,): executor.queued for name, executor in executors.items()}
+)
+Counter(
+    "docassist_executor_rejected_total", "Tasks rejected because the executor's queue was full.", ("executor",),
+    collect=lambda: {(name,): executor.rejected for name, executor in executors.items()}
+)
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: executor.stats() for name, executor in executors.items()}
+
+def shutdown_executors(wait: bool = True):
+    for executor in executors.values():
+        executor.shutdown(wait=wait)
@@ -0,0 +1,19 @@
+import importlib.util
+import sys
+
+def lazy_import(name: str):
+    """
+    Return module `name`, executed on first attribute access rather than now
+    (the importlib LazyLoader recipe). For heavy dependencies that only some requests use.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
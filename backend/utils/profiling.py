@@ -0,0 +1,153 @@
+"""
+On-demand profiling of live requests. An admin arms the profiler for the next N API
+requests; while any of them is in flight, one process-wide cProfile (which, since Python
+3.12, also sees executor threads) or tracemalloc capture runs, and the results of all N
+are aggregated into one report. While disarmed, the middleware only checks `armed`.
+Each session is numbered, so requests still in flight when a session is stopped don't
+count towards the next one.
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+MODES = ("cpu", "memory")
+REPORT_LINES = 40
+TRACEMALLOC_FRAMES = 10
+
+class RequestProfiler:
+    def __init__(self):
+        self.armed = False
+        self.mode: Optional[str] = None
+        self.sample_rate = 1.0
+        self.remaining = 0  # requests still to be profiled
+        self.profiled = 0
+        self.active = 0  # profiled requests in flight
+        self.session = 0  # number of the current (or last) session
+        self.started_at: Optional[str] = None
+        self.report: Optional[str] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    def start(self, mode: str, requests: int, sample_rate: float = 1.0):
+        """Profile the next `requests` requests, each picked with probability sample_rate."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        with self._lock:
+            if self.armed:
+                raise RuntimeError("A profiling session is already running.")
+            if mode == "memory" and tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is already tracing.")
+            self.mode = mode
+            self.sample_rate = sample_rate
+            self.remaining = requests
+            self.profiled = 0
+            self.active = 0
+            self.started_at = datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+            self.report = None
+            self._profile = cProfile.Profile() if mode == "cpu" else None
+            self._snapshot = None
+            self.session += 1
+            self.armed = True
+
+    def begin(self) -> Optional[int]:
+        """
+        Called as a request starts while armed. Returns the session number to pass to end()
+        if this request is profiled, else None.
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        with self._lock:
+            if not self.armed or self.remaining <= 0:
+                return None
+            if self.active == 0:
+                try:
+                    self._capture_on()
+                except ValueError:
+                    # Another profiler (e.g. a debugger) is active; skip this request
+                    return None
+            self.remaining -= 1
+            self.active += 1
+            return self.session
+
+    def end(self, session: int):
+        """Called as a profiled request finishes, with the number begin() returned."""
+        with self._lock:
+            if session != self.session or not self.armed:
+                return  # Started in a session that was stopped since
+            self.active -= 1
+            self.profiled += 1
+            if self.active == 0:
+                self._capture_off()
+                if self.remaining <= 0:
+                    self._finish()
+
+    def stop(self):
+        """End the session early with whatever was captured so far."""
+        with self._lock:
+            if not self.armed:
+                return
+            if self.active:
+                self._capture_off()
+                self.active = 0
+            self._finish()
+
+    def status(self) -> Dict:
+        return {
+            "armed": self.armed,
+            "mode": self.mode,
+            "sample_rate": self.sample_rate,
+            "remaining": self.remaining,
+            "profiled": self.profiled,
+            "started_at": self.started_at,
+            "report": self.report,
+        }
+
+    def _capture_on(self):
+        if self.mode == "cpu":
+            self._profile.enable()
+        elif not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def _capture_off(self):
+        if self.mode == "cpu":
+            self._profile.disable()
+        # tracemalloc keeps tracing between requests so their allocations can be compared at the end
+
+    def _finish(self):
+        self.armed = False
+        self.remaining = 0
+        if self.mode == "cpu":
+            self.report = self._cpu_report()
+        else:
+            self.report = self._memory_report()
+        self._profile = None
+        self._snapshot = None
+
+    def _cpu_report(self) -> str:
+        out = io.StringIO()
+        if not self.profiled:
+            return "No requests were profiled."
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+        return out.getvalue()
+
+    def _memory_report(self) -> str:
+        if not tracemalloc.is_tracing():
+            return "No requests were profiled."
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        lines = [f"Peak traced memory: {peak / 1024:.1f} KiB over {self.profiled} request(s)",
+                 "Top allocations still held, by line:"]
+        for stat in after.compare_to(self._snapshot, "lineno")[:REPORT_LINES]:
+            lines.append(str(stat))
+        return "\n".join(lines)
+
+profiler = RequestProfiler()
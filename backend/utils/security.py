@@ -1,9 +1,16 @@
+import asyncio
 import bcrypt
 import hashlib
+import hmac
+import math
 import os
-from typing import Optional
-from datetime import datetime, timedelta
-from collections import defaultdict
+import secrets
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+from collections import OrderedDict
 
 # Password hashing utilities
 def hash_password(password: str) -> str:
@@ -31,68 +38,282 @@ def verify_auth_password(password: str) -> bool:
         return password == expected
     return verify_password(password, stored_hash)
 
+# Password verification off the event loop
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "16"))
+
+class VerifierBusy(Exception):
+    """Too many password checks are queued; the caller should retry later."""
+
+class PasswordVerifier:
+    """
+    Runs bcrypt checks (deliberately ~250ms of CPU each) on a small dedicated thread
+    pool, so they never block the event loop and a login flood can use at most
+    `workers` cores. At most `max_pending` checks may be running or queued.
+    """
+
+    def __init__(self, workers: int = BCRYPT_WORKERS, max_pending: int = BCRYPT_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    async def verify(self, password: str) -> bool:
+        """Verify against the configured password. Raises VerifierBusy when the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            raise VerifierBusy()
+        future = self._executor.submit(verify_auth_password, password)
+        # Free the slot when the check finishes, even if the caller has gone away
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+password_verifier = PasswordVerifier()
+
+# Signed session tokens: checking one is an HMAC, so bcrypt runs once per login
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))  # 7 days
+
+# Without a configured secret (development only, see utils/config.py), tokens are only valid
+# in this process until it restarts
+_session_key = SESSION_SECRET.encode() if SESSION_SECRET else secrets.token_bytes(32)
+
+def _sign(payload: str) -> str:
+    return hmac.new(_session_key, payload.encode(), hashlib.sha256).hexdigest()
+
+def issue_session_token(ttl: int = SESSION_TTL_SECONDS, now: Optional[float] = None) -> str:
+    """Return a token of the form '<expires>.<nonce>.<signature>'."""
+    expires = int((time.time() if now is None else now) + ttl)
+    payload = f"{expires}.{secrets.token_urlsafe(12)}"
+    return f"{payload}.{_sign(payload)}"
+
+def verify_session_token(token: Optional[str], now: Optional[float] = None) -> bool:
+    """Check a session token's signature and expiry."""
+    if not token:
+        return False
+    parts = token.split(".")
+    if len(parts) != 3 or not parts[0].isdigit():
+        return False
+    expires, nonce, signature = parts
+    if not hmac.compare_digest(signature, _sign(f"{expires}.{nonce}")):
+        return False
+    return int(expires) > (time.time() if now is None else now)
+
 # Brute force protection
+BRUTE_FORCE_BACKEND = os.getenv("BRUTE_FORCE_BACKEND", "memory")  # "memory" or "sqlite"
+BRUTE_FORCE_DB_PATH = os.getenv("BRUTE_FORCE_DB_PATH", "./data/brute_force.db")
+BRUTE_FORCE_MAX_TRACKED_IPS = int(os.getenv("BRUTE_FORCE_MAX_TRACKED_IPS", "100000"))
+
+# Per-IP state is a fixed-size record: (window_start, failures, previous_failures, locked_until).
+# Failures are counted in windows of `lockout_duration`; the previous window is weighted by
+# how much of it still overlaps, which approximates a sliding list of attempt timestamps.
+# Times come from time.monotonic(), which is shared by every process on a host.
+AttemptRecord = Tuple[float, int, int, float]
+
+class MemoryAttemptStore:
+    """Per-process records, kept in last-used order so expired ones are swept from the front."""
+
+    def __init__(self, max_keys: int = BRUTE_FORCE_MAX_TRACKED_IPS):
+        self.max_keys = max_keys
+        self.entries: "OrderedDict[str, Tuple[AttemptRecord, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[AttemptRecord]:
+        with self._lock:
+            entry = self.entries.get(key)
+            return entry[0] if entry else None
+
+    def update(
+        self,
+        key: str,
+        fn: Callable[[Optional[AttemptRecord]], Tuple[AttemptRecord, float]],
+        now: float
+    ) -> AttemptRecord:
+        """Atomically replace a key's record with fn(record) -> (new_record, expires_at)."""
+        with self._lock:
+            entry = self.entries.get(key)
+            record, expires_at = fn(entry[0] if entry else None)
+            self.entries[key] = (record, expires_at)
+            self.entries.move_to_end(key)
+            self._sweep(now)
+            return record
+
+    def delete(self, key: str):
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def _sweep(self, now: float):
+        # Least recently used keys are at the front; stop at the first live one
+        while self.entries:
+            _, (_, expires_at) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.max_keys:
+                break
+            self.entries.popitem(last=False)
+
+class SQLiteAttemptStore:
+    """
+    Records in a SQLite file shared by every worker on the host, so a lockout
+    applies to all of them. Each update is one short write transaction.
+    """
+
+    SWEEP_EVERY = 1000  # Delete expired (and excess) rows every N updates
+
+    def __init__(self, path: str, max_keys: int = BRUTE_FORCE_MAX_TRACKED_IPS):
+        self.path = path
+        self.max_keys = max_keys
+        self._local = threading.local()
+        self._updates = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS login_attempts ("
+            "key TEXT PRIMARY KEY, window_start REAL, failures INTEGER, previous INTEGER, "
+            "locked_until REAL, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS login_attempts_expires ON login_attempts (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _select(self, conn: sqlite3.Connection, key: str) -> Optional[AttemptRecord]:
+        row = conn.execute(
+            "SELECT window_start, failures, previous, locked_until FROM login_attempts WHERE key = ?", (key,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def get(self, key: str) -> Optional[AttemptRecord]:
+        return self._select(self._connection(), key)
+
+    def update(
+        self,
+        key: str,
+        fn: Callable[[Optional[AttemptRecord]], Tuple[AttemptRecord, float]],
+        now: float
+    ) -> AttemptRecord:
+        """Atomically replace a key's record with fn(record) -> (new_record, expires_at)."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            record, expires_at = fn(self._select(conn, key))
+            conn.execute(
+                "INSERT INTO login_attempts (key, window_start, failures, previous, locked_until, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "window_start = excluded.window_start, failures = excluded.failures, "
+                "previous = excluded.previous, locked_until = excluded.locked_until, "
+                "expires_at = excluded.expires_at",
+                (key, *record, expires_at)
+            )
+            self._updates += 1
+            if self._updates % self.SWEEP_EVERY == 0:
+                self._sweep(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return record
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM login_attempts WHERE key = ?", (key,))
+
+    def _sweep(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM login_attempts WHERE expires_at < ?", (now,))
+        # Under a spray from more live IPs than the cap, drop the ones closest to expiry
+        excess = conn.execute("SELECT COUNT(*) FROM login_attempts").fetchone()[0] - self.max_keys
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM login_attempts WHERE key IN "
+                "(SELECT key FROM login_attempts ORDER BY expires_at LIMIT ?)",
+                (excess,)
+            )
+
+def create_attempt_store(kind: str = BRUTE_FORCE_BACKEND):
+    if kind == "sqlite":
+        return SQLiteAttemptStore(BRUTE_FORCE_DB_PATH)
+    if kind == "memory":
+        return MemoryAttemptStore()
+    raise ValueError(f"Unknown brute force backend: {kind}")
+
 class BruteForceProtection:
-    def __init__(self):
-        self.failed_attempts = defaultdict(list)
-        self.locked_ips = {}
+    def __init__(self, store=None, clock: Callable[[], float] = time.monotonic):
+        self.store = store if store is not None else MemoryAttemptStore()
+        self.clock = clock
         self.max_attempts = 5
         self.lockout_duration = 900  # 15 minutes in seconds
         self.base_delay = 1  # Base delay in seconds
-    
+
+    def _current(self, record: Optional[AttemptRecord], now: float) -> Optional[AttemptRecord]:
+        """Roll a record forward to the window containing `now`; None if nothing is left of it."""
+        if record is None:
+            return None
+        window_start, failures, previous, locked_until = record
+        window = self.lockout_duration
+        # A record from the future means the clock restarted (host reboot); it can't be trusted
+        if window_start > now or locked_until > now + window:
+            return None
+        if locked_until <= now:
+            locked_until = 0.0
+        elapsed = now - window_start
+        if elapsed >= 2 * window:
+            return (now, 0, 0, 0.0) if locked_until else None
+        if elapsed >= window:
+            return window_start + window, 0, failures, locked_until
+        return window_start, failures, previous, locked_until
+
+    def _failure_count(self, record: Optional[AttemptRecord], now: float) -> float:
+        if record is None:
+            return 0
+        window_start, failures, previous, _ = record
+        overlap = (self.lockout_duration - (now - window_start)) / self.lockout_duration
+        return previous * overlap + failures
+
+    def _expires_at(self, record: AttemptRecord) -> float:
+        return max(record[0] + 2 * self.lockout_duration, record[3])
+
     def record_failed_attempt(self, ip: str):
         """Record a failed login attempt."""
-        current_time = datetime.now()
-        self.failed_attempts[ip].append(current_time)
-        
-        # Clean old attempts (older than lockout duration)
-        cutoff = current_time - timedelta(seconds=self.lockout_duration)
-        self.failed_attempts[ip] = [
-            attempt for attempt in self.failed_attempts[ip]
-            if attempt > cutoff
-        ]
-        
-        # Check if IP should be locked
-        if len(self.failed_attempts[ip]) >= self.max_attempts:
-            self.locked_ips[ip] = current_time + timedelta(seconds=self.lockout_duration)
-    
+        now = self.clock()
+
+        def fail(record: Optional[AttemptRecord]) -> Tuple[AttemptRecord, float]:
+            window_start, failures, previous, locked_until = self._current(record, now) or (now, 0, 0, 0.0)
+            updated = (window_start, failures + 1, previous, locked_until)
+            # Check if IP should be locked
+            if self._failure_count(updated, now) >= self.max_attempts:
+                updated = updated[:3] + (now + self.lockout_duration,)
+            return updated, self._expires_at(updated)
+
+        self.store.update(ip, fail, now)
+
     def record_success(self, ip: str):
         """Record successful login and clear attempts."""
-        if ip in self.failed_attempts:
-            del self.failed_attempts[ip]
-        if ip in self.locked_ips:
-            del self.locked_ips[ip]
-    
+        self.store.delete(ip)
+
     def is_locked(self, ip: str) -> bool:
         """Check if IP is currently locked."""
-        if ip not in self.locked_ips:
-            return False
-        
-        if datetime.now() > self.locked_ips[ip]:
-            # Lockout expired
-            del self.locked_ips[ip]
-            return False
-        
-        return True
-    
+        return self.get_remaining_lockout_time(ip) > 0
+
     def get_remaining_lockout_time(self, ip: str) -> int:
         """Get remaining lockout time in seconds."""
-        if ip not in self.locked_ips:
+        now = self.clock()
+        record = self._current(self.store.get(ip), now)
+        if record is None or not record[3]:
             return 0
-        
-        remaining = (self.locked_ips[ip] - datetime.now()).total_seconds()
-        return max(0, int(remaining))
-    
+        return max(0, math.ceil(record[3] - now))
+
     def get_delay(self, ip: str) -> float:
         """Get exponential backoff delay based on failed attempts."""
-        attempt_count = len(self.failed_attempts.get(ip, []))
+        now = self.clock()
+        attempt_count = math.ceil(self._failure_count(self._current(self.store.get(ip), now), now))
         if attempt_count == 0:
             return 0
-        
+
         # Exponential backoff: 1s, 2s, 4s, 8s, 16s
         delay = min(self.base_delay * (2 ** (attempt_count - 1)), 16)
         return delay
 
 # Global brute force protection instance
-brute_force_protection = BruteForceProtection()
-
+brute_force_protection = BruteForceProtection(create_attempt_store())
@@ -0,0 +1,111 @@
+"""
+Server-sent event framing for streamed answers.
+Token deltas from a blocking upstream stream are read on an executor thread and handed to
+the event loop through a queue; they are sent coalesced into a frame per STREAM_COALESCE_SECONDS
+or STREAM_COALESCE_CHARS (the first delta goes out at once, so the time to the first token is
+unchanged), with a heartbeat comment whenever nothing was sent for STREAM_HEARTBEAT_SECONDS so
+proxies don't close an idle connection. Frames are bytes with their constant parts pre-encoded.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from utils.config import STREAM_COALESCE_CHARS, STREAM_COALESCE_SECONDS, STREAM_HEARTBEAT_SECONDS
+from utils.executors import BoundedExecutor
+
+HEARTBEAT = b": ping\n\n"
+# Same bytes as event({"type": "chunk", "content": text}), without building and encoding a dict
+_CHUNK_PREFIX = b'data: {"type": "chunk", "content": '
+_CHUNK_SUFFIX = b"}\n\n"
+
+def event(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n"
+
+def chunk_event(text: str) -> bytes:
+    # json.dumps escapes to ASCII, so encoding can't fail or need more than ASCII
+    return _CHUNK_PREFIX + json.dumps(text).encode("ascii") + _CHUNK_SUFFIX
+
+_DONE = object()
+
+async def stream_chunks(
+    executor: BoundedExecutor,
+    deltas: Iterator[str],
+    cancel=None,
+    collect: Optional[List[str]] = None,
+    coalesce_seconds: float = STREAM_COALESCE_SECONDS,
+    coalesce_chars: int = STREAM_COALESCE_CHARS,
+    heartbeat_seconds: float = STREAM_HEARTBEAT_SECONDS
+) -> AsyncIterator[bytes]:
+    """
+    Yield "chunk" events (and heartbeats) for a blocking iterator of text deltas, read on one
+    executor thread. Errors of the iterator are raised here, after what was read before them
+    has been sent. If the consumer stops early (the client disconnected), `cancel()` is called
+    so the upstream can be closed right away. Every delta is appended to `collect`, if given.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = False
+
+    def pump():
+        try:
+            for delta in deltas:
+                if stopped:
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, delta)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    def reader_done(future: asyncio.Future):
+        # The reader's own failure (e.g. the executor is saturated) ends the stream like an iterator error
+        if not future.cancelled() and future.exception() is not None:
+            queue.put_nowait(future.exception())
+
+    reader = asyncio.ensure_future(executor.run(pump))
+    reader.add_done_callback(reader_done)
+    buffer: List[str] = []
+    buffered = 0
+    sent_any = False
+    last_sent = loop.time()
+    flush_at = None
+    finished = False
+    try:
+        while True:
+            now = loop.time()
+            wait = last_sent + heartbeat_seconds - now
+            if flush_at is not None:
+                wait = min(wait, flush_at - now)
+            try:
+                item = await asyncio.wait_for(queue.get(), max(wait, 0))
+            except asyncio.TimeoutError:
+                if buffer:
+                    yield chunk_event("".join(buffer))
+                    buffer, buffered, flush_at = [], 0, None
+                else:
+                    yield HEARTBEAT
+                last_sent = loop.time()
+                continue
+            if item is _DONE or isinstance(item, Exception):
+                if buffer:
+                    yield chunk_event("".join(buffer))
+                finished = True
+                if item is not _DONE:
+                    raise item
+                return
+            if collect is not None:
+                collect.append(item)
+            buffer.append(item)
+            buffered += len(item)
+            now = loop.time()
+            if not sent_any or buffered >= coalesce_chars or (flush_at is not None and now >= flush_at):
+                yield chunk_event("".join(buffer))
+                buffer, buffered, flush_at = [], 0, None
+                sent_any = True
+                last_sent = now
+            elif flush_at is None:
+                flush_at = now + coalesce_seconds
+    finally:
+        if not finished:
+            stopped = True
+            if cancel is not None:
+                cancel()
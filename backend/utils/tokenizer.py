@@ -0,0 +1,9 @@
+from functools import lru_cache
+
+ENCODING_NAME = "cl100k_base"
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """The process-wide tiktoken encoding, loaded on first use and shared by every caller."""
+    import tiktoken
+    return tiktoken.get_encoding(ENCODING_NAME)